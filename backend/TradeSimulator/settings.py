@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'portfolio.middleware.FXMemoMiddleware',
 ]
 
 ROOT_URLCONF = 'TradeSimulator.urls'
@@ -120,6 +121,11 @@ LOCAL_MARKET_TIME_ZONE = os.getenv('LOCAL_MARKET_TIME_ZONE', FX_MARKET_TIME_ZONE
 US_MARKET_TIME_ZONE = os.getenv('US_MARKET_TIME_ZONE', 'America/New_York')
 LOCAL_MARKET_CLOSE_TIME = os.getenv('LOCAL_MARKET_CLOSE_TIME', '16:00')
 US_MARKET_CLOSE_TIME = os.getenv('US_MARKET_CLOSE_TIME', '16:00')
+# Per-tier counters and latency histograms for get_fx_rate (see fx_metrics_report).
+# Memo scope hit/miss counts per endpoint and task are recorded even when this is off.
+FX_METRICS_ENABLED = env_flag('FX_METRICS_ENABLED', default=False)
+# Currencies cross-rate matrices are precomputed for; PEN is always the pivot.
+FX_CURRENCIES = tuple(code.strip().upper() for code in os.getenv('FX_CURRENCIES', 'PEN,USD').split(',') if code.strip())
 USE_I18N = True
 USE_TZ = True
 
@@ -188,6 +194,27 @@ PASSWORD_RESET_URL_TEMPLATE = os.getenv(
     f"{FRONTEND_URL.rstrip('/')}/reset-password?uid={{uid}}&token={{token}}"
 )
 
+# Seconds a raw BCRP response is reused before the provider is hit again (0 disables).
+BCRP_CACHE_TTL_SECONDS = int(os.getenv('BCRP_CACHE_TTL_SECONDS', '60'))
+# Seconds the latest-FX payload is served from cache; bounds staleness in processes that did not write.
+FX_LATEST_CACHE_SECONDS = int(os.getenv('FX_LATEST_CACHE_SECONDS', '60'))
+# Snapshot days per bulk upsert chunk; each chunk is written in its own transaction.
+SNAPSHOT_WRITE_BATCH_SIZE = int(os.getenv('SNAPSHOT_WRITE_BATCH_SIZE', '500'))
+# Nightly snapshots fan out in chunks of this many portfolios, sent to SNAPSHOT_CHUNK_QUEUE;
+# route it to a worker started with `-Q <queue> --concurrency N` to run at most N chunks at once.
+SNAPSHOT_CHUNK_SIZE = int(os.getenv('SNAPSHOT_CHUNK_SIZE', '50'))
+SNAPSHOT_CHUNK_QUEUE = os.getenv('SNAPSHOT_CHUNK_QUEUE', 'celery')
+# 'daily' writes one snapshot row per day and one holding row per position and day;
+# 'rle' keeps monthly run-length series and holding rows only where a position changes.
+SNAPSHOT_STORAGE = os.getenv('SNAPSHOT_STORAGE', 'daily')
+# Portfolios a single dirty-range recompute run processes; the rest wait for the next run.
+SNAPSHOT_DIRTY_BATCH_SIZE = int(os.getenv('SNAPSHOT_DIRTY_BATCH_SIZE', '200'))
+# With SNAPSHOT_ON_DEMAND, dashboard and benchmark reads compute missing snapshot days and
+# the nightly run only pre-warms portfolios with a login or transaction in the last
+# SNAPSHOT_PREWARM_ACTIVE_DAYS days.
+SNAPSHOT_ON_DEMAND = env_flag('SNAPSHOT_ON_DEMAND', default=False)
+SNAPSHOT_PREWARM_ACTIVE_DAYS = int(os.getenv('SNAPSHOT_PREWARM_ACTIVE_DAYS', '30'))
+
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = 'django-db'
 CELERY_CACHE_BACKEND = 'django-cache'
@@ -34,6 +34,8 @@ INSTALLED_APPS = [
 # Disable celery during testing
 CELERY_TASK_ALWAYS_EAGER = True
 CELERY_TASK_EAGER_PROPAGATES = True
+# Eager chords still store results; django_celery_results is not installed here.
+CELERY_RESULT_BACKEND = 'cache+memory://'
 
 # Use console email backend for testing
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -0,0 +1,117 @@
+"""
+Manual microbenchmark: Decimal + quantize versus Money / int-cent arithmetic.
+
+Replays the two SnapshotService loops that now use Money over synthetic rows:
+the cash-wallet replay and the average-cost holding replay. The Decimal variant
+is the previous code; the int variant reads cents (as cents_expression delivers
+them) and only builds Money at the loop boundary. Single Money operations are
+printed too: each one allocates a Python object and is slower than C decimal,
+which is why the loops stay in ints. Needs no database.
+
+    python manual_money_benchmark.py [repeats]
+
+This is intentionally not a pytest test module.
+"""
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TradeSimulator.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from portfolio.services.money import Money, cents_per_unit  # noqa: E402
+
+CENT = Decimal('0.01')
+RATE = Decimal('3.751234')
+ROWS = 20_000
+
+rng = random.Random(42)
+CENTS = [rng.randint(1, 10_000_000) for _ in range(ROWS)]
+DECIMALS = [Decimal(cents).scaleb(-2) for cents in CENTS]
+KINDS = [rng.choice(('DEPOSIT', 'WITHDRAWAL', 'BUY', 'SELL')) for _ in range(ROWS)]
+QUANTITIES = [rng.randint(1, 500) for _ in range(ROWS)]
+
+
+def wallet_decimal():
+    wallet = Decimal('0.00')
+    for amount, kind in zip(DECIMALS, KINDS):
+        amount = Decimal(str(amount))
+        if kind == 'DEPOSIT':
+            wallet += amount
+        elif kind == 'WITHDRAWAL':
+            wallet -= amount
+    return wallet
+
+
+def wallet_money():
+    wallet = 0
+    for amount, kind in zip(CENTS, KINDS):
+        if kind == 'DEPOSIT':
+            wallet += amount
+        elif kind == 'WITHDRAWAL':
+            wallet -= amount
+    return Money(wallet, 'PEN')
+
+
+def holding_decimal():
+    quantity, total_cost, average = 0, Decimal('0.00'), Decimal('0.00')
+    for price, kind, qty in zip(DECIMALS, KINDS, QUANTITIES):
+        if kind == 'SELL' and quantity >= qty:
+            quantity -= qty
+            total_cost = average * quantity
+        else:
+            quantity += qty
+            total_cost = total_cost + price * qty
+            average = (total_cost / quantity).quantize(CENT, ROUND_HALF_UP)
+    return average
+
+
+def holding_money():
+    quantity, total_cost, average = 0, 0, 0
+    for price, kind, qty in zip(CENTS, KINDS, QUANTITIES):
+        if kind == 'SELL' and quantity >= qty:
+            quantity -= qty
+            total_cost = average * quantity
+        else:
+            quantity += qty
+            total_cost += price * qty
+            average = cents_per_unit(total_cost, quantity)
+    return Money(average, 'USD')
+
+
+def _ns_per_row(loop, repeats):
+    return min(timeit.repeat(loop, number=1, repeat=repeats)) * 1e9 / ROWS
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    assert wallet_decimal() == wallet_money().to_decimal()
+    assert holding_decimal() == holding_money().to_decimal()
+
+    for name, decimal_loop, money_loop in (
+        ('wallet replay', wallet_decimal, wallet_money),
+        ('holding replay', holding_decimal, holding_money),
+    ):
+        before = _ns_per_row(decimal_loop, repeats)
+        after = _ns_per_row(money_loop, repeats)
+        print(f"{name:>16}: Decimal {before:7.1f} ns/row  cents {after:7.1f} ns/row  ({before / after:4.1f}x)")
+
+    d, m = Decimal('123.45'), Money(12345, 'USD')
+    for name, decimal_stmt, money_stmt in (
+        ('add', lambda: d + d, lambda: m + m),
+        ('times int', lambda: (d * 7).quantize(CENT, ROUND_HALF_UP), lambda: m * 7),
+        ('times rate', lambda: (d * RATE).quantize(CENT, ROUND_HALF_UP), lambda: m.convert('PEN', RATE)),
+    ):
+        before = min(timeit.repeat(decimal_stmt, number=100_000, repeat=repeats)) * 1e4
+        after = min(timeit.repeat(money_stmt, number=100_000, repeat=repeats)) * 1e4
+        print(f"{name:>16}: Decimal {before:7.1f} ns/op   Money {after:7.1f} ns/op")
+
+
+if __name__ == '__main__':
+    main()
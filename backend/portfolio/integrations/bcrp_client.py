@@ -2,11 +2,16 @@ import io
 import re
 import csv
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from datetime import datetime, time
-from typing import Tuple
+from typing import List, Tuple
 
 import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
 
 try:
     from zoneinfo import ZoneInfo
@@ -17,17 +22,44 @@ except Exception:  # pragma: no cover
 BCRP_BASE = "https://estadisticas.bcrp.gob.pe/estadisticas/series/api"
 
 
+CACHE_KEY_PREFIX = "bcrp:response:"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Process-wide keep-alive session so chained and concurrent lookups reuse connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update({
+                    "User-Agent": "privateiv/1.0 (+bcrp)",
+                    "Accept": "application/json,text/csv,text/plain,*/*",
+                })
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
 def _fetch(url: str) -> str:
-    r = requests.get(
-        url,
-        timeout=20,
-        headers={
-            "User-Agent": "privateiv/1.0 (+bcrp)",
-            "Accept": "application/json,text/csv,text/plain,*/*",
-        },
-    )
+    """GET a BCRP URL, reusing a cached body for BCRP_CACHE_TTL_SECONDS."""
+    ttl = getattr(settings, "BCRP_CACHE_TTL_SECONDS", 60)
+    key = CACHE_KEY_PREFIX + url
+    if ttl:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    r = _get_session().get(url, timeout=20)
     r.raise_for_status()
-    return r.text.lstrip("\ufeff")
+    text = r.text.lstrip("\ufeff")
+    if ttl:
+        cache.set(key, text, ttl)
+    return text
 
 
 def _ensure_json(raw: str):
@@ -158,6 +190,71 @@ def get_latest(series_code: str) -> Tuple[str, Decimal]:
     return d, Decimal(str(v))
 
 
+# Daily series per (direction, session) used for historical backfills.
+HISTORY_SERIES = {
+    ("compra", "intraday"): "PD04643PD",
+    ("venta", "intraday"): "PD04644PD",
+    ("compra", "cierre"): "PD04645PD",
+    ("venta", "cierre"): "PD04646PD",
+}
+
+
+def _parse_bcrp_json_series(payload) -> List[Tuple[str, float]]:
+    """Every numeric observation in a BCRP JSON payload, oldest first."""
+    if isinstance(payload, dict) and "periods" in payload:
+        raw = [(p.get("name"), (p.get("values") or [None])[0]) for p in payload["periods"]]
+    else:
+        try:
+            raw = [(row[0], row[1]) for row in payload["data"]["dataset"]["data"]]
+        except (KeyError, TypeError):
+            try:
+                raw = [
+                    (o.get("fecha") or o.get("periodo") or o.get("name"), o.get("valor") or o.get("value"))
+                    for o in payload["series"][0]["data"]
+                ]
+            except (KeyError, IndexError, TypeError):
+                raise ValueError("Unrecognized BCRP JSON schema")
+    return _numeric_observations(raw)
+
+
+def _numeric_observations(raw) -> List[Tuple[str, float]]:
+    # BCRP marks gaps with placeholders such as "n.d."; skip anything that is not a number.
+    obs = []
+    for period, val in raw:
+        if not _has_number(val):
+            continue
+        try:
+            obs.append((_norm_period_iso(period), _to_float(val)))
+        except ValueError:
+            continue
+    return obs
+
+
+def _parse_bcrp_csv_series(raw: str) -> List[Tuple[str, float]]:
+    buf = io.StringIO(raw.lstrip("\ufeff"))
+    rows = [r for r in csv.reader(buf) if r and any(c.strip() for c in r)]
+    return _numeric_observations((row[0].strip(), row[1].strip()) for row in rows if len(row) >= 2)
+
+
+def get_range(series_code: str, start: str, end: str) -> List[Tuple[str, Decimal]]:
+    """All observations of a series between ISO dates start and end (inclusive), oldest first.
+
+    Periods are normalized with _norm_period_iso; rows whose period does not parse to a
+    full YYYY-MM-DD date are dropped.
+    """
+    url_json = f"{BCRP_BASE}/{series_code}/json/{start}/{end}"
+    url_csv = f"{BCRP_BASE}/{series_code}/csv/{start}/{end}"
+    try:
+        obs = _parse_bcrp_json_series(_ensure_json(_fetch(url_json)))
+    except Exception:
+        obs = _parse_bcrp_csv_series(_fetch(url_csv))
+    return [
+        (d, Decimal(str(v)))
+        for d, v in obs
+        if re.match(r"^\d{4}-\d{2}-\d{2}$", d)
+    ]
+
+
 def _series_chain(intraday: bool, direction: str):
     # direction: 'compra' for USD->PEN, 'venta' for PEN->USD
     if direction not in ("compra", "venta"):
@@ -179,48 +276,68 @@ def _today_prefix() -> str:
     return today.strftime("%Y-%m-%d")
 
 
-def resolve_latest_auto(mode: str = 'auto', direction: str = 'compra') -> Tuple[str, str, Decimal]:
-    # Decide intraday vs cierre: default cierre; intraday only 11:05–13:29
+def _auto_plan(mode: str) -> Tuple[bool, bool]:
+    """Return (intraday, expect_today): default cierre; intraday only 11:05–13:29."""
     if mode == 'intraday':
-        intraday = True
-        expect_today = True
-    elif mode == 'cierre':
-        intraday = False
-        try:
-            now = datetime.now(ZoneInfo("America/Lima")).time() if ZoneInfo else datetime.now().time()
-        except Exception:
-            now = datetime.now().time()
-        expect_today = now >= time(13, 30)
-    else:
+        return True, True
+    try:
+        now = datetime.now(ZoneInfo("America/Lima")).time() if ZoneInfo else datetime.now().time()
+    except Exception:
+        now = datetime.now().time()
+    if mode == 'cierre':
+        return False, now >= time(13, 30)
+    intraday = (now >= time(11, 5)) and (now < time(13, 30))
+    return intraday, intraday or (now >= time(13, 30))
+
+
+def _get_latest_many(codes) -> dict:
+    """get_latest for every code concurrently; failures are returned as the raised exception."""
+    with ThreadPoolExecutor(max_workers=len(codes)) as pool:
+        futures = {code: pool.submit(get_latest, code) for code in codes}
+    results = {}
+    for code, future in futures.items():
         try:
-            now = datetime.now(ZoneInfo("America/Lima")).time() if ZoneInfo else datetime.now().time()
-        except Exception:
-            now = datetime.now().time()
-        intraday = (now >= time(11, 5)) and (now < time(13, 30))
-        expect_today = intraday or (now >= time(13, 30))
+            results[code] = future.result()
+        except Exception as e:
+            results[code] = e
+    return results
 
+
+def resolve_latest_auto(mode: str = 'auto', direction: str = 'compra') -> Tuple[str, str, Decimal]:
+    intraday, expect_today = _auto_plan(mode)
     chain = _series_chain(intraday, direction)
+    # Fetch the whole fallback chain at once; selection below still honours chain order.
+    results = _get_latest_many(chain)
+
     last_err = None
     best_stale = None
     prefix = _today_prefix()
     for idx, code in enumerate(chain):
-        try:
-            d, v = get_latest(code)
-            norm_date = _norm_period_iso(str(d)) if d is not None else ""
-            if expect_today and norm_date and not norm_date.startswith(prefix):
-                # Provider lag should not fail ingestion outright; keep the freshest
-                # successful observation as a fallback if nothing fresh is available.
-                candidate_key = (norm_date, -idx)
-                if best_stale is None or candidate_key > best_stale[0]:
-                    best_stale = (candidate_key, code, d, v)
-                continue
-            return code, d, v
-        except Exception as e:
-            last_err = e
+        result = results[code]
+        if isinstance(result, Exception):
+            last_err = result
+            continue
+        d, v = result
+        norm_date = _norm_period_iso(str(d)) if d is not None else ""
+        if expect_today and norm_date and not norm_date.startswith(prefix):
+            # Provider lag should not fail ingestion outright; keep the freshest
+            # successful observation as a fallback if nothing fresh is available.
+            candidate_key = (norm_date, -idx)
+            if best_stale is None or candidate_key > best_stale[0]:
+                best_stale = (candidate_key, code, d, v)
             continue
+        return code, d, v
     if best_stale:
         _, code, d, v = best_stale
         return code, d, v
     if last_err:
         raise last_err
     raise RuntimeError("No series produced a value")
+
+
+def resolve_latest_both(mode: str = 'auto'):
+    """Resolve compra and venta concurrently; returns (compra, venta) as resolve_latest_auto tuples."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        compra = pool.submit(resolve_latest_auto, mode=mode, direction='compra')
+        venta = pool.submit(resolve_latest_auto, mode=mode, direction='venta')
+        return compra.result(), venta.result()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.services.transaction_fx_service import backfill_transaction_fx_rates
+
+
+class Command(BaseCommand):
+    help = "Stamp the FX rate each transaction was valued at onto transactions stored without one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=500,
+                            help="Transactions per batch and commit (default 500)")
+        parser.add_argument("--after-id", dest="after_id", type=int, default=0,
+                            help="Resume after this transaction id (default: start from the beginning)")
+        parser.add_argument("--limit", dest="limit", type=int, default=None,
+                            help="Stop after scanning this many transactions")
+
+    def handle(self, *args, **opts):
+        result = backfill_transaction_fx_rates(
+            batch_size=max(1, opts["batch_size"]),
+            after_id=opts["after_id"],
+            limit=opts["limit"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stamped {result['stamped']} of {result['scanned']} transactions "
+            f"({result['unresolved']} without FX data); resume with --after-id {result['last_id']}"
+        ))
@@ -20,6 +20,7 @@ from portfolio.models import (
     Portfolio,
     PortfolioPerformance,
     RealizedPNL,
+    SnapshotSeries,
     Transaction,
 )
 from portfolio.models.holding_snapshot import HoldingSnapshot
@@ -85,6 +86,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"Removing existing '{portfolio_name}' portfolios: {stale_ids}")
                 HoldingSnapshot.objects.filter(portfolio_id__in=stale_ids).delete()
                 DailyPortfolioSnapshot.all_objects.filter(portfolio_id__in=stale_ids).delete()
+                SnapshotSeries.objects.filter(portfolio_id__in=stale_ids).delete()
                 RealizedPNL.objects.filter(portfolio_id__in=stale_ids).delete()
                 Transaction.all_objects.filter(portfolio_id__in=stale_ids).delete()
                 PortfolioPerformance.objects.filter(portfolio_id__in=stale_ids).delete()
@@ -152,6 +154,7 @@ class Command(BaseCommand):
 
         self.stdout.write("Generating daily snapshots and holding snapshots...")
         DailyPortfolioSnapshot.all_objects.filter(portfolio=portfolio).delete()
+        SnapshotSeries.objects.filter(portfolio=portfolio).delete()
         HoldingSnapshot.objects.filter(portfolio=portfolio).delete()
 
         snapshot_count = 0
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portfolio.services.fx_ingest_service import backfill_from_bcrp
+
+
+class Command(BaseCommand):
+    help = "Backfill BCRP FX history (compra/venta/mid, intraday and cierre) into FXRate for a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_date", required=True, help="First date to fetch, YYYY-MM-DD")
+        parser.add_argument("--to", dest="to_date", default=None, help="Last date to fetch, YYYY-MM-DD (default: today)")
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000,
+                            help="Rows per bulk upsert statement (default 1000)")
+
+    def handle(self, *args, **opts):
+        try:
+            start_date = datetime.strptime(opts["from_date"], "%Y-%m-%d").date()
+            end_date = (
+                datetime.strptime(opts["to_date"], "%Y-%m-%d").date()
+                if opts.get("to_date") else timezone.now().date()
+            )
+        except ValueError:
+            raise CommandError("--from/--to must use YYYY-MM-DD format")
+        if start_date > end_date:
+            raise CommandError("--from must not be after --to")
+
+        try:
+            result = backfill_from_bcrp(start_date, end_date, batch_size=max(1, opts["batch_size"]))
+        except Exception as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"FX backfill complete: {result['saved']} rows upserted"))
+        self.stdout.write(str(result))
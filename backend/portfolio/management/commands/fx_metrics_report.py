@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.services import fx_metrics
+from portfolio.services.fx_service import FX_TIER_MISSING, FX_TIER_PRIOR_ANY_TYPE, FX_TIER_PRIOR_SAME_TYPE
+
+SLOW_TIERS = {FX_TIER_PRIOR_SAME_TYPE, FX_TIER_PRIOR_ANY_TYPE, FX_TIER_MISSING}
+
+
+class Command(BaseCommand):
+    help = (
+        "Report FX lookup counts and latency by caller and fallback tier, "
+        "with the callers that hit prior-date/missing tiers most listed first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--caller", dest="caller", default=None, help="Only show one caller (view name, task name, snapshot, transaction)")
+        parser.add_argument("--reset", action="store_true", help="Clear collected metrics after printing")
+
+    def handle(self, *args, **opts):
+        if not fx_metrics.is_enabled():
+            self.stdout.write(self.style.WARNING("FX_METRICS_ENABLED is off; showing previously collected data only."))
+
+        rows = fx_metrics.snapshot()
+        if opts.get("caller"):
+            rows = [row for row in rows if row['caller'] == opts["caller"]]
+        if not rows:
+            self.stdout.write("No FX lookups recorded.")
+            return
+
+        by_caller = {}
+        memo_counts = {}
+        for row in rows:
+            if row['source'] == fx_metrics.MEMO_SCOPE_SOURCE:
+                memo_counts.setdefault(row['caller'], {})[row['tier']] = row['count']
+                by_caller.setdefault(row['caller'], [])
+            else:
+                by_caller.setdefault(row['caller'], []).append(row)
+
+        def slow_share(caller_rows):
+            total = sum(row['count'] for row in caller_rows)
+            slow = sum(row['count'] for row in caller_rows if row['tier'] in SLOW_TIERS)
+            return slow, total
+
+        ordered = sorted(by_caller.items(), key=lambda item: (-slow_share(item[1])[0], item[0]))
+        for caller, caller_rows in ordered:
+            slow, total = slow_share(caller_rows)
+            total_ms = sum(row['total_ms'] for row in caller_rows)
+            self.stdout.write(self.style.SUCCESS(
+                f"{caller}: {total} lookups, {slow} prior/missing ({slow * 100 / (total or 1):.1f}%), {total_ms:.1f} ms total"
+            ))
+            if caller in memo_counts:
+                memo = memo_counts[caller]
+                self.stdout.write(f"  memo scope: {memo.get('hit', 0)} hits, {memo.get('miss', 0)} misses")
+            for row in sorted(caller_rows, key=lambda r: -r['count']):
+                p95 = f"{row['p95_ms']}ms" if row['p95_ms'] is not None else f">{fx_metrics.LATENCY_BUCKETS_MS[-1]}ms"
+                self.stdout.write(
+                    f"  {row['source']:<12} {row['tier']:<30} count={row['count']:<8} "
+                    f"avg={row['avg_ms']:.3f}ms p95<={p95}"
+                )
+
+        if opts.get("reset"):
+            fx_metrics.reset()
+            self.stdout.write("FX metrics reset.")
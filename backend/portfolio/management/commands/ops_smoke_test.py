@@ -17,8 +17,9 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 
 from TradeSimulator.celery import app as celery_app
-from portfolio.models import BenchmarkPrice, DailyPortfolioSnapshot, Portfolio, Transaction
-from portfolio.tasks import create_daily_snapshots
+from portfolio.models import BenchmarkPrice, Portfolio, Transaction
+from portfolio.services import snapshot_store
+from portfolio.tasks import create_daily_snapshots_chunk
 from stocks.models import Stock
 from users.models import CustomUser
 
@@ -264,8 +265,8 @@ class Command(BaseCommand):
 
     def _check_snapshot_generation(self, portfolio):
         today = date.today()
-        create_daily_snapshots()
-        snapshot = DailyPortfolioSnapshot.objects.filter(portfolio=portfolio, date=today).first()
+        create_daily_snapshots_chunk([portfolio.id], today.isoformat())
+        snapshot = next(iter(snapshot_store.daily_snapshots(portfolio, today, today)), None)
         if snapshot is None:
             raise CommandError(f"No snapshot created for portfolio {portfolio.id} on {today}.")
 
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portfolio.services.effective_fx_service import rebuild_effective_fx_rates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized EffectiveFXRate table from FXRate rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="from_date", default=None,
+                            help="Only rebuild dates on or after YYYY-MM-DD (default: full rebuild)")
+        parser.add_argument("--base", dest="base", default="PEN")
+        parser.add_argument("--quote", dest="quote", default="USD")
+
+    def handle(self, *args, **opts):
+        start_date = None
+        if opts.get("from_date"):
+            try:
+                start_date = datetime.strptime(opts["from_date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--from must use YYYY-MM-DD format")
+
+        written = rebuild_effective_fx_rates(opts["base"], opts["quote"], start_date=start_date)
+        self.stdout.write(self.style.SUCCESS(f"Materialized {written} effective FX rows"))
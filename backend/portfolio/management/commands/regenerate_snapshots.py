@@ -1,13 +1,54 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Min
 from django.utils import timezone
 from datetime import timedelta
-from portfolio.models import Portfolio
+from portfolio.models import Portfolio, SnapshotSeries
 from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
 from portfolio.services.snapshot_service import SnapshotService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Portfolios a --dry-run regenerates (and rolls back) to measure throughput.
+DRY_RUN_SAMPLE = 3
+
+
+def regenerate_portfolio(portfolio_id, start_date, end_date, delete_existing=False, dry_run=False):
+    """Regenerate one portfolio's snapshots from ``start_date`` to ``end_date``.
+
+    Runs in the command's process or in a pool worker, in one transaction, so a
+    portfolio is either fully regenerated or left as it was; ``dry_run`` rolls it back.
+    Returns a result dict with the days written, the time taken and the last week's rows.
+    """
+    started = time.monotonic()
+    out = {'portfolio_id': portfolio_id, 'days': 0, 'deleted': 0, 'recent': [], 'error': None}
+    try:
+        portfolio = Portfolio.objects.get(pk=portfolio_id)
+        with transaction.atomic():
+            if delete_existing:
+                out['deleted'] = DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count()
+                DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).delete()
+                SnapshotSeries.objects.filter(portfolio=portfolio).delete()
+            snapshots = SnapshotService.create_snapshots_for_range(portfolio, start_date, end_date)
+            if dry_run:
+                transaction.set_rollback(True)
+        out['days'] = len(snapshots)
+        out['recent'] = [
+            (snapshot.date, snapshot.total_value, snapshot.cash_balance, snapshot.investment_value)
+            for snapshot in snapshots
+            if (end_date - snapshot.date).days <= 7
+        ]
+    except Exception as e:
+        logger.exception(f"Snapshot regeneration failed for portfolio {portfolio_id}")
+        out['error'] = str(e)
+    out['seconds'] = time.monotonic() - started
+    return out
+
 
 class Command(BaseCommand):
     help = 'Regenerate daily portfolio snapshots with corrected cash calculations'
@@ -34,12 +75,32 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete existing snapshots before regenerating'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Regenerate portfolios in this many processes, each with its own DB connection (default: 1)'
+        )
+        parser.add_argument(
+            '--after-id',
+            dest='after_id',
+            type=int,
+            default=0,
+            help='Resume after this portfolio ID (default: start from the beginning)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help=f'Regenerate up to {DRY_RUN_SAMPLE} portfolios, roll them back and estimate the full run'
+        )
 
     def handle(self, *args, **options):
         portfolio_id = options.get('portfolio_id')
         days_back = options.get('days')
         regenerate_all = options.get('all')
         delete_existing = options.get('delete_existing')
+        workers = max(1, options.get('workers') or 1)
+        self.verbosity = options.get('verbosity', 1)
 
         # Get portfolios
         if portfolio_id:
@@ -49,63 +110,122 @@ class Command(BaseCommand):
                 return
         else:
             portfolios = Portfolio.objects.all()
-
-        self.stdout.write(self.style.SUCCESS(f'Found {portfolios.count()} portfolio(s)'))
-
+        portfolios = portfolios.filter(id__gt=options['after_id']).order_by('id')
+
+        plan = self._plan(portfolios, regenerate_all, days_back)
+        total_days = sum((end_date - start_date).days + 1 for _, start_date, end_date in plan)
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(plan)} portfolio(s), {total_days} snapshot day(s) to regenerate'
+        ))
+        if options['dry_run']:
+            self._estimate(plan, total_days, workers)
+            return
+
+        started = time.monotonic()
+        results = {}
+        interrupted = False
+        try:
+            for result in self._run(plan, delete_existing, workers):
+                results[result['portfolio_id']] = result
+                self._report(result, len(results), len(plan))
+        except KeyboardInterrupt:
+            interrupted = True
+            self.stdout.write(self.style.WARNING('\nInterrupted; portfolios not yet started were skipped'))
+
+        elapsed = time.monotonic() - started
+        written = sum(result['days'] for result in results.values())
+        failed = sorted(pid for pid, result in results.items() if result['error'])
+        self.stdout.write(self.style.SUCCESS(
+            f'\nRegenerated {written} snapshots for {len(results) - len(failed)} portfolio(s) in {elapsed:.1f}s '
+            f'({written / elapsed if elapsed else 0:.0f} snapshots/s, {workers} worker(s))'
+        ))
+
+        # Workers finish out of order: resume after the last portfolio with every earlier one done.
+        resume_after = options['after_id']
+        for pid, _, _ in plan:
+            if pid not in results or results[pid]['error']:
+                break
+            resume_after = pid
+        if failed or interrupted:
+            if failed:
+                self.stdout.write(self.style.ERROR(f'Failed portfolios: {failed}'))
+            self.stdout.write(self.style.WARNING(f'Resume with --after-id {resume_after}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Snapshot regeneration complete!'))
+
+    @staticmethod
+    def _plan(portfolios, regenerate_all, days_back):
+        """``[(portfolio_id, start_date, end_date)]`` in portfolio ID order."""
+        today = timezone.now().date()
+        first_timestamps = {}
+        if regenerate_all:
+            first_timestamps = dict(
+                portfolios.annotate(first=Min('transactions__timestamp')).values_list('id', 'first')
+            )
+        plan = []
         for portfolio in portfolios:
-            self.stdout.write(f'\nProcessing portfolio: {portfolio.name} (ID: {portfolio.id})')
-
-            # Delete existing snapshots if requested
-            if delete_existing:
-                deleted_count = DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count()
-                DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).delete()
-                self.stdout.write(self.style.WARNING(f'  Deleted {deleted_count} existing snapshots'))
-
-            # Determine date range
-            today = timezone.now().date()
             if regenerate_all:
-                # Get the earliest transaction date
-                first_txn = portfolio.transactions.order_by('timestamp').first()
-                if first_txn:
-                    start_date = first_txn.timestamp.date()
-                else:
-                    start_date = portfolio.created_at.date()
-                self.stdout.write(f'  Regenerating from {start_date} to {today}')
+                # Start from the earliest transaction date
+                first = first_timestamps.get(portfolio.id)
+                start_date = first.date() if first else portfolio.created_at.date()
             else:
                 start_date = today - timedelta(days=days_back)
-                self.stdout.write(f'  Regenerating last {days_back} days: {start_date} to {today}')
-
-            # Generate snapshots
-            current_date = start_date
-            success_count = 0
-            error_count = 0
-
-            while current_date <= today:
-                try:
-                    snapshot = SnapshotService.create_daily_snapshot(portfolio, current_date)
-                    success_count += 1
-
-                    # Show details for recent snapshots
-                    if (today - current_date).days <= 7:
-                        self.stdout.write(
-                            f'  ✓ {current_date}: Total={snapshot.total_value:,.2f}, '
-                            f'Cash={snapshot.cash_balance:,.2f}, '
-                            f'Investment={snapshot.investment_value:,.2f}'
-                        )
-                except Exception as e:
-                    error_count += 1
-                    self.stdout.write(self.style.ERROR(f'  ✗ {current_date}: {str(e)}'))
-
-                current_date += timedelta(days=1)
-
-            self.stdout.write(self.style.SUCCESS(
-                f'  Completed: {success_count} snapshots created, {error_count} errors'
-            ))
-
-            # Show current portfolio state
-            self.stdout.write(f'\n  Current Portfolio State:')
-            self.stdout.write(f'    Cash: {portfolio.base_currency} {portfolio.cash_balance:,.2f}')
-            self.stdout.write(f'    Investment: {portfolio.base_currency} {portfolio.current_investment_value:,.2f}')
-            self.stdout.write(f'    Total: {portfolio.base_currency} {portfolio.total_value:,.2f}')
-
-        self.stdout.write(self.style.SUCCESS('\n✅ Snapshot regeneration complete!'))
+            plan.append((portfolio.id, start_date, today))
+        return plan
+
+    @staticmethod
+    def _run(plan, delete_existing, workers, dry_run=False):
+        """Yield each portfolio's result as it finishes."""
+        if workers == 1:
+            for pid, start_date, end_date in plan:
+                yield regenerate_portfolio(pid, start_date, end_date, delete_existing, dry_run)
+            return
+
+        # Forked workers must not inherit (and share) this process's open connections;
+        # each opens its own on first use, and this process reconnects when it needs to.
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        try:
+            futures = [
+                pool.submit(regenerate_portfolio, pid, start_date, end_date, delete_existing, dry_run)
+                for pid, start_date, end_date in plan
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _report(self, result, done, total):
+        prefix = f'[{done}/{total}] Portfolio {result["portfolio_id"]}'
+        if result['error']:
+            self.stdout.write(self.style.ERROR(f'{prefix}: ✗ {result["error"]}'))
+            return
+        rate = result['days'] / result['seconds'] if result['seconds'] else 0
+        deleted = f', {result["deleted"]} deleted first' if result['deleted'] else ''
+        self.stdout.write(
+            f'{prefix}: {result["days"]} snapshots in {result["seconds"]:.2f}s ({rate:.0f}/s){deleted}'
+        )
+        if self.verbosity >= 2:
+            for snapshot_date, total_value, cash, investment in result['recent']:
+                self.stdout.write(
+                    f'  ✓ {snapshot_date}: Total={total_value:,.2f}, '
+                    f'Cash={cash:,.2f}, '
+                    f'Investment={investment:,.2f}'
+                )
+
+    def _estimate(self, plan, total_days, workers):
+        sample = plan[:DRY_RUN_SAMPLE]
+        results = list(self._run(sample, False, 1, dry_run=True))
+        for done, result in enumerate(results, start=1):
+            self._report(result, done, len(sample))
+
+        days = sum(result['days'] for result in results if not result['error'])
+        seconds = sum(result['seconds'] for result in results if not result['error'])
+        if not days or not seconds:
+            self.stdout.write(self.style.WARNING('Dry run: nothing measured, no estimate'))
+            return
+        rate = days / seconds
+        self.stdout.write(self.style.SUCCESS(
+            f'Dry run: {rate:.0f} snapshots/s over {days} sampled day(s), nothing written; '
+            f'estimated {total_days / rate / workers:.1f}s for {total_days} day(s) with {workers} worker(s)'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from portfolio.services.snapshot_service import SnapshotService
+
+
+class Command(BaseCommand):
+    help = "Revalue holding snapshots priced by a fallback tier once a historical price covers them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", dest="batch_size", type=int, default=1000,
+                            help="Holding rows per batch and commit (default 1000)")
+        parser.add_argument("--after-id", dest="after_id", type=int, default=0,
+                            help="Resume after this holding snapshot id (default: start from the beginning)")
+        parser.add_argument("--limit", dest="limit", type=int, default=None,
+                            help="Stop after scanning this many rows")
+        parser.add_argument("--include-unlabelled", dest="include_unlabelled", action="store_true",
+                            help="Also scan rows written before price sources were recorded")
+
+    def handle(self, *args, **opts):
+        result = SnapshotService.reprice_fallback_holdings(
+            batch_size=max(1, opts["batch_size"]),
+            after_id=opts["after_id"],
+            limit=opts["limit"],
+            include_unlabelled=opts["include_unlabelled"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Repriced {result['repriced']} of {result['scanned']} fallback-valued holding rows "
+            f"({result['snapshots']} daily snapshots adjusted); resume with --after-id {result['last_id']}"
+        ))
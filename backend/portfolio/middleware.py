@@ -0,0 +1,31 @@
+from portfolio.services import fx_metrics
+from portfolio.services.fx_memo import enter_fx_memo, exit_fx_memo, get_active_fx_memo
+
+
+class FXMemoMiddleware:
+    """Scope FX lookups to the request so repeated conversions hit an in-memory memo."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = enter_fx_memo(label=request.path)
+        try:
+            return self.get_response(request)
+        finally:
+            memo = get_active_fx_memo() if token is not None else None
+            if memo is not None:
+                # Report hit/miss counters per endpoint rather than per raw path.
+                resolver_match = getattr(request, 'resolver_match', None)
+                memo.label = getattr(resolver_match, 'view_name', None) or request.path
+            fx_metrics.record_memo_scope(exit_fx_memo(token))
+            fx_metrics.flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Label the scope by endpoint as soon as the URL is resolved, so FX metrics
+        # recorded during the view are attributed to it.
+        memo = get_active_fx_memo()
+        resolver_match = getattr(request, 'resolver_match', None)
+        if memo is not None and getattr(resolver_match, 'view_name', None):
+            memo.label = resolver_match.view_name
+        return None
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0021_benchmarkseries_benchmarkprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectiveFXRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('base_currency', models.CharField(max_length=3)),
+                ('quote_currency', models.CharField(max_length=3)),
+                ('rate_type', models.CharField(choices=[('compra', 'compra'), ('venta', 'venta'), ('mid', 'mid')], max_length=10)),
+                ('session', models.CharField(choices=[('intraday', 'intraday'), ('cierre', 'cierre')], max_length=10)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=16)),
+                ('tier', models.CharField(help_text='Fallback tier that produced the rate (e.g., exact, prior_same_type)', max_length=32)),
+                ('source_date', models.DateField(help_text='Date of the FXRate row the rate was taken from')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-date', 'base_currency', 'quote_currency'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'base_currency', 'quote_currency', 'rate_type', 'session'), name='uniq_effective_fxrate_date_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0022_effectivefxrate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolio',
+            name='ledger_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Incremented whenever the transaction ledger changes; keys historical caches'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:57
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0023_portfolio_ledger_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('transaction_count', models.PositiveIntegerField()),
+                ('last_transaction_id', models.BigIntegerField(blank=True, null=True)),
+                ('holdings', models.JSONField(default=dict, help_text='{stock_id: [quantity, currency, total_cost_cents, average_price_cents]}, closed positions included')),
+                ('acquisition_prices', models.JSONField(default=dict, help_text='{stock_id: executed price of the latest BUY}')),
+                ('cash_pen_cents', models.BigIntegerField(default=0)),
+                ('cash_usd_cents', models.BigIntegerField(default=0)),
+                ('total_deposits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_checkpoints', to='portfolio.portfolio')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('portfolio', 'date'), name='uniq_ledger_checkpoint_portfolio_date')],
+            },
+        ),
+    ]
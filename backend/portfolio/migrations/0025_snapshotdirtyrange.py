@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0024_ledgercheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotDirtyRange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_date', models.DateField()),
+                ('reason', models.CharField(choices=[('price', 'Historical price'), ('fx', 'FX rate'), ('transaction', 'Transaction'), ('manual', 'Manual')], default='manual', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_dirty_ranges', to='portfolio.portfolio')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['portfolio', 'from_date'], name='dirty_portfolio_from_idx')],
+            },
+        ),
+    ]
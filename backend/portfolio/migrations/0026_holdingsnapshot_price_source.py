@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0025_snapshotdirtyrange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holdingsnapshot',
+            name='fx_rate',
+            field=models.DecimalField(blank=True, decimal_places=10, help_text='Base-currency units per 1 stock-currency unit', max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='holdingsnapshot',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Per-share price in the stock currency the row was valued at', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='holdingsnapshot',
+            name='price_source',
+            field=models.CharField(blank=True, default='', help_text='Tier that resolved the price (e.g., exact_date, current_price_fallback)', max_length=32),
+        ),
+    ]
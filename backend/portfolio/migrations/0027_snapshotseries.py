@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0026_holdingsnapshot_price_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month the runs cover')),
+                ('runs', models.JSONField(default=list)),
+                ('first_date', models.DateField()),
+                ('last_date', models.DateField()),
+                ('portfolio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_series', to='portfolio.portfolio')),
+            ],
+            options={
+                'ordering': ['month'],
+                'indexes': [models.Index(fields=['last_date', 'portfolio'], name='series_last_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('portfolio', 'month'), name='uniq_snapshot_series_portfolio_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0027_snapshotseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FXMetricSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caller', models.CharField(max_length=150)),
+                ('source', models.CharField(max_length=20)),
+                ('tier', models.CharField(max_length=40)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total_us', models.BigIntegerField(default=0)),
+                ('buckets', models.JSONField(default=list, help_text='Observations per latency bucket, overflow last')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['caller', 'source', 'tier'],
+                'constraints': [models.UniqueConstraint(fields=('caller', 'source', 'tier'), name='uniq_fx_metric_series')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0028_fxmetricseries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ledgercheckpoint',
+            name='content_checksum',
+            field=models.BigIntegerField(blank=True, help_text='Sum of transaction_checksum_expression() over the fingerprinted transactions', null=True),
+        ),
+    ]
@@ -4,8 +4,12 @@ from .transaction import Transaction
 from .realized_pnl import RealizedPNL
 from .daily_snapshot import DailyPortfolioSnapshot
 from .performance import PortfolioPerformance
-from .fx_rate import FXRate
+from .fx_rate import FXRate, EffectiveFXRate
+from .fx_metric import FXMetricSeries
 from .benchmark import BenchmarkSeries, BenchmarkPrice
+from .ledger_checkpoint import LedgerCheckpoint
+from .snapshot_dirty_range import SnapshotDirtyRange
+from .snapshot_series import SnapshotSeries
 
 
 __all__ = [
@@ -16,6 +20,11 @@ __all__ = [
     'DailyPortfolioSnapshot',
     'PortfolioPerformance',
     'FXRate',
+    'EffectiveFXRate',
+    'FXMetricSeries',
     'BenchmarkSeries',
     'BenchmarkPrice',
+    'LedgerCheckpoint',
+    'SnapshotDirtyRange',
+    'SnapshotSeries',
 ]
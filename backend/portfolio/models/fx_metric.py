@@ -0,0 +1,25 @@
+from django.db import models
+
+
+class FXMetricSeries(models.Model):
+    """FX lookup counters and latency histogram for one (caller, source, tier).
+
+    fx_metrics buffers observations per process and adds them here, so every web and
+    worker process reports into the same rows.
+    """
+    caller = models.CharField(max_length=150)
+    source = models.CharField(max_length=20)
+    tier = models.CharField(max_length=40)
+    count = models.BigIntegerField(default=0)
+    total_us = models.BigIntegerField(default=0)
+    buckets = models.JSONField(default=list, help_text='Observations per latency bucket, overflow last')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['caller', 'source', 'tier'], name='uniq_fx_metric_series'),
+        ]
+        ordering = ['caller', 'source', 'tier']
+
+    def __str__(self):
+        return f"{self.caller} {self.source}/{self.tier}: {self.count}"
@@ -43,3 +43,32 @@ class FXRate(models.Model):
 
     def __str__(self):
         return f"{self.date} {self.quote_currency}->{self.base_currency} {self.rate}"
+
+
+class EffectiveFXRate(models.Model):
+    """FX rate already resolved through get_fx_rate's fallback cascade for one calendar day.
+
+    Rows are dense per (date, pair, rate_type, session) from the first ingested FXRate up
+    to the latest one, and are rebuilt whenever FXRate rows change.
+    """
+    date = models.DateField()
+    base_currency = models.CharField(max_length=3)
+    quote_currency = models.CharField(max_length=3)
+    rate_type = models.CharField(max_length=10, choices=FXRate.RateType.choices)
+    session = models.CharField(max_length=10, choices=FXRate.Session.choices)
+    rate = models.DecimalField(max_digits=16, decimal_places=6)
+    tier = models.CharField(max_length=32, help_text='Fallback tier that produced the rate (e.g., exact, prior_same_type)')
+    source_date = models.DateField(help_text='Date of the FXRate row the rate was taken from')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'base_currency', 'quote_currency', 'rate_type', 'session'],
+                name='uniq_effective_fxrate_date_pair'
+            ),
+        ]
+        ordering = ['-date', 'base_currency', 'quote_currency']
+
+    def __str__(self):
+        return f"{self.date} {self.quote_currency}->{self.base_currency} {self.rate} ({self.tier})"
@@ -24,6 +24,26 @@ class HoldingSnapshot(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.00'))]
     )
+    price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text='Per-share price in the stock currency the row was valued at'
+    )
+    price_source = models.CharField(
+        max_length=32,
+        blank=True,
+        default='',
+        help_text='Tier that resolved the price (e.g., exact_date, current_price_fallback)'
+    )
+    fx_rate = models.DecimalField(
+        max_digits=20,
+        decimal_places=10,
+        null=True,
+        blank=True,
+        help_text='Base-currency units per 1 stock-currency unit'
+    )
 
     class Meta:
         unique_together = ('portfolio', 'stock', 'date')
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.db import models
+
+
+class LedgerCheckpoint(models.Model):
+    """A portfolio's reconstructed ledger state at the end of ``date``.
+
+    Historical reconstructions start from the nearest earlier checkpoint and replay only
+    the transactions after it. ``transaction_count``, ``last_transaction_id`` and
+    ``content_checksum`` fingerprint the transactions on or before ``date``, so a
+    checkpoint made stale by a back-dated or edited transaction is detected and dropped
+    instead of being trusted.
+    """
+    portfolio = models.ForeignKey(
+        'Portfolio',
+        on_delete=models.CASCADE,
+        related_name='ledger_checkpoints'
+    )
+    date = models.DateField()
+    transaction_count = models.PositiveIntegerField()
+    last_transaction_id = models.BigIntegerField(null=True, blank=True)
+    content_checksum = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Sum of transaction_checksum_expression() over the fingerprinted transactions'
+    )
+    holdings = models.JSONField(
+        default=dict,
+        help_text='{stock_id: [quantity, currency, total_cost_cents, average_price_cents]}, closed positions included'
+    )
+    acquisition_prices = models.JSONField(
+        default=dict,
+        help_text='{stock_id: executed price of the latest BUY}'
+    )
+    cash_pen_cents = models.BigIntegerField(default=0)
+    cash_usd_cents = models.BigIntegerField(default=0)
+    total_deposits = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['portfolio', 'date'], name='uniq_ledger_checkpoint_portfolio_date'),
+        ]
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.portfolio_id} ledger checkpoint ({self.date})"
+
+    def running_holdings(self):
+        """Holdings in SnapshotService's running form: int cents keyed by int stock id."""
+        return {
+            int(stock_id): {
+                'quantity': quantity,
+                'currency': currency,
+                'total_cost': total_cost,
+                'average_price': average_price,
+            }
+            for stock_id, (quantity, currency, total_cost, average_price) in self.holdings.items()
+        }
+
+    def wallets(self):
+        return {'PEN': self.cash_pen_cents, 'USD': self.cash_usd_cents}
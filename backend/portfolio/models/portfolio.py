@@ -61,6 +61,11 @@ class Portfolio(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    ledger_version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text='Incremented whenever the transaction ledger changes; keys historical caches'
+    )
 
     class Meta:
         constraints = [
@@ -88,6 +93,21 @@ class Portfolio(models.Model):
     def __str__(self):
         return f"{self.user.email}'s Portfolio"
 
+    def save(self, *args, **kwargs):
+        # ledger_version only moves through bump_ledger_version; a full save from an
+        # instance loaded before a trade must not rewind it.
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'ledger_version'
+            ]
+        super().save(*args, **kwargs)
+
+    def bump_ledger_version(self):
+        """Advance the ledger version, inside the caller's transaction, and refresh it here."""
+        Portfolio.all_objects.filter(pk=self.pk).update(ledger_version=F('ledger_version') + 1)
+        self.refresh_from_db(fields=['ledger_version'])
+
     @property
     def total_value(self):
         return self.get_total_cash_balance(self.base_currency) + self.current_investment_value
@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class SnapshotDirtyRange(models.Model):
+    """Snapshots of ``portfolio`` from ``from_date`` on were built from inputs that changed since.
+
+    Rows are appended whenever a late price, an FX correction or an edited transaction
+    invalidates stored snapshots; DirtyRangeService.recompute coalesces them per
+    portfolio and deletes the rows it processed.
+    """
+    class Reason(models.TextChoices):
+        PRICE = 'price', 'Historical price'
+        FX = 'fx', 'FX rate'
+        TRANSACTION = 'transaction', 'Transaction'
+        MANUAL = 'manual', 'Manual'
+
+    portfolio = models.ForeignKey(
+        'Portfolio',
+        on_delete=models.CASCADE,
+        related_name='snapshot_dirty_ranges'
+    )
+    from_date = models.DateField()
+    reason = models.CharField(max_length=16, choices=Reason.choices, default=Reason.MANUAL)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['portfolio', 'from_date'], name='dirty_portfolio_from_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio_id} dirty from {self.from_date} ({self.reason})"
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class SnapshotSeries(models.Model):
+    """One month of a portfolio's daily snapshot values, run-length encoded.
+
+    Written instead of DailyPortfolioSnapshot rows when SNAPSHOT_STORAGE is 'rle'.
+    ``runs`` is a list of ``[offset, days, total_cents, cash_cents, investment_cents,
+    deposits_cents]``: ``days`` consecutive calendar days starting ``offset`` days after
+    ``month`` share the same values. Days without a snapshot are simply not covered.
+    Read through portfolio.services.snapshot_store, which expands both formats into
+    daily rows.
+    """
+    portfolio = models.ForeignKey(
+        'Portfolio',
+        on_delete=models.CASCADE,
+        related_name='snapshot_series'
+    )
+    month = models.DateField(help_text='First day of the month the runs cover')
+    runs = models.JSONField(default=list)
+    first_date = models.DateField()
+    last_date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['portfolio', 'month'], name='uniq_snapshot_series_portfolio_month'),
+        ]
+        ordering = ['month']
+        indexes = [
+            models.Index(fields=['last_date', 'portfolio'], name='series_last_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.portfolio_id} snapshot series ({self.month:%Y-%m})"
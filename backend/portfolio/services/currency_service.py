@@ -1,9 +1,17 @@
 from decimal import Decimal, ROUND_HALF_UP
 
-from portfolio.services.fx_service import get_current_fx_context, get_fx_rate
-
-
-SUPPORTED_CURRENCIES = {'PEN', 'USD'}
+from portfolio.services import money_kernel
+from portfolio.services.fx_matrix import (
+    FX_PIVOT_CURRENCY,
+    apply_factors,
+    get_configured_currencies,
+    get_fx_factors,
+    get_fx_matrices,
+)
+from portfolio.services.fx_service import get_current_fx_context
+
+
+SUPPORTED_CURRENCIES = set(get_configured_currencies())
 DISPLAY_CURRENCY_NATIVE = 'NATIVE'
 
 
@@ -39,30 +47,81 @@ def convert_amount(amount, from_currency, to_currency, *, snapshot_date=None, no
         return quantize_money(amount)
 
     fx_date, fx_session = get_snapshot_fx_context(snapshot_date=snapshot_date, now=now, session=session)
+    factors = get_fx_factors(
+        fx_date,
+        from_currency,
+        to_currency,
+        session=fx_session,
+        rate_type=rate_type,
+        require_rate=require_rate,
+    )
+    return quantize_money(apply_factors(amount, *factors))
 
-    if from_currency == 'USD' and to_currency == 'PEN':
-        rate = get_fx_rate(
-            fx_date,
-            'PEN',
-            'USD',
-            rate_type=rate_type,
-            session=fx_session,
-            require_rate=require_rate,
-        )
-        return quantize_money(amount * rate)
 
-    if from_currency == 'PEN' and to_currency == 'USD':
-        rate = get_fx_rate(
-            fx_date,
-            'PEN',
-            'USD',
-            rate_type=rate_type,
+def _strict_currencies(*currencies):
+    return {currency for currency in currencies if currency != FX_PIVOT_CURRENCY}
+
+
+def convert_amounts_bulk(rows, to_currency, *, now=None, rate_type='mid', session=None, require_rate=False):
+    """Convert many ``(amount, from_currency, snapshot_date)`` rows into ``to_currency``.
+
+    Returns the converted amounts in input order, identical to calling convert_amount on
+    each row, but cross-rate matrices are built with one get_fx_rates_bulk call per
+    currency and session instead of one get_fx_rate cascade per row.
+    """
+    to_currency = normalize_currency(to_currency)
+    prepared = []
+    dates_by_session = {}
+    strict_currencies = set()
+    for amount, from_currency, snapshot_date in rows:
+        amount = Decimal(amount or '0')
+        from_currency = normalize_currency(from_currency)
+        fx_key = None
+        if from_currency != to_currency:
+            fx_key = get_snapshot_fx_context(snapshot_date=snapshot_date, now=now, session=session)
+            dates_by_session.setdefault(fx_key[1], set()).add(fx_key[0])
+            if require_rate:
+                strict_currencies |= _strict_currencies(from_currency, to_currency)
+        prepared.append((amount, from_currency, fx_key))
+
+    matrices = {}
+    for fx_session, fx_dates in dates_by_session.items():
+        session_matrices = get_fx_matrices(
+            fx_dates,
             session=fx_session,
-            require_rate=require_rate,
+            rate_type=rate_type,
+            strict_currencies=strict_currencies,
         )
-        return quantize_money(amount / rate)
-
-    raise ValueError(f"Unsupported conversion: {from_currency}->{to_currency}")
+        for fx_date, matrix in session_matrices.items():
+            matrices[(fx_date, fx_session)] = matrix
+
+    # Legs through PEN are a single multiply or divide and go through the int-cent
+    # kernel; cross pairs need both factors and are converted one by one.
+    directions = []
+    rates = []
+    cross = []
+    for index, (amount, from_currency, fx_key) in enumerate(prepared):
+        if fx_key is None:
+            directions.append(money_kernel.DIRECTION_KEEP)
+            rates.append(None)
+            continue
+        multiplier, divisor = matrices[fx_key].factors(from_currency, to_currency)
+        if divisor == 1:
+            directions.append(money_kernel.DIRECTION_MULTIPLY)
+            rates.append(multiplier)
+        elif multiplier == 1:
+            directions.append(money_kernel.DIRECTION_DIVIDE)
+            rates.append(divisor)
+        else:
+            directions.append(money_kernel.DIRECTION_KEEP)
+            rates.append(None)
+            cross.append(index)
+
+    results = _convert_batch([amount for amount, _, _ in prepared], directions, rates)
+    for index in cross:
+        amount, from_currency, fx_key = prepared[index]
+        results[index] = quantize_money(matrices[fx_key].convert(amount, from_currency, to_currency))
+    return results
 
 
 def convert_with_pen_per_usd_rate(amount, from_currency, to_currency, pen_per_usd):
@@ -86,6 +145,63 @@ def convert_with_pen_per_usd_rate(amount, from_currency, to_currency, pen_per_us
     raise ValueError(f"Unsupported conversion: {from_currency}->{to_currency}")
 
 
+def convert_with_pen_per_usd_rates(amounts, from_currencies, to_currency, pen_per_usd_rates):
+    """Batch convert_with_pen_per_usd_rate over parallel sequences, in int64 cents with NumPy.
+
+    Results equal the scalar function element for element, including ROUND_HALF_UP ties
+    and ``-0.00``; values the integer kernel cannot represent exactly take the scalar path.
+    """
+    to_currency = normalize_currency(to_currency)
+    directions_by_currency = {}
+    directions = []
+    for from_currency in from_currencies:
+        direction = directions_by_currency.get(from_currency)
+        if direction is None:
+            normalized = normalize_currency(from_currency)
+            if normalized == to_currency:
+                direction = money_kernel.DIRECTION_KEEP
+            elif normalized == 'USD' and to_currency == 'PEN':
+                direction = money_kernel.DIRECTION_MULTIPLY
+            elif normalized == 'PEN' and to_currency == 'USD':
+                direction = money_kernel.DIRECTION_DIVIDE
+            else:
+                raise ValueError(f"Unsupported conversion: {normalized}->{to_currency}")
+            directions_by_currency[from_currency] = direction
+        directions.append(direction)
+    return _convert_batch(amounts, directions, pen_per_usd_rates)
+
+
+def _convert_batch(amounts, directions, rates):
+    """Keep, multiply or divide each amount by its rate and quantize, via money_kernel."""
+    amounts = [Decimal(amount or '0') for amount in amounts]
+    checked_rates = []
+    for direction, rate in zip(directions, rates):
+        if direction != money_kernel.DIRECTION_KEEP:
+            if not isinstance(rate, Decimal):
+                rate = Decimal(rate or '0')
+            if rate <= 0:
+                raise ValueError("pen_per_usd must be positive")
+        checked_rates.append(rate)
+    rates = checked_rates
+
+    cents, micros, kernel_directions, fallback = money_kernel.to_kernel_inputs(amounts, rates, directions)
+    converted = money_kernel.convert_cents(cents, micros, kernel_directions).tolist()
+    results = [money_kernel.cents_to_decimal(value) for value in converted]
+    for index in fallback.nonzero()[0].tolist():
+        amount, rate, direction = amounts[index], rates[index], directions[index]
+        if direction == money_kernel.DIRECTION_KEEP:
+            results[index] = quantize_money(amount)
+        elif direction == money_kernel.DIRECTION_MULTIPLY:
+            results[index] = quantize_money(amount * rate)
+        else:
+            results[index] = quantize_money(amount / rate)
+    # Decimal keeps the sign of a negative amount that rounds to zero ("-0.00").
+    for index, value in enumerate(converted):
+        if not value and amounts[index].is_signed() and not fallback[index]:
+            results[index] = results[index].copy_negate()
+    return results
+
+
 def get_portfolio_reporting_currency(portfolio, requested=None):
     if requested not in (None, ''):
         return normalize_currency(requested)
@@ -98,15 +214,15 @@ def get_transaction_original_currency(transaction):
     return normalize_currency(transaction.cash_currency or 'PEN')
 
 
+def _get_transaction_source_amount(transaction, use_counter_amount):
+    if use_counter_amount and transaction.transaction_type == 'CONVERT' and transaction.counter_amount is not None:
+        return Decimal(transaction.counter_amount or '0.00'), normalize_currency(transaction.counter_currency)
+    return Decimal(transaction.amount or '0.00'), get_transaction_original_currency(transaction)
+
+
 def get_transaction_amount_in_currency(transaction, to_currency, *, use_counter_amount=False, snapshot_date=None):
     target_currency = normalize_currency(to_currency)
-
-    if use_counter_amount and transaction.transaction_type == 'CONVERT' and transaction.counter_amount is not None:
-        source_amount = Decimal(transaction.counter_amount or '0.00')
-        source_currency = normalize_currency(transaction.counter_currency)
-    else:
-        source_amount = Decimal(transaction.amount or '0.00')
-        source_currency = get_transaction_original_currency(transaction)
+    source_amount, source_currency = _get_transaction_source_amount(transaction, use_counter_amount)
 
     if source_currency == target_currency:
         return quantize_money(source_amount)
@@ -126,3 +242,37 @@ def get_transaction_amount_in_currency(transaction, to_currency, *, use_counter_
         snapshot_date=snapshot_date,
         session='cierre',
     )
+
+
+def get_transaction_amounts_in_currency(transactions, to_currency, *, use_counter_amount=False):
+    """Bulk get_transaction_amount_in_currency, valuing each transaction on its own date.
+
+    Transactions with a frozen fx_rate are converted in one batch; the rest share a
+    single convert_amounts_bulk call. Returns amounts in input order.
+    """
+    target_currency = normalize_currency(to_currency)
+    direct = []
+    pending = []
+    for index, transaction in enumerate(transactions):
+        source_amount, source_currency = _get_transaction_source_amount(transaction, use_counter_amount)
+        if source_currency == target_currency:
+            direct.append((index, source_amount, source_currency, None))
+        elif transaction.fx_rate and {source_currency, target_currency} == {'PEN', 'USD'}:
+            direct.append((index, source_amount, source_currency, Decimal(transaction.fx_rate)))
+        else:
+            pending.append((index, (source_amount, source_currency, transaction.timestamp.date())))
+
+    amounts = [None] * (len(direct) + len(pending))
+    converted = convert_with_pen_per_usd_rates(
+        [row[1] for row in direct],
+        [row[2] for row in direct],
+        target_currency,
+        [row[3] for row in direct],
+    )
+    for (index, *_), amount in zip(direct, converted):
+        amounts[index] = amount
+
+    converted = convert_amounts_bulk([row for _, row in pending], target_currency, session='cierre')
+    for (index, _), amount in zip(pending, converted):
+        amounts[index] = amount
+    return amounts
@@ -0,0 +1,136 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import Max, Min, Q
+
+from portfolio.models import Portfolio, SnapshotDirtyRange
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.services import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+
+class DirtyRangeService:
+    """Registry of stored snapshot ranges whose inputs changed, and the worker that rebuilds them.
+
+    Marks are cheap: only portfolios with a snapshot on or after the changed date are
+    recorded, and a portfolio already dirty from that date or earlier is skipped.
+    recompute() coalesces each portfolio's ranges into one from its earliest date and
+    rewrites just the days that already had snapshots.
+    """
+
+    @classmethod
+    def mark(cls, portfolio_ids, from_date, reason=SnapshotDirtyRange.Reason.MANUAL):
+        """Record that snapshots of ``portfolio_ids`` from ``from_date`` on are stale."""
+        candidates = snapshot_store.portfolios_with_snapshots(from_date, portfolio_ids)
+        return cls._record(candidates, from_date, reason)
+
+    @classmethod
+    def mark_price_change(cls, stock_id, price_date):
+        """A historical price for ``stock_id`` on ``price_date`` was written or corrected.
+
+        Without an earlier stored price, the days before ``price_date`` were valued from a
+        later price or a fallback, so the mark starts at the stock's first holding row.
+        """
+        from stocks.models import HistoricalStockPrice
+
+        if not HistoricalStockPrice.objects.filter(stock_id=stock_id, date__lt=price_date).exists():
+            first_held = HoldingSnapshot.objects.filter(stock_id=stock_id, date__lt=price_date).aggregate(
+                first=Min('date')
+            )['first']
+            price_date = first_held or price_date
+        held = Q(date__gte=price_date)
+        if snapshot_store.is_rle():
+            # Change-point rows: a position opened earlier may still be held on price_date.
+            held |= Q(date__lt=price_date, quantity__gt=0)
+        holders = set(
+            HoldingSnapshot.objects.filter(held, stock_id=stock_id)
+            .values_list('portfolio_id', flat=True)
+            .distinct()
+        )
+        if snapshot_store.is_rle():
+            holders = snapshot_store.portfolios_with_snapshots(price_date, holders)
+        return cls._record(holders, price_date, SnapshotDirtyRange.Reason.PRICE)
+
+    @classmethod
+    def mark_fx_change(cls, from_date):
+        """A closing FX rate effective from ``from_date`` was written or corrected."""
+        from portfolio.services.ledger_checkpoint_service import LedgerCheckpointService
+
+        # Recomputes would otherwise resume from cash and deposits converted at the old rate.
+        LedgerCheckpointService.drop_from(from_date)
+        snapshotted = snapshot_store.portfolios_with_snapshots(from_date)
+        return cls._record(snapshotted, from_date, SnapshotDirtyRange.Reason.FX)
+
+    @staticmethod
+    def _record(portfolio_ids, from_date, reason):
+        if not portfolio_ids:
+            return 0
+        covered = set(
+            SnapshotDirtyRange.objects.filter(
+                portfolio_id__in=portfolio_ids,
+                from_date__lte=from_date,
+            ).values_list('portfolio_id', flat=True)
+        )
+        rows = [
+            SnapshotDirtyRange(portfolio_id=portfolio_id, from_date=from_date, reason=reason)
+            for portfolio_id in sorted(portfolio_ids - covered)
+        ]
+        SnapshotDirtyRange.objects.bulk_create(rows)
+        if rows:
+            logger.info(f"Marked {len(rows)} portfolio(s) dirty from {from_date} ({reason})")
+        return len(rows)
+
+    @classmethod
+    def recompute(cls, limit=None):
+        """Rebuild the stored snapshots of up to ``limit`` dirty portfolios, oldest marks first.
+
+        Each portfolio is recomputed with the range engine from its earliest dirty date to
+        its latest stored snapshot, and only days that already had a snapshot are written.
+        The rows processed are deleted afterwards, so marks added meanwhile survive for the
+        next run; a portfolio that fails keeps its rows and is retried then.
+
+        Returns a summary dict, e.g.:
+          {'portfolios': 3, 'days': 41, 'failed': [], 'duration_s': 0.8}
+        """
+        from portfolio.services.snapshot_service import SnapshotService
+
+        started = time.monotonic()
+        limit = limit or settings.SNAPSHOT_DIRTY_BATCH_SIZE
+        pending = list(
+            SnapshotDirtyRange.objects.values('portfolio_id')
+            .annotate(from_date=Min('from_date'), first_id=Min('id'), last_id=Max('id'))
+            .order_by('first_id')[:limit]
+        )
+        portfolios = Portfolio.all_objects.in_bulk([entry['portfolio_id'] for entry in pending])
+
+        out = {'portfolios': 0, 'days': 0, 'failed': []}
+        for entry in pending:
+            portfolio = portfolios.get(entry['portfolio_id'])
+            if portfolio is not None and not portfolio.is_deleted:
+                dates = snapshot_store.snapshot_dates(portfolio, entry['from_date'])
+                if dates:
+                    try:
+                        SnapshotService.create_snapshots_for_range(
+                            portfolio, entry['from_date'], max(dates), dates=dates
+                        )
+                    except Exception:
+                        logger.exception(f"Dirty-range recompute failed for portfolio {portfolio.id} from {entry['from_date']}")
+                        out['failed'].append(portfolio.id)
+                        continue
+                    out['days'] += len(dates)
+                out['portfolios'] += 1
+
+            SnapshotDirtyRange.objects.filter(
+                portfolio_id=entry['portfolio_id'],
+                id__lte=entry['last_id'],
+            ).delete()
+
+        out['duration_s'] = round(time.monotonic() - started, 3)
+        if pending:
+            logger.info(
+                f"Recomputed {out['days']} snapshot day(s) for {out['portfolios']} dirty portfolio(s) "
+                f"in {out['duration_s']}s" + (f", failed: {out['failed']}" if out['failed'] else "")
+            )
+        return out
@@ -0,0 +1,73 @@
+from datetime import timedelta
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Max, Min
+
+from portfolio.services.fx_curve import FXCurve
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_effective_fx_rates(base_currency='PEN', quote_currency='USD', start_date=None):
+    """Re-materialize EffectiveFXRate rows for a pair from start_date through its latest FXRate.
+
+    Every calendar day in that span gets one row per (rate_type, session), resolved with
+    the same cascade as get_fx_rate. Only dates on or after start_date can change when
+    FXRate rows are written for start_date, so incremental rebuilds pass that date; with
+    no start_date the whole pair is rebuilt. A start_date past the materialized range is
+    pulled back to the first unmaterialized day so the table never has gaps.
+    Returns the number of rows written.
+    """
+    FXRate = apps.get_model('portfolio', 'FXRate')
+    EffectiveFXRate = apps.get_model('portfolio', 'EffectiveFXRate')
+
+    bounds = FXRate.objects.filter(
+        base_currency=base_currency,
+        quote_currency=quote_currency,
+    ).aggregate(first=Min('date'), last=Max('date'))
+
+    with transaction.atomic():
+        stale = EffectiveFXRate.objects.filter(base_currency=base_currency, quote_currency=quote_currency)
+        if start_date is not None:
+            materialized_until = stale.filter(date__lt=start_date).aggregate(last=Max('date'))['last']
+            start_date = materialized_until + timedelta(days=1) if materialized_until else None
+        if start_date is not None:
+            stale = stale.filter(date__gte=start_date)
+        stale.delete()
+
+        if bounds['first'] is None:
+            return 0
+        start = max(start_date or bounds['first'], bounds['first'])
+        end = bounds['last']
+        if start > end:
+            return 0
+
+        curve = FXCurve.load(base_currency, quote_currency, start_date=start, end_date=end)
+        rows = []
+        current = start
+        while current <= end:
+            for rate_type in FXRate.RateType.values:
+                for session in FXRate.Session.values:
+                    rate, tier, source_date = curve.resolve_with_source(current, rate_type=rate_type, session=session)
+                    if rate is None:
+                        continue
+                    rows.append(EffectiveFXRate(
+                        date=current,
+                        base_currency=base_currency,
+                        quote_currency=quote_currency,
+                        rate_type=rate_type,
+                        session=session,
+                        rate=rate,
+                        tier=tier,
+                        source_date=source_date,
+                    ))
+            current += timedelta(days=1)
+        EffectiveFXRate.objects.bulk_create(rows, batch_size=1000)
+
+    logger.info(
+        "Materialized %s effective FX rows for %s->%s from %s to %s",
+        len(rows), quote_currency, base_currency, start, end,
+    )
+    return len(rows)
@@ -0,0 +1,208 @@
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.apps import apps
+from django.db.models import BigIntegerField, Case, ExpressionWrapper, F, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Abs, Cast, Coalesce, NullIf, Round, TruncDate, Upper
+from django.db.models.lookups import LessThan
+
+from portfolio.services import money_kernel
+from portfolio.services.fx_matrix import FX_PIVOT_CURRENCY, get_configured_currencies
+from portfolio.services.fx_service import get_fx_rates_bulk
+
+_BIGINT = BigIntegerField()
+
+# Transaction.fx_rate is frozen as PEN per 1 USD.
+FROZEN_RATE_QUOTE = 'USD'
+
+
+def _int_units(expression, scale):
+    """``expression * scale`` as an integer, e.g. a 2-place Decimal as cents."""
+    return Cast(Round(expression * Value(scale)), _BIGINT)
+
+
+def _round_half_up_div(numerator, denominator):
+    """SQL twin of money_kernel._round_half_up_div for integer expressions."""
+    quotient = ExpressionWrapper(
+        (Abs(numerator) * Value(2) + denominator) / (denominator * Value(2)),
+        output_field=_BIGINT,
+    )
+    return Case(
+        When(LessThan(numerator, 0), then=Value(0) - quotient),
+        default=quotient,
+        output_field=_BIGINT,
+    )
+
+
+class FXConversionQuery:
+    """Converted sums over a queryset, computed by the database.
+
+    Every row is valued on ``date`` (an expression over the queryset's model) at the
+    effective PEN rate, mirroring convert_amount: amounts become int cents, rates int
+    micro-units and each row is rounded half-up to the cent before summing, exactly like
+    quantize_money on the Decimal result. Rates come from the materialized
+    EffectiveFXRate table; dates outside its range (not yet materialized, or before any
+    FX data) are resolved once in Python with get_fx_rates_bulk and inlined, so results
+    match the Python path row for row. Non-PEN pairs triangulate through PEN; stored
+    direct cross pairs are not consulted. Build every expression before reading
+    ``queryset``: converted_cents adds the annotations its expressions refer to.
+
+    Usage::
+
+        fx = FXConversionQuery(queryset, date=F('date'))
+        amount = fx.converted_cents(F('total_value'), F('portfolio__base_currency'), 'USD')
+        totals = fx.queryset.aggregate(total=Sum(amount))
+    """
+
+    def __init__(self, queryset, *, date, rate_type='mid', session='cierre'):
+        self.date = date
+        self.queryset = queryset.order_by().annotate(fx_date=date)
+        self.rate_type = rate_type
+        self.session = session
+        self._currency_aliases = {}
+        self._overrides = self._resolve_unmaterialized_rates()
+
+    def _resolve_unmaterialized_rates(self):
+        """``{currency: [(micros, dates), ...]}`` for dates the EffectiveFXRate table doesn't cover."""
+        EffectiveFXRate = apps.get_model('portfolio', 'EffectiveFXRate')
+        currencies = [currency for currency in get_configured_currencies() if currency != FX_PIVOT_CURRENCY]
+
+        covered = None
+        for currency in currencies:
+            bounds = EffectiveFXRate.objects.filter(
+                base_currency=FX_PIVOT_CURRENCY,
+                quote_currency=currency,
+                rate_type=self.rate_type,
+                session=self.session,
+            ).aggregate(first=Min('date'), last=Max('date'))
+            if bounds['first'] is None:
+                covered = False
+                break
+            if covered is None:
+                covered = (bounds['first'], bounds['last'])
+            else:
+                covered = (max(covered[0], bounds['first']), min(covered[1], bounds['last']))
+
+        dates = self.queryset
+        if covered:
+            dates = dates.exclude(fx_date__range=covered)
+        dates = set(dates.values_list(F('fx_date'), flat=True).distinct())
+        if not dates:
+            return {}
+
+        overrides = {}
+        for currency in currencies:
+            dates_by_micros = {}
+            for fx_date, rate in get_fx_rates_bulk(
+                dates, FX_PIVOT_CURRENCY, currency, rate_type=self.rate_type, session=self.session
+            ).items():
+                micros = int((Decimal(rate) * money_kernel.RATE_SCALE).to_integral_value())
+                dates_by_micros.setdefault(micros, []).append(fx_date)
+            overrides[currency] = sorted(dates_by_micros.items())
+        return overrides
+
+    def _currency_alias(self, currency):
+        """Annotation name for a currency expression so rate subqueries can OuterRef it."""
+        key = repr(currency)
+        name = self._currency_aliases.get(key)
+        if name is None:
+            name = f'fx_currency_{len(self._currency_aliases)}'
+            self._currency_aliases[key] = name
+            self.queryset = self.queryset.annotate(**{name: Upper(currency)})
+        return name
+
+    def _effective_micros(self, quote_currency):
+        EffectiveFXRate = apps.get_model('portfolio', 'EffectiveFXRate')
+        rate = Subquery(
+            EffectiveFXRate.objects.filter(
+                date=OuterRef('fx_date'),
+                base_currency=FX_PIVOT_CURRENCY,
+                quote_currency=quote_currency,
+                rate_type=self.rate_type,
+                session=self.session,
+            ).values('rate')[:1]
+        )
+        return _int_units(rate, money_kernel.RATE_SCALE)
+
+    def _source_micros(self, alias, to_currency, frozen_rate):
+        whens = [When(Q(**{alias: FX_PIVOT_CURRENCY}), then=Value(money_kernel.RATE_SCALE))]
+        if frozen_rate is not None and to_currency == FX_PIVOT_CURRENCY:
+            whens.append(When(
+                Q(**{alias: FROZEN_RATE_QUOTE, f'{frozen_rate.name}__gt': 0}),
+                then=_int_units(frozen_rate, money_kernel.RATE_SCALE),
+            ))
+        for currency, entries in self._overrides.items():
+            for micros, dates in entries:
+                whens.append(When(Q(fx_date__in=dates, **{alias: currency}), then=Value(micros)))
+        return Case(*whens, default=self._effective_micros(OuterRef(alias)), output_field=_BIGINT)
+
+    def _target_micros(self, alias, to_currency, frozen_rate):
+        if to_currency == FX_PIVOT_CURRENCY:
+            return Value(money_kernel.RATE_SCALE)
+        whens = []
+        if frozen_rate is not None and to_currency == FROZEN_RATE_QUOTE:
+            whens.append(When(
+                Q(**{alias: FX_PIVOT_CURRENCY, f'{frozen_rate.name}__gt': 0}),
+                then=_int_units(frozen_rate, money_kernel.RATE_SCALE),
+            ))
+        for micros, dates in self._overrides.get(to_currency, ()):
+            whens.append(When(fx_date__in=dates, then=Value(micros)))
+        return Case(*whens, default=self._effective_micros(to_currency), output_field=_BIGINT)
+
+    def converted_cents(self, amount, currency, to_currency, *, frozen_rate=None):
+        """Per-row expression: ``amount`` in ``currency`` as int cents of ``to_currency``.
+
+        ``frozen_rate`` optionally names a PEN-per-USD rate stored on the row; like
+        get_transaction_amount_in_currency it wins for PEN<->USD when positive.
+        """
+        alias = self._currency_alias(currency)
+        cents = Coalesce(_int_units(amount, money_kernel.CENTS_PER_UNIT), Value(0), output_field=_BIGINT)
+        converted = _round_half_up_div(
+            cents * self._source_micros(alias, to_currency, frozen_rate),
+            self._target_micros(alias, to_currency, frozen_rate),
+        )
+        return Case(
+            When(Q(**{alias: to_currency}), then=cents),
+            default=converted,
+            output_field=_BIGINT,
+        )
+
+
+def cents_sum(expression, **kwargs):
+    """``Sum`` of an int-cent expression; 0 instead of NULL for empty groups."""
+    return Coalesce(Sum(expression, **kwargs), Value(0), output_field=_BIGINT)
+
+
+def transaction_source_currency():
+    """get_transaction_original_currency as an expression over Transaction."""
+    cash_currency = Coalesce(NullIf(F('cash_currency'), Value('')), Value(FX_PIVOT_CURRENCY))
+    return Case(
+        When(
+            transaction_type__in=['BUY', 'SELL'],
+            then=Coalesce(NullIf(F('stock__currency'), Value('')), cash_currency),
+        ),
+        default=cash_currency,
+    )
+
+
+def transaction_native_cents():
+    """Transaction.amount as int cents, unconverted."""
+    return Coalesce(_int_units(F('amount'), money_kernel.CENTS_PER_UNIT), Value(0), output_field=_BIGINT)
+
+
+def transaction_fx_query(queryset):
+    """FXConversionQuery valuing transactions on their UTC timestamp date, like the Python path."""
+    return FXConversionQuery(queryset, date=TruncDate('timestamp', tzinfo=dt_timezone.utc))
+
+
+def transaction_amount_cents(fx, to_currency, *, use_counter_amount=False):
+    """get_transaction_amount_in_currency as an int-cent expression for ``fx.queryset``."""
+    amount = fx.converted_cents(F('amount'), transaction_source_currency(), to_currency, frozen_rate=F('fx_rate'))
+    if not use_counter_amount:
+        return amount
+    counter = fx.converted_cents(F('counter_amount'), F('counter_currency'), to_currency, frozen_rate=F('fx_rate'))
+    return Case(
+        When(transaction_type='CONVERT', counter_amount__isnull=False, then=counter),
+        default=amount,
+        output_field=_BIGINT,
+    )
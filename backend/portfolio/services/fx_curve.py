@@ -0,0 +1,144 @@
+from bisect import bisect_left
+from decimal import Decimal
+import logging
+
+from django.apps import apps
+from django.db.models import OuterRef, Subquery
+
+from portfolio.services.fx_service import (
+    FX_TIER_EXACT,
+    FX_TIER_EXACT_OTHER_SESSION,
+    FX_TIER_EXACT_OTHER_TYPE,
+    FX_TIER_EXACT_OTHER_TYPE_ANY_SESSION,
+    FX_TIER_MISSING,
+    FX_TIER_PRIOR_ANY_TYPE,
+    FX_TIER_PRIOR_SAME_TYPE,
+    _missing_fx_rate_error,
+    _missing_fx_rate_fallback,
+)
+
+logger = logging.getLogger(__name__)
+
+_EXACT = 'exact'
+_PRIOR = 'prior'
+
+
+class FXCurve:
+    """In-memory FXRate rows for one currency pair, resolved like get_fx_rate.
+
+    Rows are kept in sorted per-(rate_type, session) arrays so every tier of the
+    get_fx_rate cascade is answered with a dict hit or a bisection instead of a query.
+    Ties on the same date are broken by the lowest FXRate id, matching the
+    ``order_by('-date', 'id')`` used by the live lookup.
+    """
+
+    def __init__(self, base_currency, quote_currency, rows=()):
+        self.base_currency = base_currency
+        self.quote_currency = quote_currency
+        self._series = {}
+        grouped = {}
+        for row_date, rate_type, session, rate, row_id in sorted(rows, key=lambda row: (row[0], row[4])):
+            grouped.setdefault((rate_type, session), []).append((row_date, row_id, rate))
+        for key, entries in grouped.items():
+            self._series[key] = {
+                'dates': [entry[0] for entry in entries],
+                'entries': entries,
+                'by_date': {entry[0]: entry for entry in entries},
+            }
+
+    @classmethod
+    def load(cls, base_currency='PEN', quote_currency='USD', *, start_date=None, end_date=None):
+        """Load the pair's FXRate rows, optionally only those a date range can resolve to.
+
+        Without bounds this is a single query. With ``start_date`` a second query adds the
+        latest row before the range for every (rate_type, session), which is all the
+        "prior date" tiers can ever pick for dates inside the range.
+        """
+        FXRate = apps.get_model('portfolio', 'FXRate')
+        fields = ('date', 'rate_type', 'session', 'rate', 'id')
+        pair_rows = FXRate.objects.filter(
+            base_currency=base_currency,
+            quote_currency=quote_currency,
+        )
+        in_range = pair_rows
+        if start_date is not None:
+            in_range = in_range.filter(date__gte=start_date)
+        if end_date is not None:
+            in_range = in_range.filter(date__lte=end_date)
+        rows = list(in_range.order_by('date', 'id').values_list(*fields))
+
+        if start_date is not None:
+            latest_prior_date = pair_rows.filter(
+                rate_type=OuterRef('rate_type'),
+                session=OuterRef('session'),
+                date__lt=start_date,
+            ).order_by('-date').values('date')[:1]
+            rows.extend(
+                pair_rows.filter(date__lt=start_date, date=Subquery(latest_prior_date))
+                .values_list(*fields)
+            )
+        return cls(base_currency, quote_currency, rows)
+
+    def __len__(self):
+        return sum(len(series['entries']) for series in self._series.values())
+
+    def _exact_entry(self, key, snapshot_date):
+        return self._series[key]['by_date'].get(snapshot_date)
+
+    def _prior_entry(self, key, snapshot_date):
+        series = self._series[key]
+        index = bisect_left(series['dates'], snapshot_date)
+        return series['entries'][index - 1] if index > 0 else None
+
+    def _first_entry(self, date_op, snapshot_date, matches):
+        best = None
+        for key in self._series:
+            if not matches(*key):
+                continue
+            if date_op == _EXACT:
+                entry = self._exact_entry(key, snapshot_date)
+            else:
+                entry = self._prior_entry(key, snapshot_date)
+            if entry is None:
+                continue
+            if best is None or (entry[0], -entry[1]) > (best[0], -best[1]):
+                best = entry
+        return best
+
+    def resolve(self, snapshot_date, rate_type='compra', session='cierre'):
+        """Return ``(rate, tier)`` for the first tier that yields a rate, else ``(None, FX_TIER_MISSING)``."""
+        rate, tier, _ = self.resolve_with_source(snapshot_date, rate_type=rate_type, session=session)
+        return rate, tier
+
+    def resolve_with_source(self, snapshot_date, rate_type='compra', session='cierre'):
+        """Like resolve, but also return the date of the FXRate row the rate came from."""
+        tiers = (
+            (FX_TIER_EXACT, _EXACT, lambda t, s: t == rate_type and s == session),
+            (FX_TIER_EXACT_OTHER_SESSION, _EXACT, lambda t, s: t == rate_type),
+            (FX_TIER_EXACT_OTHER_TYPE, _EXACT, lambda t, s: t != rate_type and s == session),
+            (FX_TIER_EXACT_OTHER_TYPE_ANY_SESSION, _EXACT, lambda t, s: t != rate_type),
+            (FX_TIER_PRIOR_SAME_TYPE, _PRIOR, lambda t, s: t == rate_type),
+            (FX_TIER_PRIOR_ANY_TYPE, _PRIOR, lambda t, s: True),
+        )
+        for tier, date_op, matches in tiers:
+            entry = self._first_entry(date_op, snapshot_date, matches)
+            if entry is not None and entry[2]:
+                return Decimal(entry[2]), tier, entry[0]
+        return None, FX_TIER_MISSING, None
+
+    def get_rate(self, snapshot_date, rate_type='compra', session='cierre', require_rate=False):
+        """Drop-in equivalent of get_fx_rate for this curve's currency pair."""
+        base_currency = self.base_currency
+        quote_currency = self.quote_currency
+        if not base_currency or not quote_currency:
+            if require_rate:
+                raise _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_type, session)
+            return Decimal('1')
+
+        if base_currency == quote_currency:
+            return Decimal('1')
+
+        rate, _ = self.resolve(snapshot_date, rate_type=rate_type, session=session)
+        if rate is not None:
+            return rate
+        return _missing_fx_rate_fallback(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate)
@@ -1,9 +1,14 @@
+from datetime import date
 from decimal import Decimal
 from django.apps import apps
 from django.utils import timezone
 import logging
 
 from portfolio.integrations import bcrp_client as bcrp
+from portfolio.services.dirty_range_service import DirtyRangeService
+from portfolio.services.effective_fx_service import rebuild_effective_fx_rates
+from portfolio.services.fx_memo import clear_active_fx_memo
+from portfolio.services.fx_latest_service import refresh_latest_fx_payload
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +31,9 @@ def upsert_latest_from_bcrp(mode: str = 'auto'):
 
     out = {'compra': None, 'venta': None, 'saved': None}
 
-    # Resolve latest compra (USD->PEN) and venta (PEN->USD)
-    comp_series, comp_date, comp_rate = bcrp.resolve_latest_auto(mode=mode, direction='compra')
+    # Resolve latest compra (USD->PEN) and venta (PEN->USD) concurrently
+    (comp_series, comp_date, comp_rate), (ven_series, ven_date, ven_rate) = bcrp.resolve_latest_both(mode=mode)
     out['compra'] = {'series': comp_series, 'date': comp_date, 'rate': comp_rate}
-
-    ven_series, ven_date, ven_rate = bcrp.resolve_latest_auto(mode=mode, direction='venta')
     out['venta'] = {'series': ven_series, 'date': ven_date, 'rate': ven_rate}
 
     # Determine session from series or mode
@@ -99,9 +102,118 @@ def upsert_latest_from_bcrp(mode: str = 'auto'):
         logger.warning(f"Failed to persist mid FX rate: {e}")
         mid_info = None
 
+    # New rows change what rates memoized in this scope resolve to.
+    clear_active_fx_memo()
+    refresh_latest_fx_payload()
+
     out['saved'] = {
         'compra': {'date': comp_date, 'session': comp_session, 'rate': comp_rate},
         'venta': {'date': ven_date, 'session': ven_session, 'rate': ven_rate},
         'mid': mid_info,
     }
     return out
+
+
+def backfill_from_bcrp(start_date, end_date, batch_size: int = 1000):
+    """Fetch BCRP compra/venta history for [start_date, end_date] and bulk-upsert FXRate rows.
+
+    Each intraday/cierre series is fetched once for the whole range, mid is derived for
+    dates where both compra and venta exist, and rows are written with chunked
+    ``bulk_create(update_conflicts=True)`` against uniq_fxrate_date_pair. Bulk writes skip
+    model signals, so effective rates are rebuilt once from the earliest date whose stored
+    rate changed, and snapshots are marked dirty from the earliest date whose effective
+    cierre changed. Re-running a backfill over unchanged history rebuilds and marks nothing.
+
+    Returns a summary dict, e.g.:
+      {'start': '2020-01-01', 'end': '2025-09-23', 'series': {'PD04645PD': 1412, ...}, 'saved': 8472, 'changed': 3}
+    """
+    FXRate = apps.get_model('portfolio', 'FXRate')
+
+    start_iso = start_date.isoformat() if isinstance(start_date, date) else str(start_date)
+    end_iso = end_date.isoformat() if isinstance(end_date, date) else str(end_date)
+
+    ts = timezone.now()
+    rows = []
+    out = {'start': start_iso, 'end': end_iso, 'series': {}, 'saved': 0}
+
+    def fx_row(day, rate_type, session, rate, series, notes=''):
+        return FXRate(
+            date=date.fromisoformat(day),
+            base_currency='PEN',
+            quote_currency='USD',
+            rate_type=rate_type,
+            session=session,
+            rate=rate,
+            provider='BCRP',
+            source_series=series,
+            fetched_at=ts,
+            notes=notes,
+        )
+
+    for session in FXRate.Session.values:
+        comp_series = bcrp.HISTORY_SERIES[('compra', session)]
+        ven_series = bcrp.HISTORY_SERIES[('venta', session)]
+        compra = dict(bcrp.get_range(comp_series, start_iso, end_iso))
+        venta = dict(bcrp.get_range(ven_series, start_iso, end_iso))
+        out['series'][comp_series] = len(compra)
+        out['series'][ven_series] = len(venta)
+
+        for day, rate in compra.items():
+            rows.append(fx_row(day, 'compra', session, rate, comp_series))
+        for day, rate in venta.items():
+            rows.append(fx_row(day, 'venta', session, rate, ven_series))
+        for day in compra.keys() & venta.keys():
+            mid_rate = (compra[day] + venta[day]) / Decimal('2')
+            rows.append(fx_row(day, 'mid', session, mid_rate, f"{comp_series}+{ven_series}", 'mid=(compra+venta)/2'))
+
+    if not rows:
+        logger.info(f"BCRP backfill {start_iso}..{end_iso}: no observations")
+        return out
+
+    rate_field = FXRate._meta.get_field('rate')
+    places = Decimal(1).scaleb(-rate_field.decimal_places)
+    stored = {
+        (row_date, rate_type, session): rate
+        for row_date, rate_type, session, rate in FXRate.objects.filter(
+            base_currency='PEN',
+            quote_currency='USD',
+            date__gte=min(row.date for row in rows),
+            date__lte=max(row.date for row in rows),
+        ).values_list('date', 'rate_type', 'session', 'rate')
+    }
+    changed = [
+        row.date for row in rows
+        if stored.get((row.date, row.rate_type, row.session)) != rate_field.to_python(row.rate).quantize(places)
+    ]
+
+    for i in range(0, len(rows), batch_size):
+        FXRate.objects.bulk_create(
+            rows[i:i + batch_size],
+            update_conflicts=True,
+            unique_fields=['date', 'base_currency', 'quote_currency', 'rate_type', 'session'],
+            update_fields=['rate', 'provider', 'source_series', 'fetched_at', 'notes'],
+        )
+    out['saved'] = len(rows)
+
+    out['changed'] = len(changed)
+    if not changed:
+        logger.info(f"BCRP backfill {start_iso}..{end_iso}: upserted {len(rows)} FX rows, no rate changed")
+        return out
+
+    start = min(changed)
+    EffectiveFXRate = apps.get_model('portfolio', 'EffectiveFXRate')
+    closing = EffectiveFXRate.objects.filter(
+        base_currency='PEN', quote_currency='USD', session=FXRate.Session.CIERRE, date__gte=start,
+    ).values_list('date', 'rate_type', 'rate')
+    closing_before = set(closing)
+    rebuild_effective_fx_rates('PEN', 'USD', start_date=start)
+    clear_active_fx_memo()
+    refresh_latest_fx_payload()
+    # Snapshots value at closing rates only, so re-mark from the first day whose effective
+    # cierre moved; an intraday-only correction behind a stored cierre marks nothing.
+    closing_changed = closing_before.symmetric_difference(closing.all())
+    if closing_changed:
+        DirtyRangeService.mark_fx_change(min(day for day, _, _ in closing_changed))
+
+    logger.info(f"BCRP backfill {start_iso}..{end_iso}: upserted {len(rows)} FX rows, {len(changed)} changed")
+    return out
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+LATEST_FX_CACHE_KEY = 'fx_latest_payload'
+
+
+def build_latest_fx_entry(base_currency='PEN', quote_currency='USD'):
+    """``{'etag', 'last_modified', 'payload'}`` for the pair's latest compra/venta/mid rows.
+
+    Both validators are derived from the rows themselves, so every process serving the
+    same rows hands out the same ETag and Last-Modified.
+    """
+    FXRate = apps.get_model('portfolio', 'FXRate')
+    payload = {}
+    row_ids = []
+    modified = []
+    for rate_type in ('compra', 'venta', 'mid'):
+        row = FXRate.objects.filter(
+            base_currency=base_currency,
+            quote_currency=quote_currency,
+            rate_type=rate_type,
+        ).order_by('-date').first()
+        payload[rate_type] = {
+            'rate': str(row.rate) if row else None,
+            'date': row.date.isoformat() if row else None,
+            'session': row.session if row else None,
+        }
+        row_ids.append(row.id if row else None)
+        if row:
+            modified.append(row.fetched_at or datetime.combine(row.date, time.min, tzinfo=dt_timezone.utc))
+
+    digest = hashlib.sha256(json.dumps([row_ids, payload], sort_keys=True).encode()).hexdigest()[:16]
+    return {
+        'etag': f'"fx-{digest}"',
+        'last_modified': max(modified) if modified else None,
+        'payload': payload,
+    }
+
+
+def refresh_latest_fx_payload():
+    """Rebuild the cached latest-FX entry from the database and return it."""
+    entry = build_latest_fx_entry()
+    cache.set(LATEST_FX_CACHE_KEY, entry, timeout=settings.FX_LATEST_CACHE_SECONDS)
+    return entry
+
+
+def expire_latest_fx_payload():
+    """Drop this cache's latest-FX entry so the next read rebuilds it."""
+    cache.delete(LATEST_FX_CACHE_KEY)
+
+
+def get_latest_fx_entry():
+    """Cached latest-FX entry, rebuilt at most every FX_LATEST_CACHE_SECONDS.
+
+    FXRate writes expire the entry in the writing process; in any other process the TTL
+    bounds how long a superseded rate is served.
+    """
+    entry = cache.get(LATEST_FX_CACHE_KEY)
+    if entry is None:
+        entry = refresh_latest_fx_payload()
+    return entry
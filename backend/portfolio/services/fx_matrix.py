@@ -0,0 +1,188 @@
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+
+from portfolio.services.fx_memo import get_active_fx_memo, memoized
+from portfolio.services.fx_service import get_fx_rate, get_fx_rates_bulk
+
+# FXRate rows quote every currency against PEN (base PEN, quote X: PEN per 1 X).
+FX_PIVOT_CURRENCY = 'PEN'
+
+_ONE = Decimal('1')
+
+
+def get_configured_currencies():
+    """Currencies conversions are precomputed for, always including the PEN pivot."""
+    currencies = tuple(getattr(settings, 'FX_CURRENCIES', (FX_PIVOT_CURRENCY, 'USD')))
+    if FX_PIVOT_CURRENCY not in currencies:
+        currencies = (FX_PIVOT_CURRENCY,) + currencies
+    return currencies
+
+
+class FXMatrix:
+    """Cross rates between all configured currencies for one date, session and rate type.
+
+    Each cell holds ``(multiplier, divisor)`` so that converting ``amount`` is
+    ``amount * multiplier / divisor``. Pairs with a stored direct FXRate use it; every
+    other pair is triangulated through PEN. Keeping the two factors apart means PEN<->X
+    conversions are exactly ``amount * rate`` and ``amount / rate``, as before.
+    """
+
+    def __init__(self, snapshot_date, session, rate_type, pivot_rates, direct_rates=None):
+        self.snapshot_date = snapshot_date
+        self.session = session
+        self.rate_type = rate_type
+        self.currencies = tuple(sorted(pivot_rates))
+        self._index = {currency: index for index, currency in enumerate(self.currencies)}
+        direct_rates = direct_rates or {}
+
+        self._cells = []
+        for from_currency in self.currencies:
+            row = []
+            for to_currency in self.currencies:
+                if from_currency == to_currency:
+                    row.append((_ONE, _ONE))
+                elif (to_currency, from_currency) in direct_rates:
+                    # base=to, quote=from: ``to`` units per 1 ``from``
+                    row.append((direct_rates[(to_currency, from_currency)], _ONE))
+                elif (from_currency, to_currency) in direct_rates:
+                    row.append((_ONE, direct_rates[(from_currency, to_currency)]))
+                else:
+                    row.append((pivot_rates[from_currency], pivot_rates[to_currency]))
+            self._cells.append(row)
+
+    def factors(self, from_currency, to_currency):
+        """``(multiplier, divisor)`` for the pair; KeyError for unconfigured currencies."""
+        return self._cells[self._index[from_currency]][self._index[to_currency]]
+
+    def rate(self, from_currency, to_currency):
+        multiplier, divisor = self.factors(from_currency, to_currency)
+        return multiplier if divisor == _ONE else multiplier / divisor
+
+    def convert(self, amount, from_currency, to_currency):
+        """Unquantized ``amount`` in ``to_currency``."""
+        return apply_factors(amount, *self.factors(from_currency, to_currency))
+
+
+def apply_factors(amount, multiplier, divisor):
+    """``amount * multiplier / divisor``, skipping the unit factor so pivot pairs stay exact."""
+    if divisor == _ONE:
+        return amount * multiplier
+    if multiplier == _ONE:
+        return amount / divisor
+    return amount * multiplier / divisor
+
+
+def _direct_pairs(currencies):
+    """Stored FXRate pairs between two non-PEN configured currencies, memoized per scope."""
+    non_pivot = [currency for currency in currencies if currency != FX_PIVOT_CURRENCY]
+    if len(non_pivot) < 2:
+        return ()
+
+    def load():
+        FXRate = apps.get_model('portfolio', 'FXRate')
+        return tuple(
+            FXRate.objects.filter(base_currency__in=non_pivot, quote_currency__in=non_pivot)
+            .values_list('base_currency', 'quote_currency')
+            .distinct()
+        )
+
+    return memoized(('fx_direct_pairs', tuple(non_pivot)), load)
+
+
+def get_fx_factors(snapshot_date, from_currency, to_currency, session='cierre', rate_type='mid', require_rate=False):
+    """The FXMatrix cell for one pair, resolving only the rates that pair needs.
+
+    A stored direct rate between two non-PEN currencies wins; otherwise both legs go
+    through PEN. ``require_rate`` applies to the non-PEN legs, like ``strict_currencies``.
+    """
+    if from_currency == to_currency:
+        return _ONE, _ONE
+
+    def rate(base, quote):
+        return get_fx_rate(
+            snapshot_date, base, quote, rate_type=rate_type, session=session, require_rate=require_rate
+        )
+
+    if FX_PIVOT_CURRENCY not in (from_currency, to_currency):
+        direct_pairs = _direct_pairs(get_configured_currencies())
+        if (to_currency, from_currency) in direct_pairs:
+            return rate(to_currency, from_currency), _ONE
+        if (from_currency, to_currency) in direct_pairs:
+            return _ONE, rate(from_currency, to_currency)
+
+    def pivot(currency):
+        return _ONE if currency == FX_PIVOT_CURRENCY else rate(FX_PIVOT_CURRENCY, currency)
+
+    return pivot(from_currency), pivot(to_currency)
+
+
+def get_fx_matrix(snapshot_date, session='cierre', rate_type='mid', strict_currencies=()):
+    """Matrix for one date, resolving each configured currency once through get_fx_rate.
+
+    Currencies in ``strict_currencies`` are resolved with ``require_rate=True``.
+    """
+    strict_currencies = frozenset(strict_currencies)
+
+    def build():
+        currencies = get_configured_currencies()
+        pivot_rates = {
+            currency: get_fx_rate(
+                snapshot_date,
+                FX_PIVOT_CURRENCY,
+                currency,
+                rate_type=rate_type,
+                session=session,
+                require_rate=currency in strict_currencies,
+            )
+            for currency in currencies
+        }
+        direct_rates = {
+            (base, quote): get_fx_rate(snapshot_date, base, quote, rate_type=rate_type, session=session)
+            for base, quote in _direct_pairs(currencies)
+        }
+        return FXMatrix(snapshot_date, session, rate_type, pivot_rates, direct_rates)
+
+    return memoized(('fx_matrix', snapshot_date, session, rate_type, strict_currencies), build)
+
+
+def get_fx_matrices(dates, session='cierre', rate_type='mid', strict_currencies=()):
+    """``{date: FXMatrix}`` for many dates with one get_fx_rates_bulk call per currency pair."""
+    dates = {d for d in dates if d is not None}
+    if not dates:
+        return {}
+
+    strict_currencies = frozenset(strict_currencies)
+    currencies = get_configured_currencies()
+    pivot_rates = {
+        currency: get_fx_rates_bulk(
+            dates,
+            FX_PIVOT_CURRENCY,
+            currency,
+            rate_type=rate_type,
+            session=session,
+            require_rate=currency in strict_currencies,
+        )
+        for currency in currencies
+    }
+    direct_rates = {
+        (base, quote): get_fx_rates_bulk(dates, base, quote, rate_type=rate_type, session=session)
+        for base, quote in _direct_pairs(currencies)
+    }
+
+    matrices = {
+        d: FXMatrix(
+            d,
+            session,
+            rate_type,
+            {currency: rates[d] for currency, rates in pivot_rates.items()},
+            {pair: rates[d] for pair, rates in direct_rates.items()},
+        )
+        for d in dates
+    }
+    memo = get_active_fx_memo()
+    if memo is not None:
+        for d, matrix in matrices.items():
+            memo.set(('fx_matrix', d, session, rate_type, strict_currencies), matrix)
+    return matrices
@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+_active_memo = ContextVar('fx_memo', default=None)
+
+_MISSING = object()
+
+
+class FXMemo:
+    """FX lookups memoized for the lifetime of one request or task."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def get(self, key):
+        value = self._entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'label': self.label, 'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def get_active_fx_memo():
+    return _active_memo.get()
+
+
+def clear_active_fx_memo():
+    """Forget the active scope's entries; called after FXRate writes so the scope sees them."""
+    memo = _active_memo.get()
+    if memo is not None:
+        memo.clear()
+
+
+def memoized(key, compute, on_hit=None):
+    """Return ``compute()`` through the active memo scope, or compute directly outside one.
+
+    ``on_hit`` is called when the value came from the memo.
+    """
+    memo = _active_memo.get()
+    if memo is None:
+        return compute()
+    value = memo.get(key)
+    if value is _MISSING:
+        value = compute()
+        memo.set(key, value)
+    elif on_hit is not None:
+        on_hit()
+    return value
+
+
+def enter_fx_memo(label=None):
+    """Start a memo scope and return its token, or None when one is already active."""
+    if _active_memo.get() is not None:
+        return None
+    return _active_memo.set(FXMemo(label))
+
+
+def exit_fx_memo(token):
+    """End a scope started by enter_fx_memo, dropping its entries, and return the memo."""
+    if token is None:
+        return None
+    memo = _active_memo.get()
+    _active_memo.reset(token)
+    if memo is not None and (memo.hits or memo.misses):
+        logger.debug(
+            "FX memo %s: %s hits, %s misses", memo.label, memo.hits, memo.misses
+        )
+    return memo
+
+
+@contextmanager
+def fx_memo_scope(label=None):
+    """Memoize get_fx_rate/get_current_fx_context for the enclosed block.
+
+    Nested scopes reuse the outer memo so a task called from a request keeps one cache.
+    """
+    token = enter_fx_memo(label)
+    try:
+        yield _active_memo.get()
+    finally:
+        exit_fx_memo(token)
@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+from portfolio.services.fx_memo import get_active_fx_memo
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket holds the overflow.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+# Buffered observations are written to FXMetricSeries after this many records (outside
+# an atomic block; otherwise they wait for the request's or task's final flush).
+FLUSH_EVERY = 200
+
+# Source of the per-scope memo hit/miss counters, which are kept even with metrics off.
+MEMO_SCOPE_SOURCE = 'memo_scope'
+
+_caller = ContextVar('fx_metrics_caller', default=None)
+
+_buffer = {}
+_buffer_lock = threading.Lock()
+_pending = 0
+
+
+def is_enabled():
+    return getattr(settings, 'FX_METRICS_ENABLED', False)
+
+
+@contextmanager
+def fx_caller(name):
+    """Attribute FX lookups in the enclosed block to ``name`` (innermost caller wins)."""
+    token = _caller.set(name)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+def current_caller():
+    """Explicit fx_caller, else the active memo scope's label (view or task name), else 'other'."""
+    caller = _caller.get()
+    if caller:
+        return caller
+    memo = get_active_fx_memo()
+    if memo is not None and memo.label:
+        return memo.label
+    return 'other'
+
+
+def _bucket_index(elapsed_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def _buffer_entry(key):
+    entry = _buffer.get(key)
+    if entry is None:
+        entry = _buffer[key] = {'count': 0, 'total_us': 0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+    return entry
+
+
+def record(source, tier, elapsed_seconds):
+    """Count one resolved lookup under (caller, source, tier) with its latency."""
+    global _pending
+    elapsed_ms = elapsed_seconds * 1000
+    key = (current_caller(), source, tier)
+    with _buffer_lock:
+        entry = _buffer_entry(key)
+        entry['count'] += 1
+        entry['total_us'] += int(elapsed_ms * 1000)
+        entry['buckets'][_bucket_index(elapsed_ms)] += 1
+        _pending += 1
+        should_flush = _pending >= FLUSH_EVERY
+    if should_flush and not connection.in_atomic_block:
+        flush()
+
+
+def record_memo_scope(memo):
+    """Count a finished memo scope's hits and misses under its label, tiers 'hit' and 'miss'.
+
+    Unlike record(), this runs whether or not FX_METRICS_ENABLED is set, so what the
+    request/task memo saves per endpoint is always measurable. The counts carry no latency.
+    """
+    if memo is None:
+        return
+    with _buffer_lock:
+        for tier, count in (('hit', memo.hits), ('miss', memo.misses)):
+            if count:
+                _buffer_entry((memo.label or 'other', MEMO_SCOPE_SOURCE, tier))['count'] += count
+
+
+def _add_series(series, entry):
+    FXMetricSeries = apps.get_model('portfolio', 'FXMetricSeries')
+    caller, source, tier = series
+    with transaction.atomic():
+        FXMetricSeries.objects.get_or_create(caller=caller[:150], source=source, tier=tier)
+        row = FXMetricSeries.objects.select_for_update().get(caller=caller[:150], source=source, tier=tier)
+        buckets = row.buckets or [0] * len(entry['buckets'])
+        row.count += entry['count']
+        row.total_us += entry['total_us']
+        row.buckets = [stored + added for stored, added in zip(buckets, entry['buckets'])]
+        row.save(update_fields=['count', 'total_us', 'buckets', 'updated_at'])
+
+
+def flush():
+    """Add buffered observations to the FXMetricSeries rows every process reports into."""
+    global _buffer, _pending
+    with _buffer_lock:
+        buffered, _buffer, _pending = _buffer, {}, 0
+    if not buffered:
+        return
+    try:
+        for series, entry in buffered.items():
+            _add_series(series, entry)
+    except Exception as e:
+        logger.warning(f"Failed to flush FX metrics: {e}")
+
+
+def _estimate_percentile(buckets, count, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of observations; None past the last bound."""
+    threshold = count * fraction
+    seen = 0
+    for index, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= threshold:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+def snapshot():
+    """Aggregated metrics across processes as a list of per-(caller, source, tier) dicts."""
+    FXMetricSeries = apps.get_model('portfolio', 'FXMetricSeries')
+    flush()
+    rows = []
+    for series in FXMetricSeries.objects.filter(count__gt=0):
+        count = series.count
+        total_ms = series.total_us / 1000
+        rows.append({
+            'caller': series.caller,
+            'source': series.source,
+            'tier': series.tier,
+            'count': count,
+            'total_ms': round(total_ms, 3),
+            'avg_ms': round(total_ms / count, 3),
+            'p50_ms': _estimate_percentile(series.buckets, count, 0.5),
+            'p95_ms': _estimate_percentile(series.buckets, count, 0.95),
+            'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS_MS] + ['inf'], series.buckets)),
+        })
+    return rows
+
+
+def reset():
+    """Drop buffered and stored metrics."""
+    global _buffer, _pending
+    with _buffer_lock:
+        _buffer, _pending = {}, 0
+    apps.get_model('portfolio', 'FXMetricSeries').objects.all().delete()
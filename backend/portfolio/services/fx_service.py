@@ -1,6 +1,7 @@
 from datetime import time
 from decimal import Decimal
 import logging
+import time as time_module
 from zoneinfo import ZoneInfo
 
 from django.apps import apps
@@ -8,11 +9,33 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from portfolio.services import fx_metrics
+from portfolio.services.fx_memo import get_active_fx_memo, memoized
+
 logger = logging.getLogger(__name__)
 
 FX_INTRADAY_START = time(11, 5)
 FX_INTRADAY_END = time(13, 30)
 
+# Fallback tiers of get_fx_rate, in resolution order.
+FX_TIER_EXACT = 'exact'
+FX_TIER_EXACT_OTHER_SESSION = 'exact_other_session'
+FX_TIER_EXACT_OTHER_TYPE = 'exact_other_type'
+FX_TIER_EXACT_OTHER_TYPE_ANY_SESSION = 'exact_other_type_any_session'
+FX_TIER_PRIOR_SAME_TYPE = 'prior_same_type'
+FX_TIER_PRIOR_ANY_TYPE = 'prior_any_type'
+FX_TIER_MISSING = 'missing'
+# Not a fallback tier: the rate was reused from the active FX memo scope.
+FX_TIER_MEMO = 'memo'
+
+# Where a get_fx_rate result came from, for fx_metrics.
+FX_SOURCE_IDENTITY = 'identity'
+FX_SOURCE_MATERIALIZED = 'materialized'
+FX_SOURCE_CASCADE = 'cascade'
+FX_SOURCE_CURVE = 'curve'
+FX_SOURCE_MEMO = 'memo'
+FX_SOURCE_ERROR = 'error'
+
 
 def get_fx_market_now(now=None):
     """Return the current FX market datetime in the configured market timezone."""
@@ -33,7 +56,17 @@ def get_fx_market_now(now=None):
 
 
 def get_current_fx_context(now=None):
-    """Return the market-local date and session for live FX selection."""
+    """Return the market-local date and session for live FX selection.
+
+    Inside an FX memo scope the live context is fixed at its first lookup, so one
+    request or task values everything on the same date and session.
+    """
+    if now is None:
+        return memoized(('current_fx_context',), _get_current_fx_context)
+    return _get_current_fx_context(now)
+
+
+def _get_current_fx_context(now=None):
     market_now = get_fx_market_now(now)
     market_time = market_now.timetz().replace(tzinfo=None)
     session = 'intraday' if FX_INTRADAY_START <= market_time < FX_INTRADAY_END else 'cierre'
@@ -47,6 +80,37 @@ def _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_ty
     )
 
 
+def _missing_fx_rate_fallback(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate):
+    if require_rate:
+        logger.error(
+            f"Missing FX rate for {quote_currency}->{base_currency} on or before {snapshot_date}; failing strict lookup"
+        )
+        raise _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_type, session)
+    logger.error(
+        f"Missing FX rate for {quote_currency}->{base_currency} on or before {snapshot_date}; using 1.0"
+    )
+    return Decimal('1')
+
+
+def get_exact_fx_rate(snapshot_date, base_currency, quote_currency, rate_type='mid', session='cierre'):
+    """The rate published for exactly this date, session and type, or None; no fallback tiers."""
+    if base_currency == quote_currency:
+        return Decimal('1')
+
+    def lookup():
+        FXRate = apps.get_model('portfolio', 'FXRate')
+        rate = FXRate.objects.filter(
+            date=snapshot_date,
+            base_currency=base_currency,
+            quote_currency=quote_currency,
+            rate_type=rate_type,
+            session=session,
+        ).values_list('rate', flat=True).first()
+        return Decimal(rate) if rate else None
+
+    return memoized(('fx_rate_exact', snapshot_date, base_currency, quote_currency, rate_type, session), lookup)
+
+
 def get_fx_rate(snapshot_date, base_currency, quote_currency, rate_type='compra', session='cierre', require_rate=False):
     """Resolve FX for converting 1 quote unit to base units on a date, honoring rate type and session.
 
@@ -54,18 +118,61 @@ def get_fx_rate(snapshot_date, base_currency, quote_currency, rate_type='compra'
     - session: 'intraday' or 'cierre'
     Fallbacks: exact date+session+type -> exact date other session -> latest prior same type (any session)
                -> latest prior other type (any session). If still missing, 1 for identical currencies else 1 with log.
+    Dates already materialized in EffectiveFXRate skip the cascade entirely.
     - require_rate: when True, raise ValidationError instead of returning the missing-rate fallback.
+    Results are reused for the lifetime of an active FX memo scope.
     """
+    on_hit = None
+    if fx_metrics.is_enabled():
+        started = time_module.perf_counter()
+
+        def on_hit():
+            fx_metrics.record(FX_SOURCE_MEMO, FX_TIER_MEMO, time_module.perf_counter() - started)
+
+    return memoized(
+        ('fx_rate', snapshot_date, base_currency, quote_currency, rate_type, session, require_rate),
+        lambda: _get_fx_rate(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate),
+        on_hit=on_hit,
+    )
+
+
+def _get_fx_rate(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate):
+    if not fx_metrics.is_enabled():
+        return _resolve_fx_rate(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate)[0]
+
+    started = time_module.perf_counter()
+    source, tier = FX_SOURCE_ERROR, FX_TIER_MISSING
+    try:
+        rate, source, tier = _resolve_fx_rate(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate)
+        return rate
+    finally:
+        fx_metrics.record(source, tier, time_module.perf_counter() - started)
+
+
+def _resolve_fx_rate(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate):
+    """get_fx_rate without the memo, returning ``(rate, source, tier)``."""
     if not base_currency or not quote_currency:
         if require_rate:
             raise _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_type, session)
-        return Decimal('1')
+        return Decimal('1'), FX_SOURCE_IDENTITY, FX_TIER_MISSING
 
     if base_currency == quote_currency:
-        return Decimal('1')
+        return Decimal('1'), FX_SOURCE_IDENTITY, FX_TIER_EXACT
 
     try:
         FXRate = apps.get_model('portfolio', 'FXRate')
+        EffectiveFXRate = apps.get_model('portfolio', 'EffectiveFXRate')
+
+        # 0) materialized effective rate: a single unique-key hit for any ingested date
+        effective = EffectiveFXRate.objects.filter(
+            date=snapshot_date,
+            base_currency=base_currency,
+            quote_currency=quote_currency,
+            rate_type=rate_type,
+            session=session,
+        ).values_list('rate', 'tier').first()
+        if effective and effective[0]:
+            return Decimal(effective[0]), FX_SOURCE_MATERIALIZED, effective[1]
 
         # Helper query builder
         def find_rate(date_op, prefer_session=True, prefer_type=True):
@@ -81,55 +188,92 @@ def get_fx_rate(snapshot_date, base_currency, quote_currency, rate_type='compra'
                 q = q.filter(rate_type=rate_type)
             if prefer_session:
                 q = q.filter(session=session)
-            return q.order_by('-date').values_list('rate', flat=True).first()
+            return q.order_by('-date', 'id').values_list('rate', flat=True).first()
 
         # 1) exact date, preferred session & type
         rate = find_rate('exact', prefer_session=True, prefer_type=True)
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_EXACT
         # 2) exact date, other session (same rate_type)
         rate = find_rate('exact', prefer_session=False, prefer_type=True)
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_EXACT_OTHER_SESSION
         # 2b) exact date, other rate_type (try preferred session first)
         rate = FXRate.objects.filter(
             date=snapshot_date,
             base_currency=base_currency,
             quote_currency=quote_currency,
             session=session
-        ).exclude(rate_type=rate_type).order_by('-date').values_list('rate', flat=True).first()
+        ).exclude(rate_type=rate_type).order_by('-date', 'id').values_list('rate', flat=True).first()
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_EXACT_OTHER_TYPE
         # 2c) exact date, other rate_type any session
         rate = FXRate.objects.filter(
             date=snapshot_date,
             base_currency=base_currency,
             quote_currency=quote_currency,
-        ).exclude(rate_type=rate_type).order_by('-date').values_list('rate', flat=True).first()
+        ).exclude(rate_type=rate_type).order_by('-date', 'id').values_list('rate', flat=True).first()
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_EXACT_OTHER_TYPE_ANY_SESSION
         # 3) prior dates, preferred type any session
         rate = find_rate('prior', prefer_session=False, prefer_type=True)
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_PRIOR_SAME_TYPE
         # 4) prior dates, other type any session
         rate = find_rate('prior', prefer_session=False, prefer_type=False)
         if rate:
-            return Decimal(rate)
+            return Decimal(rate), FX_SOURCE_CASCADE, FX_TIER_PRIOR_ANY_TYPE
 
-        if require_rate:
-            logger.error(
-                f"Missing FX rate for {quote_currency}->{base_currency} on or before {snapshot_date}; failing strict lookup"
-            )
-            raise _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_type, session)
-        logger.error(
-            f"Missing FX rate for {quote_currency}->{base_currency} on or before {snapshot_date}; using 1.0"
-        )
-        return Decimal('1')
+        rate = _missing_fx_rate_fallback(snapshot_date, base_currency, quote_currency, rate_type, session, require_rate)
+        return rate, FX_SOURCE_CASCADE, FX_TIER_MISSING
     except ValidationError:
         raise
     except Exception as e:
         logger.exception(f"FX resolution error: {quote_currency}->{base_currency} on {snapshot_date}: {e}")
         if require_rate:
             raise _missing_fx_rate_error(snapshot_date, base_currency, quote_currency, rate_type, session) from e
-        return Decimal('1')
+        return Decimal('1'), FX_SOURCE_ERROR, FX_TIER_MISSING
+
+
+def get_fx_rates_bulk(dates, base_currency, quote_currency, rate_type='compra', session='cierre', require_rate=False):
+    """Resolve get_fx_rate for many dates at once and return a ``{date: rate}`` mapping.
+
+    All FXRate rows the date span can resolve to are fetched in at most two queries and
+    every date then goes through the same fallback cascade in memory, so the result for
+    each date is exactly what get_fx_rate would return for it.
+    """
+    from portfolio.services.fx_curve import FXCurve
+
+    dates = {d for d in dates if d is not None}
+    if not dates:
+        return {}
+
+    if not base_currency or not quote_currency or base_currency == quote_currency:
+        return {
+            d: get_fx_rate(d, base_currency, quote_currency, rate_type=rate_type, session=session, require_rate=require_rate)
+            for d in dates
+        }
+
+    start_date, end_date = min(dates), max(dates)
+    started = time_module.perf_counter()
+    try:
+        curve = FXCurve.load(base_currency, quote_currency, start_date=start_date, end_date=end_date)
+    except Exception as e:
+        logger.exception(f"FX resolution error: {quote_currency}->{base_currency} from {start_date} to {end_date}: {e}")
+        if require_rate:
+            raise _missing_fx_rate_error(start_date, base_currency, quote_currency, rate_type, session) from e
+        return {d: Decimal('1') for d in dates}
+
+    rates = {
+        d: curve.get_rate(d, rate_type=rate_type, session=session, require_rate=require_rate)
+        for d in sorted(dates)
+    }
+    if fx_metrics.is_enabled():
+        per_date = (time_module.perf_counter() - started) / len(rates)
+        for d in rates:
+            fx_metrics.record(FX_SOURCE_CURVE, curve.resolve(d, rate_type=rate_type, session=session)[1], per_date)
+    memo = get_active_fx_memo()
+    if memo is not None:
+        for d, rate in rates.items():
+            memo.set(('fx_rate', d, base_currency, quote_currency, rate_type, session, require_rate), rate)
+    return rates
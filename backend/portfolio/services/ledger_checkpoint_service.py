@@ -0,0 +1,279 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import BigIntegerField, Count, F, Max, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round
+
+from portfolio.models.ledger_checkpoint import LedgerCheckpoint
+from portfolio.models.transaction import Transaction
+from portfolio.services.currency_service import get_transaction_amount_in_currency
+from portfolio.services.money import cents_expression
+from portfolio.services.snapshot_isolation import in_read_only_snapshot
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# fx_rate has 6 decimal places.
+FX_RATE_UNITS = 10 ** 6
+
+
+def is_checkpoint_date(day):
+    """Checkpoints are kept at month-ends."""
+    return (day + timedelta(days=1)).day == 1
+
+
+def previous_checkpoint_date(day):
+    """Latest checkpoint date strictly before ``day``."""
+    return day.replace(day=1) - timedelta(days=1)
+
+
+def _scaled(field, units):
+    return Coalesce(Cast(Round(F(field) * Value(units)), BigIntegerField()), Value(0))
+
+
+def transaction_checksum_expression():
+    """Per-row integer over the values a replay consumes: amounts, price, quantity and FX rate.
+
+    Summed over a checkpoint's transactions it detects a row edited in place, which
+    leaves the count and the highest id unchanged.
+    """
+    return (
+        _scaled('amount', 100)
+        + _scaled('counter_amount', 100)
+        + _scaled('executed_price', 100)
+        + Coalesce(F('quantity'), Value(0))
+        + _scaled('fx_rate', FX_RATE_UNITS)
+    )
+
+
+def ledger_transactions(portfolio, *, until, after=None):
+    """Transactions dated in ``(after, until]`` in replay order, annotated for LedgerReplay."""
+    transactions = Transaction.objects.filter(
+        portfolio=portfolio,
+        timestamp__date__lte=until
+    )
+    if after is not None:
+        transactions = transactions.filter(timestamp__date__gt=after)
+    return transactions.select_related('stock').annotate(
+        amount_cents=cents_expression('amount'),
+        counter_cents=cents_expression('counter_amount'),
+        price_cents=cents_expression('executed_price'),
+        checksum=transaction_checksum_expression(),
+    ).order_by('timestamp', 'id')
+
+
+class LedgerReplay:
+    """Running state of a portfolio's ledger, advanced one transaction at a time.
+
+    Tracks what SnapshotService reconstructs per day: holdings in int cents, PEN/USD
+    wallet cents, base-currency deposits and the latest BUY price per stock, plus the
+    fingerprint a checkpoint needs. Starts empty or from a checkpoint. As in the per-day
+    path, a transaction whose cash or deposit amount cannot be computed marks that part
+    as failed instead of raising.
+    """
+
+    def __init__(self, portfolio, checkpoint=None):
+        self.portfolio = portfolio
+        if checkpoint is None:
+            self.holdings = {}
+            self.acquisition_prices = {}
+            self.wallets = {'PEN': 0, 'USD': 0}
+            self.deposits = Decimal('0.00')
+            self.transaction_count = 0
+            self.last_transaction_id = None
+            self.content_checksum = 0
+        else:
+            self.holdings = checkpoint.running_holdings()
+            self.acquisition_prices = {
+                int(stock_id): Decimal(price) for stock_id, price in checkpoint.acquisition_prices.items()
+            }
+            self.wallets = checkpoint.wallets()
+            self.deposits = checkpoint.total_deposits
+            self.transaction_count = checkpoint.transaction_count
+            self.last_transaction_id = checkpoint.last_transaction_id
+            self.content_checksum = checkpoint.content_checksum
+        self.cash_failed = False
+        self.deposits_failed = False
+
+    def apply(self, txn):
+        """Advance by one transaction from ledger_transactions."""
+        from portfolio.services.snapshot_service import SnapshotService
+
+        if txn.stock_id is not None and txn.transaction_type in (
+            Transaction.TransactionType.BUY,
+            Transaction.TransactionType.SELL,
+        ):
+            SnapshotService._apply_holding_trade(
+                self.holdings, txn.stock_id, txn.stock.currency, txn.transaction_type, txn.quantity, txn.price_cents
+            )
+            if txn.transaction_type == Transaction.TransactionType.BUY and txn.executed_price is not None:
+                self.acquisition_prices[txn.stock_id] = txn.executed_price
+
+        if not self.cash_failed:
+            try:
+                for currency, cents in SnapshotService._cash_deltas(self.portfolio, txn):
+                    self.wallets[currency] += cents
+            except Exception as e:
+                logger.error(f"Error replaying cash for portfolio {self.portfolio.id} at transaction {txn.id}: {str(e)}")
+                self.cash_failed = True
+
+        if txn.transaction_type == Transaction.TransactionType.DEPOSIT and not self.deposits_failed:
+            try:
+                self.deposits += get_transaction_amount_in_currency(
+                    txn,
+                    self.portfolio.base_currency,
+                    snapshot_date=txn.timestamp.date(),
+                )
+            except Exception as e:
+                logger.error(f"Error replaying deposits for portfolio {self.portfolio.id} at transaction {txn.id}: {str(e)}")
+                self.deposits_failed = True
+
+        self.transaction_count += 1
+        self.content_checksum += txn.checksum
+        if self.last_transaction_id is None or txn.id > self.last_transaction_id:
+            self.last_transaction_id = txn.id
+
+    def to_checkpoint(self, checkpoint_date):
+        """Unsaved LedgerCheckpoint of the current state, or None if part of the replay failed."""
+        if self.cash_failed or self.deposits_failed:
+            return None
+        return LedgerCheckpoint(
+            portfolio=self.portfolio,
+            date=checkpoint_date,
+            transaction_count=self.transaction_count,
+            last_transaction_id=self.last_transaction_id,
+            content_checksum=self.content_checksum,
+            holdings={
+                str(stock_id): [h['quantity'], h['currency'], h['total_cost'], h['average_price']]
+                for stock_id, h in self.holdings.items()
+            },
+            acquisition_prices={str(stock_id): str(price) for stock_id, price in self.acquisition_prices.items()},
+            cash_pen_cents=self.wallets['PEN'],
+            cash_usd_cents=self.wallets['USD'],
+            total_deposits=self.deposits,
+        )
+
+
+class LedgerCheckpointService:
+    @staticmethod
+    def _cache_key(portfolio, as_of):
+        return f"ledger_cp_{portfolio.pk}_{as_of}_v{portfolio.ledger_version}"
+
+    @classmethod
+    def nearest(cls, portfolio, as_of):
+        """Latest valid checkpoint on or before ``as_of``, or None.
+
+        Checkpoints whose fingerprint no longer matches the ledger are deleted together
+        with every later one (inside a read-only snapshot they are only skipped). The
+        answer is cached per ledger version, so repeated lookups for the same day cost
+        one cache read.
+        """
+        cache_key = cls._cache_key(portfolio, as_of)
+        cached = cache.get(cache_key, _MISSING)
+        if cached is not _MISSING:
+            return cached[0]
+
+        bound = as_of
+        checkpoint = None
+        while True:
+            candidate = LedgerCheckpoint.objects.filter(portfolio=portfolio, date__lte=bound).order_by('-date').first()
+            if candidate is None or cls._is_current(portfolio, candidate):
+                checkpoint = candidate
+                break
+            # A read-only snapshot transaction cannot delete; a later writer drops them.
+            if not in_read_only_snapshot():
+                logger.info(f"Dropping stale ledger checkpoints of portfolio {portfolio.pk} from {candidate.date}")
+                LedgerCheckpoint.objects.filter(portfolio=portfolio, date__gte=candidate.date).delete()
+            bound = candidate.date - timedelta(days=1)
+
+        cache.set(cache_key, (checkpoint,), timeout=60 * 60 * 24 * 7)
+        return checkpoint
+
+    @staticmethod
+    def _is_current(portfolio, checkpoint):
+        fingerprint = Transaction.objects.filter(
+            portfolio=portfolio,
+            timestamp__date__lte=checkpoint.date
+        ).aggregate(count=Count('id'), last_id=Max('id'), checksum=Sum(transaction_checksum_expression()))
+        return (
+            fingerprint['count'] == checkpoint.transaction_count
+            and fingerprint['last_id'] == checkpoint.last_transaction_id
+            and fingerprint['checksum'] == checkpoint.content_checksum
+        )
+
+    @staticmethod
+    def drop_from(from_date):
+        """Delete every checkpoint dated on or after ``from_date``; returns how many portfolios had one.
+
+        For closing FX corrections: checkpoints keep cash and deposits converted at the
+        rates of when they were built, which the fingerprint cannot see. The portfolios'
+        ledger version is bumped so nearest() stops answering from its cache.
+        """
+        from portfolio.models import Portfolio
+
+        checkpoints = LedgerCheckpoint.objects.filter(date__gte=from_date)
+        portfolio_ids = set(checkpoints.values_list('portfolio_id', flat=True).distinct())
+        if portfolio_ids:
+            logger.info(f"Dropping ledger checkpoints of {len(portfolio_ids)} portfolio(s) from {from_date}")
+            checkpoints.delete()
+            Portfolio.all_objects.filter(pk__in=portfolio_ids).update(ledger_version=F('ledger_version') + 1)
+        return len(portfolio_ids)
+
+    @classmethod
+    def save(cls, checkpoints):
+        """Upsert unsaved checkpoints on (portfolio, date)."""
+        if not checkpoints:
+            return []
+        saved = LedgerCheckpoint.objects.bulk_create(
+            checkpoints,
+            update_conflicts=True,
+            unique_fields=['portfolio', 'date'],
+            update_fields=[
+                'transaction_count',
+                'last_transaction_id',
+                'content_checksum',
+                'holdings',
+                'acquisition_prices',
+                'cash_pen_cents',
+                'cash_usd_cents',
+                'total_deposits',
+                'created_at',
+            ],
+        )
+        cache.set_many(
+            {cls._cache_key(checkpoint.portfolio, checkpoint.date): (checkpoint,) for checkpoint in saved},
+            timeout=60 * 60 * 24 * 7,
+        )
+        return saved
+
+    @classmethod
+    def build(cls, portfolio, checkpoint_date):
+        """Replay from the nearest earlier checkpoint up to ``checkpoint_date`` and store the result.
+
+        Returns the checkpoint, or None when the portfolio has no transactions by then or
+        part of the replay failed.
+        """
+        start = cls.nearest(portfolio, checkpoint_date)
+        if start is not None and start.date == checkpoint_date:
+            return start
+
+        replay = LedgerReplay(portfolio, start)
+        for txn in ledger_transactions(
+            portfolio, until=checkpoint_date, after=start.date if start else None
+        ).iterator(chunk_size=2000):
+            replay.apply(txn)
+
+        if not replay.transaction_count:
+            return None
+        checkpoint = replay.to_checkpoint(checkpoint_date)
+        if checkpoint is None:
+            return None
+        return cls.save([checkpoint])[0]
+
+    @classmethod
+    def ensure_checkpoint(cls, portfolio, as_of):
+        """Make sure the last month-end before ``as_of`` has a checkpoint (nightly upkeep)."""
+        return cls.build(portfolio, previous_checkpoint_date(as_of))
@@ -0,0 +1,190 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import BigIntegerField, F, Value
+from django.db.models.functions import Cast, Round
+
+from portfolio.services.money_kernel import CENTS_PER_UNIT, RATE_SCALE
+
+_ONE = Decimal('1')
+_MISSING = object()
+
+
+def _round_half_up_div(numerator, denominator):
+    """Integer ``numerator / denominator`` rounded half away from zero (denominator > 0)."""
+    quotient = (abs(numerator) * 2 + denominator) // (denominator * 2)
+    return -quotient if numerator < 0 else quotient
+
+
+# Rates repeat across many rows (one per FX date), so their integer form is cached.
+_MICROS_CACHE_LIMIT = 4096
+_micros_cache = {}
+
+
+def _rate_micros(rate):
+    """``rate`` in integer millionths, or None when it has more than six decimals."""
+    micros = _micros_cache.get(rate, _MISSING)
+    if micros is _MISSING:
+        scaled = rate * RATE_SCALE
+        micros = int(scaled) if scaled == int(scaled) else None
+        if len(_micros_cache) >= _MICROS_CACHE_LIMIT:
+            _micros_cache.clear()
+        _micros_cache[rate] = micros
+    return micros
+
+
+def cents_per_unit(cents, quantity):
+    """Int ``cents`` split over ``quantity`` units, rounded half-up to the cent."""
+    return _round_half_up_div(cents, quantity)
+
+
+class Money:
+    """An amount of whole cents in one currency.
+
+    Arithmetic stays in Python ints, so sums are exact and only products with a
+    non-integer factor round, half away from zero to the cent exactly like
+    ``quantize(Decimal('0.01'), ROUND_HALF_UP)``. Mixing currencies raises ValueError.
+    Convert with from_decimal on the way in and to_decimal on the way out to the ORM
+    and serializers.
+    """
+
+    __slots__ = ('cents', 'currency')
+
+    def __init__(self, cents=0, currency='PEN'):
+        self.cents = cents
+        self.currency = currency
+
+    @classmethod
+    def zero(cls, currency='PEN'):
+        return cls(0, currency)
+
+    @classmethod
+    def from_decimal(cls, value, currency='PEN'):
+        """Money for a Decimal (or str/int) amount, rounded half-up to the cent."""
+        if value is None or value == '':
+            return cls(0, currency)
+        if not isinstance(value, Decimal):
+            value = Decimal(value)
+        return cls(int((value * CENTS_PER_UNIT).quantize(_ONE, rounding=ROUND_HALF_UP)), currency)
+
+    def to_decimal(self):
+        """Two-place Decimal, the representation stored in DecimalFields."""
+        return Decimal(self.cents).scaleb(-2)
+
+    def _same_currency(self, other):
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot combine {self.currency} and {other.currency} amounts")
+        return other.cents
+
+    def __add__(self, other):
+        if other.__class__ is Money and other.currency == self.currency:
+            return Money(self.cents + other.cents, self.currency)
+        if not isinstance(other, Money):
+            # Lets sum() start from its int 0.
+            return self if other == 0 else NotImplemented
+        return Money(self.cents + self._same_currency(other), self.currency)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if other.__class__ is Money and other.currency == self.currency:
+            return Money(self.cents - other.cents, self.currency)
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.cents - self._same_currency(other), self.currency)
+
+    def __neg__(self):
+        return Money(-self.cents, self.currency)
+
+    def __abs__(self):
+        return Money(abs(self.cents), self.currency)
+
+    def __mul__(self, factor):
+        """Scale by an int exactly, or by a Decimal rounding half-up to the cent."""
+        if factor.__class__ is int:
+            return Money(self.cents * factor, self.currency)
+        if isinstance(factor, Decimal):
+            micros = _rate_micros(factor)
+            if micros is not None:
+                return Money(_round_half_up_div(self.cents * micros, RATE_SCALE), self.currency)
+            cents = (self.cents * factor).quantize(_ONE, rounding=ROUND_HALF_UP)
+            return Money(int(cents), self.currency)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def per_unit(self, quantity):
+        """This amount split over ``quantity`` units, rounded half-up to the cent."""
+        return Money(cents_per_unit(self.cents, quantity), self.currency)
+
+    def convert(self, to_currency, rate, *, divide=False):
+        """This amount times (or divided by) ``rate``, in ``to_currency``, rounded half-up.
+
+        Rates with at most six decimals stay in integer micro-units; others use Decimal.
+        """
+        micros = _rate_micros(rate)
+        if micros is None:
+            amount = self.to_decimal() / rate if divide else self.to_decimal() * rate
+            return Money.from_decimal(amount, to_currency)
+        if divide:
+            return Money(_round_half_up_div(self.cents * RATE_SCALE, micros), to_currency)
+        return Money(_round_half_up_div(self.cents * micros, RATE_SCALE), to_currency)
+
+    def convert_pen_usd(self, to_currency, pen_per_usd):
+        """convert_with_pen_per_usd_rate for Money: USD->PEN multiplies, PEN->USD divides."""
+        if self.currency == to_currency:
+            return self
+        if pen_per_usd <= 0:
+            raise ValueError("pen_per_usd must be positive")
+        if self.currency == 'USD' and to_currency == 'PEN':
+            return self.convert('PEN', pen_per_usd)
+        if self.currency == 'PEN' and to_currency == 'USD':
+            return self.convert('USD', pen_per_usd, divide=True)
+        raise ValueError(f"Unsupported conversion: {self.currency}->{to_currency}")
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.cents == other.cents and self.currency == other.currency
+
+    def __hash__(self):
+        return hash((self.cents, self.currency))
+
+    def __lt__(self, other):
+        return self.cents < self._same_currency(other)
+
+    def __le__(self, other):
+        return self.cents <= self._same_currency(other)
+
+    def __gt__(self, other):
+        return self.cents > self._same_currency(other)
+
+    def __ge__(self, other):
+        return self.cents >= self._same_currency(other)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __repr__(self):
+        return f"Money({self.to_decimal()} {self.currency})"
+
+    def __str__(self):
+        return f"{self.to_decimal()}"
+
+
+def money_sum(amounts, currency='PEN'):
+    """Sum Money values in one currency; an empty iterable gives zero."""
+    cents = 0
+    for amount in amounts:
+        if amount.currency != currency:
+            raise ValueError(f"Cannot combine {currency} and {amount.currency} amounts")
+        cents += amount.cents
+    return Money(cents, currency)
+
+
+def cents_expression(field):
+    """A 2-place DecimalField selected as int cents, so rows load straight into Money.
+
+    Hot loops annotate this instead of reading the Decimal field: the database does the
+    scaling and the loop only touches ints until it builds Money at its boundary.
+    """
+    return Cast(Round(F(field) * Value(CENTS_PER_UNIT)), BigIntegerField())
@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+import numpy as np
+
+RATE_SCALE = 1_000_000  # FX rates are stored with 6 decimal places
+CENTS_PER_UNIT = 100
+
+CENT = Decimal('0.01')
+MICRO = Decimal('0.000001')
+
+# Largest |value| an intermediate product may reach before int64 arithmetic is unsafe.
+_INT64_SAFE = 2 ** 61
+# Amounts at or above 10**15 are left to Decimal; quantize would exceed context precision.
+_MAX_AMOUNT_DIGITS = 15
+
+_HUNDRED = Decimal(100)
+_MISSING = object()
+
+DIRECTION_KEEP = 0
+DIRECTION_MULTIPLY = 1  # USD->PEN: amount * pen_per_usd
+DIRECTION_DIVIDE = -1   # PEN->USD: amount / pen_per_usd
+
+
+def _round_half_up_div(numerator, denominator):
+    """``numerator / denominator`` rounded half away from zero, as Decimal ROUND_HALF_UP does."""
+    quotient = (np.abs(numerator) * 2 + denominator) // (denominator * 2)
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+def convert_cents(amount_cents, rate_micros, directions):
+    """Convert int64 cent amounts with int64 micro-unit rates; returns int64 cents.
+
+    Each element is kept, multiplied by its rate or divided by it depending on
+    ``directions``, and rounded half-up to the cent exactly like quantize_money on the
+    Decimal result. Callers must keep |amount_cents| * max(rate_micros, RATE_SCALE)
+    below 2**61 (see to_kernel_inputs).
+    """
+    amount_cents = np.asarray(amount_cents, dtype=np.int64)
+    rate_micros = np.asarray(rate_micros, dtype=np.int64)
+    directions = np.asarray(directions, dtype=np.int8)
+
+    safe_rates = np.where(directions == DIRECTION_KEEP, RATE_SCALE, rate_micros)
+    multiplied = _round_half_up_div(amount_cents * safe_rates, RATE_SCALE)
+    divided = _round_half_up_div(amount_cents * RATE_SCALE, safe_rates)
+    return np.select(
+        [directions == DIRECTION_MULTIPLY, directions == DIRECTION_DIVIDE],
+        [multiplied, divided],
+        amount_cents,
+    )
+
+
+def _amount_cents(amount):
+    """``amount`` as an exact int of cents, or None if it has sub-cent precision."""
+    if not amount.is_finite() or amount.adjusted() >= _MAX_AMOUNT_DIGITS:
+        return None
+    cents = amount.quantize(CENT)
+    if cents != amount:
+        return None
+    return int(cents * _HUNDRED)
+
+
+def _rate_micros(rate):
+    if not rate.is_finite() or rate <= 0 or rate.adjusted() >= 6 or rate != rate.quantize(MICRO):
+        return None
+    return int(rate.scaleb(6))
+
+
+def to_kernel_inputs(amounts, rates, directions):
+    """Encode Decimal amounts/rates as int64 cents/micros for convert_cents.
+
+    Amounts with sub-cent precision, rates with more than six decimals and values large
+    enough to overflow int64 are marked for the scalar Decimal path.
+    Returns ``(amount_cents, rate_micros, directions, fallback_mask)`` as NumPy arrays.
+    """
+    cents = []
+    micros = []
+    fallback = []
+    micros_by_rate = {}
+    for amount, rate, direction in zip(amounts, rates, directions):
+        amount_cents = _amount_cents(amount)
+        rate_micro = RATE_SCALE
+        if direction != DIRECTION_KEEP:
+            rate_micro = micros_by_rate.get(rate, _MISSING)
+            if rate_micro is _MISSING:
+                rate_micro = micros_by_rate[rate] = _rate_micros(rate)
+        if amount_cents is None or rate_micro is None:
+            cents.append(0)
+            micros.append(RATE_SCALE)
+            fallback.append(True)
+        else:
+            cents.append(amount_cents)
+            micros.append(rate_micro)
+            fallback.append(False)
+
+    # Guard the int64 products in float space, where they cannot overflow.
+    float_cents = np.array(cents, dtype=np.float64)
+    cents = np.array(cents, dtype=np.int64)
+    micros = np.array(micros, dtype=np.int64)
+    fallback = np.array(fallback, dtype=bool)
+    fallback |= np.abs(float_cents) * np.maximum(micros, RATE_SCALE) >= _INT64_SAFE
+    cents[fallback] = 0
+    micros[fallback] = RATE_SCALE
+    return cents, micros, np.asarray(directions, dtype=np.int8), fallback
+
+
+def cents_to_decimal(cents):
+    """Decimal with two places for an integer cent count."""
+    return Decimal(cents).scaleb(-2)
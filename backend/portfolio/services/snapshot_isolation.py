@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_read_only = ContextVar('snapshot_read_only', default=False)
+
+
+@contextmanager
+def read_snapshot(using=DEFAULT_DB_ALIAS):
+    """Atomic block that reads one consistent view of the database without taking row locks.
+
+    On PostgreSQL, when the block opens the transaction, it runs at REPEATABLE READ READ
+    ONLY: every query sees the data as of its first statement, and concurrent writers
+    (trades locking the portfolio row in adjust_cash) are neither blocked nor block it.
+    Nested in an existing transaction it is a savepoint that sees what that transaction
+    sees. On SQLite, which serializes writers anyway, it is a plain atomic block.
+    """
+    connection = connections[using]
+    opens_transaction = not connection.in_atomic_block
+    with transaction.atomic(using=using):
+        read_only = opens_transaction and connection.vendor == 'postgresql'
+        if read_only:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        token = _read_only.set(_read_only.get() or read_only)
+        try:
+            yield
+        finally:
+            _read_only.reset(token)
+
+
+def in_read_only_snapshot():
+    """Whether the current code runs inside a READ ONLY read_snapshot() transaction."""
+    return _read_only.get()
@@ -1,22 +1,116 @@
 # backend/portfolio/services/snapshot_service.py
-from django.db import models, IntegrityError, transaction
-import time
+from django.db import models, transaction
+from bisect import bisect_right
+from datetime import timedelta
 from decimal import Decimal, DivisionByZero, ROUND_HALF_UP
 import logging
-from django.db.models import Count, Max
 from django.utils import timezone
 from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
 from portfolio.models.transaction import Transaction
 from django.db.models import Case, When, F, Value, IntegerField
 from stocks.models import Stock
 from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.models.snapshot_dirty_range import SnapshotDirtyRange
+from portfolio.services import snapshot_store
 from portfolio.services.currency_service import convert_amount, get_transaction_amount_in_currency, normalize_currency
-from portfolio.services.fx_service import get_fx_rate
+from portfolio.services.fx_matrix import get_fx_matrices
+from portfolio.services.fx_memo import fx_memo_scope
+from portfolio.services.fx_service import get_fx_rate, get_fx_rates_bulk
+from portfolio.services.ledger_checkpoint_service import (
+    LedgerCheckpointService,
+    LedgerReplay,
+    is_checkpoint_date,
+    ledger_transactions,
+)
+from portfolio.services.money import Money, cents_expression, cents_per_unit
+from portfolio.services.snapshot_isolation import read_snapshot
+from portfolio.services.snapshot_writer import SnapshotWriter
 from django.core.cache import cache
 from portfolio.services.tracing import span
+from portfolio.services.fx_metrics import fx_caller
 
 logger = logging.getLogger(__name__)
 
+# Price tiers backed by a stored HistoricalStockPrice on or before the snapshot date.
+HISTORICAL_PRICE_SOURCES = ('exact_date', 'latest_historical')
+# Every other tier _get_historical_price can fall back to; rows valued this way are
+# worth revisiting once a historical price arrives.
+FALLBACK_PRICE_SOURCES = (
+    'portfolio_acquisition',
+    'nearest_historical',
+    'current_price_fallback',
+    'historical_fallback',
+    'error_fallback',
+    'system_error',
+)
+
+
+class _PriceHistory:
+    """In-memory twin of SnapshotService._get_historical_price for a range of dates.
+
+    Loads every HistoricalStockPrice of the given stocks once; ``resolve`` then walks the
+    same fallback tiers with a bisect instead of up to five queries per holding and day.
+    """
+
+    def __init__(self, stocks):
+        from stocks.models import HistoricalStockPrice
+        self._stocks = stocks
+        self._dates = {}
+        self._prices = {}
+        rows = (
+            HistoricalStockPrice.objects.filter(stock_id__in=list(stocks))
+            .order_by('stock_id', 'date')
+            .values_list('stock_id', 'date', 'price')
+        )
+        for stock_id, price_date, price in rows:
+            self._dates.setdefault(stock_id, []).append(price_date)
+            self._prices.setdefault(stock_id, []).append(price)
+
+    def next_date(self, stock_id, after):
+        """First stored price date of ``stock_id`` after ``after``, or None."""
+        dates = self._dates.get(stock_id, [])
+        index = bisect_right(dates, after)
+        return dates[index] if index < len(dates) else None
+
+    def has_price_before(self, stock_id, day):
+        """Whether ``stock_id`` has a stored price dated before ``day``."""
+        dates = self._dates.get(stock_id, [])
+        return bool(dates) and dates[0] < day
+
+    def resolve(self, stock_id, snapshot_date, acquisition_price):
+        """``(price, source)`` as _get_historical_price would return it.
+
+        ``acquisition_price`` is the executed price of the portfolio's latest BUY of the
+        stock on or before ``snapshot_date``, or None.
+        """
+        dates = self._dates.get(stock_id, [])
+        prices = self._prices.get(stock_id, [])
+        index = bisect_right(dates, snapshot_date)
+        if index:
+            source = 'exact_date' if dates[index - 1] == snapshot_date else 'latest_historical'
+            return prices[index - 1], source
+
+        if acquisition_price is not None:
+            return acquisition_price, 'portfolio_acquisition'
+
+        # Nothing on or before the date, so the nearest price is the first one after it.
+        if prices and prices[0]:
+            return prices[0], 'nearest_historical'
+
+        stock = self._stocks[stock_id]
+        if stock.current_price > Decimal('0'):
+            logger.warning(f"Using current price for {stock.symbol} on {snapshot_date}")
+            return stock.current_price, 'current_price_fallback'
+
+        for price in reversed(prices):
+            if price > 0:
+                logger.warning(f"Using latest historical price for {stock.symbol} on {snapshot_date}")
+                return price, 'historical_fallback'
+
+        logger.error(f"Price resolution failed for {stock.symbol} on {snapshot_date}")
+        return Decimal('0.00'), 'error_fallback'
+
+
 class SnapshotService:
     @staticmethod
     def _quantize_money(value):
@@ -26,14 +120,14 @@ class SnapshotService:
     def _wallets_to_base(cls, portfolio, wallets, snapshot_date):
         return cls._quantize_money(
             convert_amount(
-                wallets['PEN'],
+                wallets['PEN'].to_decimal(),
                 'PEN',
                 portfolio.base_currency,
                 snapshot_date=snapshot_date,
                 session='cierre',
             )
             + convert_amount(
-                wallets['USD'],
+                wallets['USD'].to_decimal(),
                 'USD',
                 portfolio.base_currency,
                 snapshot_date=snapshot_date,
@@ -41,6 +135,45 @@ class SnapshotService:
             )
         )
 
+    @classmethod
+    def _cash_deltas(cls, portfolio, txn):
+        """``[(currency, cents), ...]`` moved between the PEN/USD wallets by one transaction.
+
+        ``txn`` must carry the amount_cents/counter_cents annotations (see cents_expression).
+        """
+        amount = txn.amount_cents or 0
+        cash_currency = normalize_currency(txn.cash_currency or portfolio.base_currency)
+
+        if txn.transaction_type == Transaction.TransactionType.DEPOSIT:
+            return [(cash_currency, amount)]
+        if txn.transaction_type == Transaction.TransactionType.WITHDRAWAL:
+            return [(cash_currency, -amount)]
+        if txn.transaction_type in (Transaction.TransactionType.BUY, Transaction.TransactionType.SELL):
+            settlement_amount = Money.from_decimal(
+                get_transaction_amount_in_currency(
+                    txn,
+                    cash_currency,
+                    snapshot_date=txn.timestamp.date(),
+                ),
+                cash_currency,
+            ).cents
+            if txn.transaction_type == Transaction.TransactionType.BUY:
+                return [(cash_currency, -settlement_amount)]
+            return [(cash_currency, settlement_amount)]
+        if txn.transaction_type == Transaction.TransactionType.CONVERT:
+            target_currency = normalize_currency(txn.counter_currency)
+            counter_amount = txn.counter_cents if txn.counter_cents else Money.from_decimal(
+                get_transaction_amount_in_currency(
+                    txn,
+                    target_currency,
+                    use_counter_amount=True,
+                    snapshot_date=txn.timestamp.date(),
+                ),
+                target_currency,
+            ).cents
+            return [(cash_currency, -amount), (target_currency, counter_amount)]
+        return []
+
     @classmethod
     def _get_historical_cash(cls, portfolio, snapshot_date):
         """Calculate cash balance as of snapshot date using transaction history with error handling.
@@ -50,45 +183,19 @@ class SnapshotService:
         balances correct when the user holds USD cash or performs FX conversions.
         """
         try:
-            transactions = Transaction.objects.filter(
-                portfolio=portfolio,
-                timestamp__date__lte=snapshot_date
-            ).select_related('stock').order_by('timestamp', 'id')
+            # Start from the nearest month-end checkpoint and replay only the tail.
+            checkpoint = LedgerCheckpointService.nearest(portfolio, snapshot_date)
+            transactions = ledger_transactions(
+                portfolio, until=snapshot_date, after=checkpoint.date if checkpoint else None
+            )
 
-            wallets = {'PEN': Decimal('0.00'), 'USD': Decimal('0.00')}
+            # Wallets accumulate int cents; Money is built once per wallet at the end.
+            wallets = checkpoint.wallets() if checkpoint else {'PEN': 0, 'USD': 0}
             for txn in transactions:
-                amount = Decimal(str(txn.amount)) if txn.amount else Decimal('0.00')
-                cash_currency = normalize_currency(txn.cash_currency or portfolio.base_currency)
-
-                if txn.transaction_type == Transaction.TransactionType.DEPOSIT:
-                    wallets[cash_currency] += amount
-                elif txn.transaction_type == Transaction.TransactionType.WITHDRAWAL:
-                    wallets[cash_currency] -= amount
-                elif txn.transaction_type == Transaction.TransactionType.BUY:
-                    settlement_amount = get_transaction_amount_in_currency(
-                        txn,
-                        cash_currency,
-                        snapshot_date=txn.timestamp.date(),
-                    )
-                    wallets[cash_currency] -= settlement_amount
-                elif txn.transaction_type == Transaction.TransactionType.SELL:
-                    settlement_amount = get_transaction_amount_in_currency(
-                        txn,
-                        cash_currency,
-                        snapshot_date=txn.timestamp.date(),
-                    )
-                    wallets[cash_currency] += settlement_amount
-                elif txn.transaction_type == Transaction.TransactionType.CONVERT:
-                    target_currency = normalize_currency(txn.counter_currency)
-                    counter_amount = Decimal(str(txn.counter_amount)) if txn.counter_amount else get_transaction_amount_in_currency(
-                        txn,
-                        target_currency,
-                        use_counter_amount=True,
-                        snapshot_date=txn.timestamp.date(),
-                    )
-                    wallets[cash_currency] -= amount
-                    wallets[target_currency] += counter_amount
+                for currency, cents in cls._cash_deltas(portfolio, txn):
+                    wallets[currency] += cents
 
+            wallets = {currency: Money(cents, currency) for currency, cents in wallets.items()}
             return cls._wallets_to_base(portfolio, wallets, snapshot_date)
 
         except Exception as e:
@@ -101,12 +208,16 @@ class SnapshotService:
     def _get_historical_deposits(cls, portfolio, snapshot_date):
         """Calculate total deposits as of snapshot date with error handling."""
         try:
+            checkpoint = LedgerCheckpointService.nearest(portfolio, snapshot_date)
             deposits = Transaction.objects.filter(
                 portfolio=portfolio,
                 transaction_type=Transaction.TransactionType.DEPOSIT,
                 timestamp__date__lte=snapshot_date
             )
             total = Decimal('0.00')
+            if checkpoint is not None:
+                deposits = deposits.filter(timestamp__date__gt=checkpoint.date)
+                total = checkpoint.total_deposits
             for txn in deposits:
                 total += get_transaction_amount_in_currency(
                     txn,
@@ -194,175 +305,449 @@ class SnapshotService:
             return Decimal('0.00'), 'system_error'
         
 
+    @staticmethod
+    def _apply_holding_trade(holdings, stock_id, currency, transaction_type, quantity, price_cents):
+        """Advance running holdings by one BUY or SELL.
+
+        Costs are tracked as int cents in the stock's currency; _finalize_holdings turns
+        them back into Decimals.
+        """
+        current = holdings.get(stock_id)
+        if current is None:
+            current = holdings[stock_id] = {
+                'quantity': 0,
+                'currency': currency,
+                'total_cost': 0,
+                'average_price': 0,
+            }
+
+        if transaction_type == Transaction.TransactionType.BUY:
+            new_quantity = current['quantity'] + quantity
+            new_total_cost = current['total_cost'] + price_cents * quantity
+            current['quantity'] = new_quantity
+            current['total_cost'] = new_total_cost
+            current['average_price'] = cents_per_unit(new_total_cost, new_quantity) if new_quantity > 0 else 0
+
+        elif transaction_type == Transaction.TransactionType.SELL:
+            if current['quantity'] >= quantity:
+                new_quantity = current['quantity'] - quantity
+                current['quantity'] = new_quantity
+                current['total_cost'] = current['average_price'] * new_quantity
+
+    @staticmethod
+    def _finalize_holdings(holdings):
+        """Open positions as ``{stock_id: {quantity, total_cost, average_price}}`` with Decimal costs."""
+        return {
+            stock_id: {
+                'quantity': holding['quantity'],
+                'total_cost': Money(holding['total_cost'], holding['currency']).to_decimal(),
+                'average_price': Money(holding['average_price'], holding['currency']).to_decimal(),
+            }
+            for stock_id, holding in holdings.items() if holding['quantity'] > 0
+        }
+
     @classmethod
     def _get_historical_holdings(cls, portfolio, snapshot_date):
         """Reconstruct portfolio holdings as of snapshot date using transaction history"""
-        cache_version_key = f"holdings_version_{portfolio.pk}"
-        cache_key = f"hist_hold_{portfolio.pk}_{snapshot_date}"
-        
-        # Use both latest timestamp and transaction count so cache invalidation
-        # still works when multiple transactions share the same timestamp.
-        transaction_signature = Transaction.objects.filter(
+        # The ledger version changes with every executed transaction, so a hit needs
+        # one cache read and no SQL, and entries for other dates stay valid.
+        cache_key = f"hist_hold_{portfolio.pk}_{snapshot_date}_v{portfolio.ledger_version}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Start from the nearest month-end checkpoint and replay only the tail.
+        checkpoint = LedgerCheckpointService.nearest(portfolio, snapshot_date)
+        holdings = checkpoint.running_holdings() if checkpoint else {}
+
+        transactions = Transaction.objects.filter(
             portfolio=portfolio,
-            timestamp__date__lte=snapshot_date
-        ).aggregate(
-            latest_timestamp=Max('timestamp'),
-            txn_count=Count('id'),
-        )
-        cache_token = (
-            transaction_signature['latest_timestamp'],
-            transaction_signature['txn_count'] or 0,
+            timestamp__date__lte=snapshot_date,
+            transaction_type__in=[
+                Transaction.TransactionType.BUY,
+                Transaction.TransactionType.SELL
+            ],
+            stock__isnull=False
         )
-        
-        version = cache.get(cache_version_key, 0)
-        cached = cache.get(f"{cache_key}_v{version}")
-        
-        if cached and cached.get('cache_token') == cache_token:
-            return cached['holdings']
-    
-        holdings = {}  # {stock_id: {quantity, total_cost, average_price}}
-
+        if checkpoint is not None:
+            transactions = transactions.filter(timestamp__date__gt=checkpoint.date)
         transactions = (
-            Transaction.objects.filter(
-                portfolio=portfolio,
-                timestamp__date__lte=snapshot_date,
-                transaction_type__in=[
-                    Transaction.TransactionType.BUY,
-                    Transaction.TransactionType.SELL
-                ],
-                stock__isnull=False
-            )
-            .select_related('stock')
-            .order_by('timestamp')
+            transactions
+            .annotate(price_cents=cents_expression('executed_price'))
+            .order_by('timestamp', 'id')
+            .values_list('stock_id', 'stock__currency', 'transaction_type', 'quantity', 'price_cents')
         )
 
-        for txn in transactions:
-            stock_id = txn.stock.id
-            if stock_id not in holdings:
-                holdings[stock_id] = {
-                    'quantity': 0,
-                    'total_cost': Decimal('0.00'),
-                    'average_price': Decimal('0.00')
-                }
-                
-            current = holdings[stock_id]
-            
-            if txn.transaction_type == Transaction.TransactionType.BUY:
-                new_quantity = current['quantity'] + txn.quantity
-                new_total_cost = current['total_cost'] + (txn.executed_price * txn.quantity)
-                new_avg = (new_total_cost / new_quantity).quantize(Decimal('0.01'), ROUND_HALF_UP) if new_quantity > 0 else Decimal('0.00')
-                
-                holdings[stock_id] = {
-                    'quantity': new_quantity,
-                    'total_cost': new_total_cost,
-                    'average_price': new_avg
-                }
-                
-            elif txn.transaction_type == Transaction.TransactionType.SELL:
-                if current['quantity'] >= txn.quantity:
-                    new_quantity = current['quantity'] - txn.quantity
-                    holdings[stock_id] = {
-                        'quantity': new_quantity,
-                        'total_cost': current['average_price'] * new_quantity,
-                        'average_price': current['average_price']
-                    }
-
-         # Filter out fully sold positions
-        holdings = {k: v for k, v in holdings.items() if v['quantity'] > 0}
-
-        # Write to versioned cache
-        new_version = version + 1
-        cache.set_many({
-            cache_version_key: new_version,
-            f"{cache_key}_v{new_version}": {
-                'holdings': holdings,
-                'cache_token': cache_token,
-            }
-        }, timeout=60 * 60 * 24 * 7)  # 1 week cache
+        for stock_id, currency, transaction_type, quantity, price_cents in transactions:
+            cls._apply_holding_trade(holdings, stock_id, currency, transaction_type, quantity, price_cents)
+
+        holdings = cls._finalize_holdings(holdings)
+
+        cache.set(cache_key, holdings, timeout=60 * 60 * 24 * 7)  # 1 week cache
 
         return holdings
 
+    @staticmethod
+    def _holding_snapshot(portfolio, stock, snapshot_date, holding, price, rate, source=''):
+        """Unsaved HoldingSnapshot valuing ``holding`` at ``price`` (stock currency) times ``rate``.
+
+        The price, the tier it came from and the rate are stored with the row.
+        """
+        native_value = price * holding['quantity']
+        stock_value_base = (native_value * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return HoldingSnapshot(
+            portfolio=portfolio,
+            stock=stock,
+            date=snapshot_date,
+            quantity=holding['quantity'],
+            average_purchase_price=holding['average_price'],
+            # Store base-currency value to keep totals additive
+            total_value=stock_value_base,
+            price=price,
+            price_source=source,
+            fx_rate=rate,
+        )
+
     @classmethod
-    def create_daily_snapshot(cls, portfolio, date=None):
-        """Creates daily snapshot with robust error handling and retries."""
+    def _compute_daily_snapshot(cls, portfolio, snapshot_date):
+        """``(values, holding_snapshots)`` of one day: DailyPortfolioSnapshot fields and unsaved holding rows."""
+        # Get historical holdings as of snapshot date
+        historical_holdings = cls._get_historical_holdings(portfolio, snapshot_date)
+        stocks = Stock.objects.in_bulk(list(historical_holdings))
+
+        # Calculate investment value (in base currency) and create holding snapshots
+        investment_value = Decimal('0.00')
+        holding_snapshots = []
+
+        for stock_id, holding in historical_holdings.items():
+            stock = stocks[stock_id]
+            price, source = cls._get_historical_price(
+                stock_id, snapshot_date, portfolio
+            )
+            # Convert to portfolio base currency
+            # Historical snapshots should use cierre and mid (estimate) for USD->PEN valuation
+            rate = get_fx_rate(
+                snapshot_date,
+                portfolio.base_currency,
+                stock.currency,
+                rate_type='mid',
+                session='cierre'
+            )
+            holding_snapshot = cls._holding_snapshot(
+                portfolio, stock, snapshot_date, holding, price, rate, source
+            )
+            investment_value += holding_snapshot.total_value
+            holding_snapshots.append(holding_snapshot)
+
+        # Calculate cash balance and deposits
+        # Note: historical_cash is assumed to be in portfolio base currency
+        historical_cash = cls._get_historical_cash(portfolio, snapshot_date)
+        historical_deposits = cls._get_historical_deposits(portfolio, snapshot_date)
+        total_value = (historical_cash + investment_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+        values = {
+            'total_value': total_value,
+            'cash_balance': historical_cash,
+            'investment_value': investment_value,
+            'total_deposits': historical_deposits
+        }
+        return values, holding_snapshots
+
+    @classmethod
+    def create_daily_snapshot(cls, portfolio, date=None, writer=None):
+        """Creates the daily snapshot of ``portfolio`` for ``date`` (default today).
+
+        The day is written immediately, or queued on ``writer`` (a SnapshotWriter) and
+        written when it flushes. The valuation runs in a read_snapshot() transaction
+        without locking the portfolio, so trades are not held up meanwhile; the writer's
+        upserts make writing the result idempotent.
+        """
         from portfolio.models.portfolio import Portfolio
         snapshot_date = date or timezone.now().date()
-        with span("snapshot.daily", resource=str(portfolio.pk), tags={"date": str(snapshot_date)}), transaction.atomic():
+        with span("snapshot.daily", resource=str(portfolio.pk), tags={"date": str(snapshot_date)}), fx_caller('snapshot'):
             try:
-                locked_portfolio = Portfolio.objects.select_for_update().get(pk=portfolio.pk)
-                
-                # Get historical holdings as of snapshot date
-                historical_holdings = cls._get_historical_holdings(locked_portfolio, snapshot_date)
-                
-                # Calculate investment value (in base currency) and create holding snapshots
+                with read_snapshot():
+                    current_portfolio = Portfolio.objects.get(pk=portfolio.pk)
+                    values, holding_snapshots = cls._compute_daily_snapshot(current_portfolio, snapshot_date)
+            except Exception as e:
+                logger.error(f"Snapshot failed: {str(e)}")
+                raise
+        if writer is None:
+            with SnapshotWriter() as day_writer:
+                return day_writer.add(current_portfolio, snapshot_date, values, holding_snapshots)
+        return writer.add(current_portfolio, snapshot_date, values, holding_snapshots)
+
+    @classmethod
+    def create_snapshots_for_range(cls, portfolio, start_date, end_date, writer=None, dates=None):
+        """Create the snapshots of every day in ``[start_date, end_date]`` in one pass.
+
+        Produces the same rows create_daily_snapshot would for each day, but the ledger is
+        read once in timestamp order into running holdings, PEN/USD wallets and deposits,
+        and prices and FX rates are loaded once for the whole range instead of rebuilding
+        everything from the first transaction per day. Days are written through ``writer``
+        (a SnapshotWriter), or a writer of its own that is flushed before returning. With
+        ``dates``, only those days are written. As with create_daily_snapshot, the ledger
+        is read in a read_snapshot() transaction without locking the portfolio, and the
+        month-end checkpoints and days are written after it. Returns the
+        DailyPortfolioSnapshot rows in date order.
+        """
+        from portfolio.models.portfolio import Portfolio
+        if end_date < start_date:
+            return []
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+        with span("snapshot.range", resource=str(portfolio.pk), tags={"start": str(start_date), "end": str(end_date)}), \
+                fx_caller('snapshot'), fx_memo_scope('snapshot_range'), read_snapshot():
+            current_portfolio = Portfolio.objects.get(pk=portfolio.pk)
+            base_currency = current_portfolio.base_currency
+
+            # Resume from the nearest month-end checkpoint before the range and stream the tail.
+            checkpoint = LedgerCheckpointService.nearest(current_portfolio, start_date - timedelta(days=1))
+            replay = LedgerReplay(current_portfolio, checkpoint)
+            ledger = ledger_transactions(
+                current_portfolio, until=end_date, after=checkpoint.date if checkpoint else None
+            )
+
+            stock_ids = set(ledger.filter(stock__isnull=False).values_list('stock_id', flat=True))
+            stock_ids.update(replay.holdings, replay.acquisition_prices)
+            stocks = Stock.objects.in_bulk(stock_ids)
+            price_history = _PriceHistory(stocks)
+            stock_rates = {
+                currency: get_fx_rates_bulk(days, base_currency, currency, rate_type='mid', session='cierre')
+                for currency in {stock.currency for stock in stocks.values()}
+            }
+            # Seeds the memo _wallets_to_base converts through.
+            get_fx_matrices(days, session='cierre', rate_type='mid')
+
+            daily_values = []
+            checkpoints = []
+            entries = ledger.iterator(chunk_size=2000)
+            txn = next(entries, None)
+            for snapshot_date in days:
+                while txn is not None and timezone.localtime(txn.timestamp).date() <= snapshot_date:
+                    replay.apply(txn)
+                    txn = next(entries, None)
+
+                if is_checkpoint_date(snapshot_date) and replay.transaction_count:
+                    month_end = replay.to_checkpoint(snapshot_date)
+                    if month_end is not None:
+                        checkpoints.append(month_end)
+
                 investment_value = Decimal('0.00')
                 holding_snapshots = []
-                
-                for stock_id, holding in historical_holdings.items():
-                    stock = Stock.objects.get(pk=stock_id)
-                    price, source = cls._get_historical_price(
-                        stock_id, snapshot_date, locked_portfolio
-                    )
-                    native_value = price * holding['quantity']
-                    # Convert to portfolio base currency
-                    # Historical snapshots should use cierre and mid (estimate) for USD->PEN valuation
-                    rate = get_fx_rate(
-                        snapshot_date,
-                        locked_portfolio.base_currency,
-                        stock.currency,
-                        rate_type='mid',
-                        session='cierre'
-                    )
-                    stock_value_base = (native_value * rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                    investment_value += stock_value_base
-                    
-                    holding_snapshots.append(
-                        HoldingSnapshot(
-                            portfolio=locked_portfolio,
-                            stock=stock,
-                            date=snapshot_date,
-                            quantity=holding['quantity'],
-                            average_purchase_price=holding['average_price'],
-                            # Store base-currency value to keep totals additive
-                            total_value=stock_value_base
-                        )
+                for stock_id, holding in cls._finalize_holdings(replay.holdings).items():
+                    stock = stocks[stock_id]
+                    price, source = price_history.resolve(stock_id, snapshot_date, replay.acquisition_prices.get(stock_id))
+                    holding_snapshot = cls._holding_snapshot(
+                        current_portfolio, stock, snapshot_date, holding, price,
+                        stock_rates[stock.currency][snapshot_date], source,
                     )
+                    investment_value += holding_snapshot.total_value
+                    holding_snapshots.append(holding_snapshot)
 
-                # Delete existing snapshots for this date before creating new ones
-                HoldingSnapshot.objects.filter(
-                    portfolio=locked_portfolio,
-                    date=snapshot_date
-                ).delete()
-                
-                # Bulk create new snapshots
-                HoldingSnapshot.objects.bulk_create(holding_snapshots)
-
-                # Calculate cash balance and deposits
-                # Note: historical_cash is assumed to be in portfolio base currency
-                historical_cash = cls._get_historical_cash(locked_portfolio, snapshot_date)
-                historical_deposits = cls._get_historical_deposits(locked_portfolio, snapshot_date)
-                total_value = (historical_cash + investment_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-                # Retry logic for portfolio snapshot
-                max_retries = 3
-                for retry in range(max_retries):
+                # Like the per-day path, a transaction that cannot be replayed zeroes cash or
+                # deposits from its date on.
+                cash_balance = Decimal('0.00')
+                if not replay.cash_failed:
                     try:
-                        snapshot, created = DailyPortfolioSnapshot.objects.update_or_create(
-                            portfolio=locked_portfolio,
-                            date=snapshot_date,
-                            defaults={
-                                'total_value': total_value,
-                                'cash_balance': historical_cash,
-                                'investment_value': investment_value,
-                                'total_deposits': historical_deposits
-                            }
+                        cash_balance = cls._wallets_to_base(
+                            current_portfolio,
+                            {currency: Money(cents, currency) for currency, cents in replay.wallets.items()},
+                            snapshot_date,
                         )
-                        return snapshot
-                    except IntegrityError:
-                        if retry == max_retries - 1:
-                            raise
-                        time.sleep(1)
-                        
-            except Exception as e:
-                logger.error(f"Snapshot failed: {str(e)}")
-                raise
+                    except Exception as e:
+                        logger.error(f"Error fetching historical cash for portfolio {current_portfolio.id} on {snapshot_date}: {str(e)}")
+                total_deposits = Decimal('0.00') if replay.deposits_failed else cls._quantize_money(replay.deposits)
+
+                daily_values.append((snapshot_date, {
+                    'total_value': (cash_balance + investment_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+                    'cash_balance': cash_balance,
+                    'investment_value': investment_value,
+                    'total_deposits': total_deposits,
+                }, holding_snapshots))
+
+        LedgerCheckpointService.save(checkpoints)
+
+        day_writer = writer or SnapshotWriter()
+        snapshots = [
+            day_writer.add(current_portfolio, snapshot_date, values, day_holdings)
+            for snapshot_date, values, day_holdings in daily_values
+            if dates is None or snapshot_date in dates
+        ]
+        if writer is None:
+            day_writer.flush()
+        return snapshots
+
+    @classmethod
+    def revalue_for_prices(cls, pairs):
+        """Revalue stored holding rows in place after HistoricalStockPrice rows were written.
+
+        ``pairs`` are ``(stock_id, date)`` prices that are new or changed. A price on ``date``
+        is what every snapshot of that stock from ``date`` up to its next stored price
+        resolves to (exact or latest historical). Earlier rows were valued from the
+        acquisition price or an earlier stored price, so they are left alone, except when
+        no earlier price is stored: then the window opens at the start for rows valued
+        from a later price or a fallback (nearest_historical, current_price_fallback, ...).
+        Rows are found through
+        holding_stock_date_idx and repriced without replaying any ledger; each day's
+        investment and total value move by the difference. Returns a summary dict, e.g.:
+          {'pairs': 12, 'holdings': 340, 'snapshots': 335}
+
+        With SNAPSHOT_STORAGE='rle' the days are not stored as rows, so the holders'
+        snapshots are marked dirty from each price date instead ('marked' portfolios).
+        """
+        out = {'pairs': len(pairs), 'holdings': 0, 'snapshots': 0}
+        if snapshot_store.is_rle():
+            from portfolio.services.dirty_range_service import DirtyRangeService
+            out['marked'] = sum(
+                DirtyRangeService.mark_price_change(int(stock_id), price_date) for stock_id, price_date in pairs
+            )
+            return out
+        windows = {}
+        for stock_id, price_date in pairs:
+            windows.setdefault(int(stock_id), set()).add(price_date)
+        if not windows:
+            return out
+
+        stocks = Stock.objects.in_bulk(list(windows))
+        price_history = _PriceHistory(stocks)
+        rows = models.Q(pk__in=[])
+        for stock_id, price_dates in windows.items():
+            for price_date in price_dates:
+                window = models.Q(stock_id=stock_id, date__gte=price_date)
+                next_date = price_history.next_date(stock_id, price_date)
+                if next_date is not None:
+                    window &= models.Q(date__lt=next_date)
+                if not price_history.has_price_before(stock_id, price_date):
+                    window |= (
+                        models.Q(stock_id=stock_id, date__lt=price_date, price_source__in=FALLBACK_PRICE_SOURCES)
+                        & ~models.Q(price_source='portfolio_acquisition')
+                    )
+                rows |= window
+
+        with fx_caller('snapshot'), fx_memo_scope('snapshot_revalue'), transaction.atomic():
+            holdings = list(
+                HoldingSnapshot.objects.filter(rows)
+                .select_related('portfolio')
+                .select_for_update(of=('self',))
+            )
+            changed, snapshots = cls._reprice_holdings(holdings, stocks, price_history)
+
+        out['holdings'] = changed
+        out['snapshots'] = snapshots
+        logger.info(
+            f"Revalued {out['holdings']} holding row(s) across {out['snapshots']} snapshot(s) "
+            f"for {out['pairs']} new price(s)"
+        )
+        return out
+
+    @classmethod
+    def _reprice_holdings(cls, holdings, stocks, price_history, historical_only=False):
+        """Reprice locked HoldingSnapshot rows and move their days' totals by the difference.
+
+        Rows resolve their price without an acquisition price, which is only correct for
+        rows a stored price on or before their date covers; with ``historical_only`` rows
+        still lacking one are left alone. Returns ``(holding rows, snapshot rows)`` changed.
+        With SNAPSHOT_STORAGE='rle' nothing is written; portfolios with a changed row are
+        marked dirty from its date.
+        """
+        rates = {}
+        for pair in {(h.portfolio.base_currency, stocks[h.stock_id].currency) for h in holdings}:
+            rates[pair] = get_fx_rates_bulk(
+                {h.date for h in holdings}, pair[0], pair[1], rate_type='mid', session='cierre'
+            )
+
+        changed = []
+        deltas = {}
+        for holding in holdings:
+            stock = stocks[holding.stock_id]
+            price, source = price_history.resolve(holding.stock_id, holding.date, None)
+            if historical_only and source not in HISTORICAL_PRICE_SOURCES:
+                continue
+            repriced = cls._holding_snapshot(
+                holding.portfolio, stock, holding.date,
+                {'quantity': holding.quantity, 'average_price': holding.average_purchase_price},
+                price, rates[(holding.portfolio.base_currency, stock.currency)][holding.date], source,
+            )
+            if (repriced.total_value, repriced.price, repriced.price_source) == (
+                holding.total_value, holding.price, holding.price_source
+            ):
+                continue
+            key = (holding.portfolio_id, holding.date)
+            deltas[key] = deltas.get(key, Decimal('0.00')) + repriced.total_value - holding.total_value
+            holding.total_value = repriced.total_value
+            holding.price = repriced.price
+            holding.price_source = repriced.price_source
+            holding.fx_rate = repriced.fx_rate
+            changed.append(holding)
+
+        if snapshot_store.is_rle():
+            from portfolio.services.dirty_range_service import DirtyRangeService
+            earliest = {}
+            for holding in changed:
+                earliest[holding.portfolio_id] = min(earliest.get(holding.portfolio_id, holding.date), holding.date)
+            for portfolio_id, from_date in earliest.items():
+                DirtyRangeService.mark([portfolio_id], from_date, SnapshotDirtyRange.Reason.PRICE)
+            return len(changed), 0
+
+        snapshots = [
+            snapshot
+            for snapshot in DailyPortfolioSnapshot.all_objects.filter(
+                portfolio_id__in={portfolio_id for portfolio_id, _ in deltas},
+                date__in={snapshot_date for _, snapshot_date in deltas},
+            ).select_for_update()
+            if deltas.get((snapshot.portfolio_id, snapshot.date))
+        ]
+        for snapshot in snapshots:
+            delta = deltas[(snapshot.portfolio_id, snapshot.date)]
+            snapshot.investment_value += delta
+            snapshot.total_value += delta
+
+        HoldingSnapshot.objects.bulk_update(
+            changed, ['total_value', 'price', 'price_source', 'fx_rate'], batch_size=1000
+        )
+        DailyPortfolioSnapshot.all_objects.bulk_update(
+            snapshots, ['investment_value', 'total_value'], batch_size=1000
+        )
+        return len(changed), len(snapshots)
+
+    @classmethod
+    def reprice_fallback_holdings(cls, batch_size=1000, after_id=0, limit=None, include_unlabelled=False):
+        """Revalue holding rows priced by a fallback tier once a historical price covers them.
+
+        Rows are scanned in id order and committed per batch, so an interrupted run resumes
+        from ``after_id``. Rows still without a stored price on or before their date keep
+        their value. With ``include_unlabelled`` rows written before price sources were
+        recorded are scanned too, which also fills in their price, source and rate.
+
+        Returns a summary dict, e.g.:
+          {'scanned': 5000, 'repriced': 112, 'snapshots': 97, 'last_id': 918273}
+        """
+        sources = list(FALLBACK_PRICE_SOURCES) + ([''] if include_unlabelled else [])
+        queryset = HoldingSnapshot.objects.filter(price_source__in=sources).order_by('id')
+        out = {'scanned': 0, 'repriced': 0, 'snapshots': 0, 'last_id': after_id}
+
+        while limit is None or out['scanned'] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - out['scanned'])
+            ids = list(queryset.filter(id__gt=out['last_id']).values_list('id', flat=True)[:size])
+            if not ids:
+                break
+
+            with fx_caller('snapshot'), fx_memo_scope('snapshot_reprice'), transaction.atomic():
+                holdings = list(
+                    HoldingSnapshot.objects.filter(id__in=ids)
+                    .select_related('portfolio')
+                    .select_for_update(of=('self',))
+                )
+                stocks = Stock.objects.in_bulk({holding.stock_id for holding in holdings})
+                changed, snapshots = cls._reprice_holdings(
+                    holdings, stocks, _PriceHistory(stocks), historical_only=True
+                )
+
+            out['scanned'] += len(ids)
+            out['repriced'] += changed
+            out['snapshots'] += snapshots
+            out['last_id'] = ids[-1]
+            logger.info(f"Fallback repricing: {changed}/{len(ids)} holding rows up to id {out['last_id']}")
+
+        return out
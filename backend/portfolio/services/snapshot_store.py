@@ -0,0 +1,239 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.models.snapshot_series import SnapshotSeries
+from portfolio.models.transaction import Transaction
+from portfolio.services.money import Money
+
+logger = logging.getLogger(__name__)
+
+# Order of the cent values in a SnapshotSeries run.
+SERIES_VALUE_FIELDS = ('total_value', 'cash_balance', 'investment_value', 'total_deposits')
+
+
+def is_rle():
+    """Whether new snapshots are written as run-length series (SNAPSHOT_STORAGE='rle')."""
+    return getattr(settings, 'SNAPSHOT_STORAGE', 'daily') == 'rle'
+
+
+def snapshot_cents(snapshot):
+    return tuple(Money.from_decimal(getattr(snapshot, field)).cents for field in SERIES_VALUE_FIELDS)
+
+
+def encode_runs(month, days):
+    """Runs for ``{date: cents tuple}`` of one month; equal consecutive days share a run."""
+    runs = []
+    for day in sorted(days):
+        values = list(days[day])
+        offset = (day - month).days
+        if runs and runs[-1][0] + runs[-1][1] == offset and runs[-1][2:] == values:
+            runs[-1][1] += 1
+        else:
+            runs.append([offset, 1, *values])
+    return runs
+
+
+def decode_runs(series):
+    """``{date: cents tuple}`` of a SnapshotSeries."""
+    days = {}
+    for offset, length, *values in series.runs:
+        for step in range(length):
+            days[series.month + timedelta(days=offset + step)] = tuple(values)
+    return days
+
+
+def _expand(portfolio, day, cents):
+    values = {field: Money(value).to_decimal() for field, value in zip(SERIES_VALUE_FIELDS, cents)}
+    return DailyPortfolioSnapshot(portfolio=portfolio, date=day, **values)
+
+
+def daily_snapshots(portfolio, from_date=None, to_date=None):
+    """The portfolio's daily snapshots in ``[from_date, to_date]`` in date order, whatever the storage.
+
+    Stored DailyPortfolioSnapshot rows come back as they are and take precedence; days
+    kept in a SnapshotSeries are expanded into unsaved DailyPortfolioSnapshot instances
+    with the same fields.
+    """
+    stored = DailyPortfolioSnapshot.objects.filter(portfolio=portfolio)
+    series = SnapshotSeries.objects.filter(portfolio=portfolio)
+    if from_date is not None:
+        stored = stored.filter(date__gte=from_date)
+        series = series.filter(last_date__gte=from_date)
+    if to_date is not None:
+        stored = stored.filter(date__lte=to_date)
+        series = series.filter(first_date__lte=to_date)
+
+    rows = {snapshot.date: snapshot for snapshot in stored}
+    for item in series:
+        for day, cents in decode_runs(item).items():
+            if day in rows or (from_date is not None and day < from_date) or (to_date is not None and day > to_date):
+                continue
+            rows[day] = _expand(portfolio, day, cents)
+    return [rows[day] for day in sorted(rows)]
+
+
+def latest_snapshot(portfolio, before=None):
+    """The portfolio's latest snapshot (strictly before ``before`` if given), or None."""
+    stored = DailyPortfolioSnapshot.objects.filter(portfolio=portfolio)
+    series = SnapshotSeries.objects.filter(portfolio=portfolio)
+    if before is not None:
+        stored = stored.filter(date__lt=before)
+        series = series.filter(first_date__lt=before)
+
+    snapshot = stored.order_by('-date').first()
+    item = series.order_by('-month').first()
+    if item is not None:
+        days = {day: cents for day, cents in decode_runs(item).items() if before is None or day < before}
+        day = max(days)
+        if snapshot is None or day > snapshot.date:
+            return _expand(portfolio, day, days[day])
+    return snapshot
+
+
+def snapshot_bounds(portfolio):
+    """``(earliest, latest)`` snapshot dates of the portfolio, or ``(None, None)``."""
+    bounds = []
+    for queryset, first, last in (
+        (DailyPortfolioSnapshot.objects.filter(portfolio=portfolio), 'date', 'date'),
+        (SnapshotSeries.objects.filter(portfolio=portfolio), 'first_date', 'last_date'),
+    ):
+        earliest = queryset.order_by(first).values_list(first, flat=True).first()
+        if earliest is not None:
+            bounds.append((earliest, queryset.order_by(f'-{last}').values_list(last, flat=True).first()))
+    if not bounds:
+        return None, None
+    return min(earliest for earliest, _ in bounds), max(latest for _, latest in bounds)
+
+
+def snapshot_dates(portfolio, from_date):
+    """Dates on or after ``from_date`` that have a snapshot, in either storage."""
+    dates = set(
+        DailyPortfolioSnapshot.all_objects.filter(portfolio=portfolio, date__gte=from_date)
+        .values_list('date', flat=True)
+    )
+    for item in SnapshotSeries.objects.filter(portfolio=portfolio, last_date__gte=from_date):
+        dates.update(day for day in decode_runs(item) if day >= from_date)
+    return dates
+
+
+def portfolios_with_snapshots(since, portfolio_ids=None):
+    """Ids of portfolios with a snapshot on or after ``since``, optionally among ``portfolio_ids``."""
+    stored = DailyPortfolioSnapshot.all_objects.filter(date__gte=since)
+    series = SnapshotSeries.objects.filter(last_date__gte=since)
+    if portfolio_ids is not None:
+        stored = stored.filter(portfolio_id__in=portfolio_ids)
+        series = series.filter(portfolio_id__in=portfolio_ids)
+    return (
+        set(stored.values_list('portfolio_id', flat=True).distinct())
+        | set(series.values_list('portfolio_id', flat=True).distinct())
+    )
+
+
+def materialize(portfolio, from_date=None, to_date=None):
+    """Compute and store the snapshot days missing in ``[from_date, to_date]``; returns how many.
+
+    A no-op unless SNAPSHOT_ON_DEMAND is set. The window is clipped to the portfolio's
+    first transaction day and to yesterday (today's row belongs to the nightly run, and
+    views show live values for today), and the missing days are written by a single
+    create_snapshots_for_range pass over the span they cover.
+    """
+    from portfolio.services.snapshot_service import SnapshotService
+
+    if not getattr(settings, 'SNAPSHOT_ON_DEMAND', False):
+        return 0
+    first = (
+        Transaction.objects.filter(portfolio=portfolio)
+        .order_by('timestamp')
+        .values_list('timestamp', flat=True)
+        .first()
+    )
+    if first is None:
+        return 0
+    start = max(from_date or timezone.localtime(first).date(), timezone.localtime(first).date())
+    end = min(to_date or timezone.now().date(), timezone.now().date() - timedelta(days=1))
+    if end < start:
+        return 0
+
+    missing = {start + timedelta(days=offset) for offset in range((end - start).days + 1)}
+    missing -= snapshot_dates(portfolio, start)
+    if not missing:
+        return 0
+    SnapshotService.create_snapshots_for_range(portfolio, min(missing), max(missing), dates=missing)
+    logger.info(f"Materialized {len(missing)} snapshot day(s) for portfolio {portfolio.pk} from {min(missing)} to {max(missing)}")
+    return len(missing)
+
+
+def open_positions(portfolio_id, before):
+    """``{stock_id: HoldingSnapshot}`` of the latest change point per stock before ``before``.
+
+    In 'rle' storage a holding row stands for its position until the next row of the same
+    stock, and a quantity of 0 closes it; closed positions are left out.
+    """
+    latest = (
+        HoldingSnapshot.objects.filter(portfolio_id=portfolio_id, date__lt=before)
+        .values('stock_id')
+        .annotate(last=Max('date'))
+    )
+    points = Q(pk__in=[])
+    for row in latest:
+        points |= Q(stock_id=row['stock_id'], date=row['last'])
+    return {
+        holding.stock_id: holding
+        for holding in HoldingSnapshot.objects.filter(points, portfolio_id=portfolio_id)
+        if holding.quantity > 0
+    }
+
+
+def holding_change_points(portfolio_id, days):
+    """Holding rows 'rle' storage keeps for ``[(date, holding_snapshots), ...]`` in date order.
+
+    A row is kept when a position opens or its quantity or average price changes, and a
+    zero-quantity row is added on the day a position closes. Change points already stored
+    between the given days (on days not being rewritten) are taken into account.
+    """
+    dates = [day for day, _ in days]
+    positions = {
+        stock_id: (holding.quantity, holding.average_purchase_price)
+        for stock_id, holding in open_positions(portfolio_id, dates[0]).items()
+    }
+    between = list(
+        HoldingSnapshot.objects.filter(portfolio_id=portfolio_id, date__gt=dates[0], date__lt=dates[-1])
+        .exclude(date__in=dates)
+        .order_by('date')
+    )
+
+    kept = []
+    for day, holdings in days:
+        while between and between[0].date < day:
+            point = between.pop(0)
+            if point.quantity > 0:
+                positions[point.stock_id] = (point.quantity, point.average_purchase_price)
+            else:
+                positions.pop(point.stock_id, None)
+
+        current = {holding.stock_id: holding for holding in holdings}
+        for stock_id, holding in current.items():
+            if positions.get(stock_id) != (holding.quantity, holding.average_purchase_price):
+                kept.append(holding)
+        for stock_id, (_, average_price) in positions.items():
+            if stock_id not in current:
+                kept.append(HoldingSnapshot(
+                    portfolio_id=portfolio_id,
+                    stock_id=stock_id,
+                    date=day,
+                    quantity=0,
+                    average_purchase_price=average_price,
+                    total_value=Decimal('0.00'),
+                ))
+        positions = {
+            stock_id: (holding.quantity, holding.average_purchase_price)
+            for stock_id, holding in current.items()
+        }
+    return kept
@@ -0,0 +1,142 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.models.snapshot_series import SnapshotSeries
+from portfolio.services import snapshot_store
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VALUE_FIELDS = ['total_value', 'cash_balance', 'investment_value', 'total_deposits']
+HOLDING_VALUE_FIELDS = ['quantity', 'average_purchase_price', 'total_value', 'price', 'price_source', 'fx_rate']
+
+
+class SnapshotWriter:
+    """Accumulate snapshot days for many dates or portfolios and write them in bulk.
+
+    Each day is a DailyPortfolioSnapshot plus the full set of HoldingSnapshot rows for
+    that portfolio and date. ``batch_size`` days are written per chunk, in one
+    transaction: one upsert for the daily rows, one delete of the chunk's previous holding
+    rows per portfolio (positions closed since the last run must disappear) and one upsert
+    for the new holding rows. Upserts use ``bulk_create(update_conflicts=True)`` against
+    the models' unique constraints, so rewriting a day is idempotent.
+
+    With SNAPSHOT_STORAGE='rle' the daily values go into the portfolio's monthly
+    SnapshotSeries instead (replacing any DailyPortfolioSnapshot rows of those days), and
+    holding rows are only kept on days a position opens, changes or closes.
+
+    Usage::
+
+        with SnapshotWriter() as writer:
+            for portfolio in portfolios:
+                SnapshotService.create_daily_snapshot(portfolio, writer=writer)
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'SNAPSHOT_WRITE_BATCH_SIZE', 500)
+        self._days = []
+        self.written = 0
+
+    def add(self, portfolio, snapshot_date, values, holding_snapshots):
+        """Queue one day and return its (unsaved until flushed) DailyPortfolioSnapshot."""
+        snapshot = DailyPortfolioSnapshot(portfolio=portfolio, date=snapshot_date, **values)
+        self._days.append((snapshot, holding_snapshots))
+        if len(self._days) >= self.batch_size:
+            self.flush()
+        return snapshot
+
+    def flush(self):
+        """Write every queued day; returns the number of days written."""
+        days, self._days = self._days, []
+        for start in range(0, len(days), self.batch_size):
+            self._write_chunk(days[start:start + self.batch_size])
+        self.written += len(days)
+        return len(days)
+
+    def _write_chunk(self, days):
+        # The last day queued for a (portfolio, date) wins, as with repeated update_or_create.
+        latest = {}
+        for snapshot, holding_snapshots in days:
+            latest[(snapshot.portfolio_id, snapshot.date)] = (snapshot, holding_snapshots)
+
+        dates_by_portfolio = {}
+        for portfolio_id, snapshot_date in latest:
+            dates_by_portfolio.setdefault(portfolio_id, []).append(snapshot_date)
+
+        if snapshot_store.is_rle():
+            self._write_series_chunk(latest, dates_by_portfolio)
+            return
+
+        with transaction.atomic():
+            DailyPortfolioSnapshot.all_objects.bulk_create(
+                [snapshot for snapshot, _ in latest.values()],
+                update_conflicts=True,
+                unique_fields=['portfolio', 'date'],
+                update_fields=SNAPSHOT_VALUE_FIELDS,
+            )
+            for portfolio_id, dates in dates_by_portfolio.items():
+                HoldingSnapshot.objects.filter(portfolio_id=portfolio_id, date__in=dates).delete()
+            HoldingSnapshot.objects.bulk_create(
+                [holding for _, holding_snapshots in latest.values() for holding in holding_snapshots],
+                update_conflicts=True,
+                unique_fields=['portfolio', 'stock', 'date'],
+                update_fields=HOLDING_VALUE_FIELDS,
+            )
+        logger.debug(f"Wrote {len(latest)} snapshot days for {len(dates_by_portfolio)} portfolio(s)")
+
+    def _write_series_chunk(self, latest, dates_by_portfolio):
+        series_rows = []
+        holding_rows = []
+        with transaction.atomic():
+            for portfolio_id, dates in dates_by_portfolio.items():
+                dates.sort()
+                existing = SnapshotSeries.objects.select_for_update().filter(
+                    portfolio_id=portfolio_id,
+                    month__in={snapshot_date.replace(day=1) for snapshot_date in dates},
+                )
+                months = {series.month: snapshot_store.decode_runs(series) for series in existing}
+                for snapshot_date in dates:
+                    snapshot, _ = latest[(portfolio_id, snapshot_date)]
+                    months.setdefault(snapshot_date.replace(day=1), {})[snapshot_date] = (
+                        snapshot_store.snapshot_cents(snapshot)
+                    )
+                series_rows.extend(
+                    SnapshotSeries(
+                        portfolio_id=portfolio_id,
+                        month=month,
+                        runs=snapshot_store.encode_runs(month, days),
+                        first_date=min(days),
+                        last_date=max(days),
+                    )
+                    for month, days in months.items()
+                )
+                holding_rows.extend(snapshot_store.holding_change_points(
+                    portfolio_id,
+                    [(snapshot_date, latest[(portfolio_id, snapshot_date)][1]) for snapshot_date in dates],
+                ))
+
+            SnapshotSeries.objects.bulk_create(
+                series_rows,
+                update_conflicts=True,
+                unique_fields=['portfolio', 'month'],
+                update_fields=['runs', 'first_date', 'last_date'],
+            )
+            for portfolio_id, dates in dates_by_portfolio.items():
+                DailyPortfolioSnapshot.all_objects.filter(portfolio_id=portfolio_id, date__in=dates).delete()
+                HoldingSnapshot.objects.filter(portfolio_id=portfolio_id, date__in=dates).delete()
+            HoldingSnapshot.objects.bulk_create(holding_rows)
+        logger.debug(
+            f"Wrote {len(latest)} snapshot days as {len(series_rows)} series and "
+            f"{len(holding_rows)} holding change(s) for {len(dates_by_portfolio)} portfolio(s)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
@@ -0,0 +1,62 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import transaction as db_transaction
+
+from portfolio.models import Transaction
+from portfolio.services.fx_memo import fx_memo_scope
+from portfolio.services.fx_service import get_current_fx_context
+from portfolio.services.transaction_service import TransactionService
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_transaction_fx_rates(batch_size: int = 500, after_id: int = 0, limit=None):
+    """Stamp fx_rate/fx_rate_type onto transactions stored without one.
+
+    Each transaction gets the rate TransactionService.resolve_fx_rate stores: venta/compra
+    at the FX date and session of its timestamp for cross-currency trades and
+    conversions, the cierre mid of its date otherwise. Rows are scanned in id order and committed per batch, so
+    an interrupted run resumes by simply running again (or from ``after_id``). Rows whose
+    date has no FX data are left untouched and counted as unresolved rather than being
+    frozen at the 1.0 fallback.
+
+    Returns a summary dict, e.g.:
+      {'scanned': 1200, 'stamped': 1187, 'unresolved': 13, 'last_id': 48211}
+    """
+    out = {'scanned': 0, 'stamped': 0, 'unresolved': 0, 'last_id': after_id}
+    queryset = (
+        Transaction.all_objects
+        .filter(fx_rate__isnull=True)
+        .select_related('portfolio', 'stock')
+        .order_by('id')
+    )
+
+    while limit is None or out['scanned'] < limit:
+        size = batch_size if limit is None else min(batch_size, limit - out['scanned'])
+        batch = list(queryset.filter(id__gt=out['last_id'])[:size])
+        if not batch:
+            break
+
+        stamped = []
+        with fx_memo_scope('backfill_transaction_fx_rates'):
+            for transaction in batch:
+                fx_date, session = get_current_fx_context(now=transaction.timestamp)
+                try:
+                    transaction.fx_rate, transaction.fx_rate_type = TransactionService.resolve_fx_rate(
+                        transaction, fx_date=fx_date, session=session, require_rate=True
+                    )
+                except ValidationError:
+                    out['unresolved'] += 1
+                    continue
+                stamped.append(transaction)
+
+        with db_transaction.atomic():
+            Transaction.all_objects.bulk_update(stamped, ['fx_rate', 'fx_rate_type'])
+
+        out['scanned'] += len(batch)
+        out['stamped'] += len(stamped)
+        out['last_id'] = batch[-1].id
+        logger.info(f"Transaction FX backfill: stamped {len(stamped)}/{len(batch)} up to id {out['last_id']}")
+
+    return out
@@ -6,7 +6,10 @@ import logging
 from portfolio.models import Transaction, Holding, RealizedPNL, PortfolioPerformance
 from portfolio.services.currency_service import convert_with_pen_per_usd_rate, normalize_currency
 from portfolio.services.tracing import span
-from portfolio.services.fx_service import get_current_fx_context, get_fx_rate
+from portfolio.services.fx_metrics import fx_caller
+from portfolio.services.fx_service import get_current_fx_context, get_exact_fx_rate, get_fx_rate
+from datetime import timezone as dt_timezone
+from django.utils import timezone
 from uuid import uuid4
 
 logger = logging.getLogger(__name__)
@@ -24,7 +27,7 @@ class TransactionService:
             tags={
                 "portfolio.id": getattr(transaction_data.get('portfolio'), 'id', None),
             }
-        ), db_transaction.atomic(using='default'):
+        ), fx_caller('transaction'), db_transaction.atomic(using='default'):
             existing = Transaction.all_objects.filter(
                 portfolio=transaction_data['portfolio'],
                 idempotency_key=transaction_data['idempotency_key']
@@ -41,10 +44,17 @@ class TransactionService:
             handler = cls._get_transaction_handler(transaction.transaction_type)
             with span("transaction.process", resource=transaction.transaction_type):
                 handler(transaction)
+            if transaction.fx_rate_type not in ('compra', 'venta'):
+                # Rows without an executed FX leg are valued at their day's cierre mid, like
+                # readers resolve them; left empty until that rate is published.
+                transaction.fx_rate, transaction.fx_rate_type = cls.valuation_fx_rate(transaction)
             transaction.save()
             
             # Post-save processing (like RealizedPNL creation)
             cls._post_process_transaction(transaction)
+
+            # Commits with the ledger change, so historical caches keyed on it roll over atomically.
+            transaction.portfolio.bump_ledger_version()
             
             return transaction
 
@@ -323,22 +333,68 @@ class TransactionService:
         return normalize_currency(requested_currency, default=default_currency)
 
     @classmethod
-    def _get_mid_pen_per_usd_rate(cls, fx_date, session):
+    def resolve_fx_rate(cls, transaction, *, fx_date, session, require_rate=False):
+        """``(pen_per_usd, rate_type)`` stored on ``transaction``.
+
+        A cross-currency trade or conversion gets the venta/compra rate its handler applies
+        at fx_date/session; any other row gets valuation_fx_rate(). With ``require_rate``
+        a missing rate raises ValidationError instead of returning ``(None, None)``.
+        """
+        portfolio = transaction.portfolio
+        transaction_type = transaction.transaction_type
+        leg = None
+        if transaction_type in (Transaction.TransactionType.BUY, Transaction.TransactionType.SELL):
+            leg = (
+                getattr(transaction.stock, 'currency', None) or portfolio.base_currency,
+                transaction.cash_currency or portfolio.base_currency,
+            )
+        elif transaction_type == Transaction.TransactionType.CONVERT and transaction.counter_currency:
+            leg = (transaction.cash_currency or portfolio.base_currency, transaction.counter_currency)
+
+        if leg is not None and {normalize_currency(currency) for currency in leg} == {'PEN', 'USD'}:
+            return cls._get_pen_per_usd_rate_for_settlement(
+                fx_date=fx_date,
+                session=session,
+                original_currency=leg[0],
+                settlement_currency=leg[1],
+                trade_direction=transaction_type,
+            )
+        rate, rate_type = cls.valuation_fx_rate(transaction)
+        if rate is None and require_rate:
+            raise ValidationError(f"No cierre mid FX rate published for transaction {transaction.pk} yet")
+        return rate, rate_type
+
+    @classmethod
+    def valuation_fx_rate(cls, transaction):
+        """``(rate, 'mid')`` frozen on rows without an FX leg, or ``(None, None)``.
+
+        The rate is the cierre mid of the transaction's UTC date, the one readers resolve
+        for unstamped rows. Before it is published nothing is frozen, so readers keep
+        resolving it and backfill_transaction_fx stamps it later.
+        """
+        timestamp = transaction.timestamp or timezone.now()
+        fx_date = timestamp.astimezone(dt_timezone.utc).date()
+        rate = get_exact_fx_rate(fx_date, 'PEN', 'USD', rate_type='mid', session='cierre')
+        return (rate, 'mid') if rate is not None else (None, None)
+
+    @classmethod
+    def _get_mid_pen_per_usd_rate(cls, fx_date, session, require_rate=False):
         return get_fx_rate(
             fx_date,
             'PEN',
             'USD',
             rate_type='mid',
             session=session,
+            require_rate=require_rate,
         )
 
     @classmethod
-    def _get_pen_per_usd_rate_for_settlement(cls, *, fx_date, session, original_currency, settlement_currency, trade_direction):
+    def _get_pen_per_usd_rate_for_settlement(cls, *, fx_date, session, original_currency, settlement_currency, trade_direction, require_rate=False):
         original_currency = normalize_currency(original_currency)
         settlement_currency = normalize_currency(settlement_currency)
 
         if original_currency == settlement_currency:
-            return cls._get_mid_pen_per_usd_rate(fx_date, session), 'mid'
+            return cls._get_mid_pen_per_usd_rate(fx_date, session, require_rate=require_rate), 'mid'
 
         if original_currency == 'USD' and settlement_currency == 'PEN':
             rate_type = 'venta' if trade_direction == Transaction.TransactionType.BUY else 'compra'
@@ -362,7 +418,7 @@ class TransactionService:
                 require_rate=True,
             ), rate_type
 
-        return cls._get_mid_pen_per_usd_rate(fx_date, session), 'mid'
+        return cls._get_mid_pen_per_usd_rate(fx_date, session, require_rate=require_rate), 'mid'
 
     @classmethod
     def _convert_original_to_settlement_amount(cls, amount, *, original_currency, settlement_currency, pen_per_usd_rate):
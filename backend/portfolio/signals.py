@@ -1,10 +1,19 @@
-from django.db.models.signals import post_save
+from celery.signals import task_postrun, task_prerun
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from users.models import CustomUser
-from portfolio.models import Portfolio, PortfolioPerformance, Transaction
+from portfolio.models import FXRate, Portfolio, PortfolioPerformance, SnapshotDirtyRange, Transaction
 from decimal import Decimal
 from django.conf import settings
 from portfolio.services.transaction_service import TransactionService
+from portfolio.services import fx_metrics
+from portfolio.services.fx_memo import clear_active_fx_memo, enter_fx_memo, exit_fx_memo
+from portfolio.services.effective_fx_service import rebuild_effective_fx_rates
+from portfolio.services.fx_latest_service import expire_latest_fx_payload
+from portfolio.services.dirty_range_service import DirtyRangeService
+from stocks.models import HistoricalStockPrice
+from stocks.signals import eod_prices_written
 from uuid import uuid4
 
 @receiver(post_save, sender=CustomUser)
@@ -29,4 +38,100 @@ def create_default_portfolio(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Portfolio)
 def create_performance_record(sender, instance, created, **kwargs):
     if created:
-        PortfolioPerformance.objects.get_or_create(portfolio=instance)
\ No newline at end of file
+        PortfolioPerformance.objects.get_or_create(portfolio=instance)
+
+
+@receiver(pre_save, sender=FXRate)
+def remember_previous_fx_date(sender, instance, **kwargs):
+    previous = (
+        FXRate.objects.filter(pk=instance.pk).values_list('date', 'session', 'rate').first()
+        if instance.pk else None
+    )
+    instance._previous_date, instance._previous_session, instance._previous_rate = previous or (None, None, None)
+
+
+@receiver(post_save, sender=FXRate)
+@receiver(post_delete, sender=FXRate)
+def rebuild_effective_fx(sender, instance, **kwargs):
+    # Effective rates for every later date may resolve through this row.
+    # Ingest passes provider dates as ISO strings, so normalize before comparing.
+    written_date = FXRate._meta.get_field('date').to_python(instance.date)
+    start_date = min(filter(None, [written_date, getattr(instance, '_previous_date', None)]))
+    rebuild_effective_fx_rates(instance.base_currency, instance.quote_currency, start_date=start_date)
+    clear_active_fx_memo()
+    expire_latest_fx_payload()
+    # Snapshots value at closing rates only, and a re-save of the same cierre moves nothing.
+    if FXRate.Session.CIERRE not in (instance.session, getattr(instance, '_previous_session', None)):
+        return
+    if kwargs.get('signal') is post_save and _same_fx_row(instance, written_date):
+        return
+    DirtyRangeService.mark_fx_change(start_date)
+
+
+def _same_fx_row(instance, written_date):
+    if getattr(instance, '_previous_rate', None) is None:
+        return False
+    rate_field = FXRate._meta.get_field('rate')
+    rate = rate_field.to_python(instance.rate).quantize(Decimal(1).scaleb(-rate_field.decimal_places))
+    return (instance._previous_date, instance._previous_session, instance._previous_rate) == (
+        written_date, instance.session, rate,
+    )
+
+
+@receiver(post_save, sender=HistoricalStockPrice)
+@receiver(post_delete, sender=HistoricalStockPrice)
+def mark_snapshots_dirty_for_price(sender, instance, **kwargs):
+    # Single-row writes (admin, backfills). EOD ingest upserts in bulk, which sends no
+    # post_save, and revalues its rows in place through eod_prices_written instead.
+    price_date = HistoricalStockPrice._meta.get_field('date').to_python(instance.date)
+    DirtyRangeService.mark_price_change(instance.stock_id, price_date)
+
+
+@receiver(eod_prices_written)
+def revalue_snapshots_for_eod_prices(sender, pairs, **kwargs):
+    from portfolio.tasks import revalue_snapshots_for_prices
+    revalue_snapshots_for_prices.delay([[stock_id, price_date.isoformat()] for stock_id, price_date in pairs])
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction_timestamp(sender, instance, update_fields=None, **kwargs):
+    instance._previous_timestamp = (
+        Transaction.all_objects.filter(pk=instance.pk).values_list('timestamp', flat=True).first()
+        if instance.pk and not update_fields else None
+    )
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def mark_snapshots_dirty_for_transaction(sender, instance, created=False, update_fields=None, **kwargs):
+    # TransactionService's own follow-up saves pass update_fields and it bumps the
+    # ledger version itself; a deletion cascading from a portfolio or user needs nothing.
+    if update_fields:
+        return
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Transaction:
+        return
+    if not created:
+        # Edited or deleted outside TransactionService (e.g. in the admin).
+        Portfolio.all_objects.filter(pk=instance.portfolio_id).update(ledger_version=F('ledger_version') + 1)
+    # A transaction moved later also invalidates the days it no longer counts in.
+    timestamps = filter(None, [instance.timestamp, getattr(instance, '_previous_timestamp', None)])
+    DirtyRangeService.mark(
+        [instance.portfolio_id],
+        min(timestamps).date(),
+        SnapshotDirtyRange.Reason.TRANSACTION,
+    )
+
+
+_task_fx_memo_tokens = {}
+
+
+@task_prerun.connect
+def enter_task_fx_memo(task_id=None, task=None, **kwargs):
+    _task_fx_memo_tokens[task_id] = enter_fx_memo(label=getattr(task, 'name', None))
+
+
+@task_postrun.connect
+def exit_task_fx_memo(task_id=None, **kwargs):
+    fx_metrics.record_memo_scope(exit_fx_memo(_task_fx_memo_tokens.pop(task_id, None)))
+    fx_metrics.flush()
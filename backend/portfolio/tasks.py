@@ -1,20 +1,154 @@
 # backend/portfolio/tasks.py
-from celery import shared_task
+import time
+
+from celery import chord, shared_task
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Q
 from portfolio.services import SnapshotService
+from portfolio.services.dirty_range_service import DirtyRangeService
+from portfolio.services.ledger_checkpoint_service import LedgerCheckpointService
+from portfolio.services.snapshot_writer import SnapshotWriter
 from portfolio.models import Portfolio
 from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 from portfolio.services.performance_service import PerformanceCalculator
-from portfolio.services.fx_ingest_service import upsert_latest_from_bcrp
+from portfolio.services.fx_ingest_service import backfill_from_bcrp, upsert_latest_from_bcrp
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _snapshot_chunks(portfolio_ids, chunk_size):
+    """Split ids into chunks of ``chunk_size`` portfolios (the last one may be shorter)."""
+    size = max(1, chunk_size)
+    return [portfolio_ids[start:start + size] for start in range(0, len(portfolio_ids), size)]
+
+
+def _prewarm_portfolios(portfolios, snapshot_date):
+    """Portfolios whose owner logged in, or which had a transaction, in the last SNAPSHOT_PREWARM_ACTIVE_DAYS."""
+    since = snapshot_date - timedelta(days=getattr(settings, 'SNAPSHOT_PREWARM_ACTIVE_DAYS', 30))
+    return portfolios.filter(
+        Q(user__last_login__date__gte=since) | Q(transactions__timestamp__date__gte=since)
+    ).distinct()
+
+
+@shared_task
+def create_daily_snapshots(snapshot_date=None):
+    """Coordinate the nightly snapshot run: fan portfolio chunks out as a chord.
+
+    Portfolio ids are split into chunks of SNAPSHOT_CHUNK_SIZE, sent to the
+    SNAPSHOT_CHUNK_QUEUE queue; the concurrency of the workers consuming that queue bounds
+    how many chunks hit the database at once. Every chunk snapshots the same date, fixed
+    here, even if it runs after midnight; summarize_daily_snapshots aggregates the chunk
+    results.
+
+    With SNAPSHOT_ON_DEMAND only recently active portfolios are pre-warmed (see
+    _prewarm_portfolios); the others get their days computed when next viewed.
+    """
+    snapshot_date = snapshot_date or timezone.now().date().isoformat()
+    portfolios = Portfolio.objects.all()
+    if getattr(settings, 'SNAPSHOT_ON_DEMAND', False):
+        portfolios = _prewarm_portfolios(portfolios, date.fromisoformat(snapshot_date))
+    portfolio_ids = list(portfolios.order_by('id').values_list('id', flat=True))
+    chunks = _snapshot_chunks(portfolio_ids, getattr(settings, 'SNAPSHOT_CHUNK_SIZE', 50))
+    if not chunks:
+        return {'date': snapshot_date, 'chunks': 0, 'portfolios': 0}
+
+    queue = getattr(settings, 'SNAPSHOT_CHUNK_QUEUE', 'celery')
+    chord(
+        create_daily_snapshots_chunk.s(chunk, snapshot_date).set(queue=queue) for chunk in chunks
+    )(summarize_daily_snapshots.s(snapshot_date, time.time()))
+    logger.info(f"Dispatched {len(chunks)} snapshot chunk(s) for {len(portfolio_ids)} portfolio(s) on {snapshot_date}")
+    return {'date': snapshot_date, 'chunks': len(chunks), 'portfolios': len(portfolio_ids)}
+
+
+@shared_task(bind=True, max_retries=3)
+def create_daily_snapshots_chunk(self, portfolio_ids, snapshot_date=None):
+    """Snapshot one chunk of portfolios and report how it went.
+
+    A portfolio whose valuation fails is logged and skipped so the rest of the chunk
+    still runs; a database error retries the whole chunk with backoff, which is safe
+    because the writer upserts. Once the retries are used up the chunk reports all its
+    portfolios as failed instead of raising, so the chord still gets its summary.
+    """
+    started = time.monotonic()
+    try:
+        return _snapshot_chunk(portfolio_ids, snapshot_date, started)
+    except DatabaseError as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+        logger.exception(f"Snapshot chunk of {len(portfolio_ids)} portfolio(s) failed after {self.request.retries} retries")
+        return {
+            'portfolios': len(portfolio_ids),
+            'succeeded': 0,
+            'failed': list(portfolio_ids),
+            'duration_s': round(time.monotonic() - started, 3),
+            'error': str(e),
+        }
+
+
+def _snapshot_chunk(portfolio_ids, snapshot_date, started):
+    snapshot_date = date.fromisoformat(snapshot_date) if snapshot_date else timezone.now().date()
+    failed = []
+    succeeded = 0
+
+    # The writer only flushes when the loop completes: after a database error its queued
+    # days are dropped with it and the retry rewrites the whole chunk.
+    with SnapshotWriter() as writer:
+        for portfolio in Portfolio.objects.filter(id__in=portfolio_ids).order_by('id'):
+            try:
+                SnapshotService.create_daily_snapshot(portfolio, snapshot_date, writer=writer)
+                # Keeps last month-end checkpointed so reconstructions replay at most a month.
+                LedgerCheckpointService.ensure_checkpoint(portfolio, snapshot_date)
+                succeeded += 1
+            except DatabaseError:
+                raise
+            except Exception:
+                logger.exception(f"Snapshot failed for portfolio {portfolio.id} on {snapshot_date}")
+                failed.append(portfolio.id)
+
+    return {
+        'portfolios': len(portfolio_ids),
+        'succeeded': succeeded,
+        'failed': failed,
+        'duration_s': round(time.monotonic() - started, 3),
+    }
+
+
+@shared_task
+def summarize_daily_snapshots(chunk_results, snapshot_date, started_at):
+    """Chord callback: totals across chunks plus the per-chunk breakdown."""
+    summary = {
+        'date': snapshot_date,
+        'chunks': chunk_results,
+        'portfolios': sum(result['portfolios'] for result in chunk_results),
+        'succeeded': sum(result['succeeded'] for result in chunk_results),
+        'failed': [portfolio_id for result in chunk_results for portfolio_id in result['failed']],
+        'duration_s': round(time.time() - started_at, 3),
+    }
+    log = logger.warning if summary['failed'] else logger.info
+    log(
+        f"Daily snapshots for {snapshot_date}: {summary['succeeded']}/{summary['portfolios']} portfolios "
+        f"in {len(chunk_results)} chunk(s), {summary['duration_s']}s"
+        + (f", failed: {summary['failed']}" if summary['failed'] else "")
+    )
+    return summary
+
+
+@shared_task
+def recompute_dirty_snapshots(limit=None):
+    """Rebuild stored snapshots whose prices, FX rates or transactions changed since they were written."""
+    return DirtyRangeService.recompute(limit=limit)
+
+
 @shared_task
-def create_daily_snapshots():
-    for portfolio in Portfolio.objects.all():
-        SnapshotService.create_daily_snapshot(portfolio)
+def revalue_snapshots_for_prices(pairs):
+    """EOD ingest follow-up: reprice stored snapshot rows for the ``[stock_id, 'YYYY-MM-DD']`` pairs it wrote."""
+    return SnapshotService.revalue_for_prices(
+        [(stock_id, date.fromisoformat(price_date)) for stock_id, price_date in pairs]
+    )
+
 
 @shared_task
 def update_all_time_weighted_returns():
@@ -45,3 +179,16 @@ def fx_ingest_latest_auto(mode='auto'):
     except Exception:
         logger.exception("FX ingest task failed for mode=%s", mode)
         raise
+
+
+@shared_task
+def fx_backfill_range(start_date, end_date):
+    """Backfill USD->PEN history from BCRP for an ISO date range (inclusive).
+
+    Returns the backfill summary with per-series observation counts.
+    """
+    try:
+        return backfill_from_bcrp(start_date, end_date)
+    except Exception:
+        logger.exception("FX backfill task failed for %s..%s", start_date, end_date)
+        raise
@@ -9,6 +9,14 @@ from stocks.tests.factories import StockFactory
 from django.utils import timezone
 from datetime import datetime, time as datetime_time, timezone as datetime_timezone
 import logging
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    """Primary keys repeat across rolled-back tests, so cache keys built from them must not leak."""
+    from django.core.cache import cache
+    cache.clear()
+
     
 @pytest.fixture
 def stock():
@@ -38,3 +38,32 @@ def test_bcrp_csv_parsing(monkeypatch):
     assert d == '2025-09-23'
     assert v == Decimal('3.72')
 
+
+
+def test_bcrp_range_parses_every_observation(monkeypatch):
+    payload = {
+        "periods": [
+            {"name": "22.Set.25", "values": ["3.75"]},
+            {"name": "23.Set.25", "values": ["n.d."]},
+            {"name": "24.Set.25", "values": ["3.77"]},
+        ]
+    }
+    urls = []
+    monkeypatch.setattr(bcrp, '_fetch', lambda url: urls.append(url) or '{"ok":true}')
+    monkeypatch.setattr(bcrp, '_ensure_json', lambda raw: payload)
+
+    obs = bcrp.get_range('PD04645PD', '2025-09-22', '2025-09-24')
+
+    assert urls == [f"{bcrp.BCRP_BASE}/PD04645PD/json/2025-09-22/2025-09-24"]
+    assert obs == [('2025-09-22', Decimal('3.75')), ('2025-09-24', Decimal('3.77'))]
+
+
+def test_bcrp_range_falls_back_to_csv(monkeypatch):
+    csv = "Fecha,Valor\n22.Set.25,3.70\n23.Set.25,-\n24.Set.25,3.72\n"
+    monkeypatch.setattr(bcrp, '_fetch', lambda url: csv)
+    monkeypatch.setattr(bcrp, '_ensure_json', lambda raw: (_ for _ in ()).throw(ValueError('not json')))
+
+    assert bcrp.get_range('PD04645PD', '2025-09-22', '2025-09-24') == [
+        ('2025-09-22', Decimal('3.70')),
+        ('2025-09-24', Decimal('3.72')),
+    ]
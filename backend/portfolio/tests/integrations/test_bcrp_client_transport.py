@@ -0,0 +1,73 @@
+import time
+from decimal import Decimal
+
+import pytest
+from django.core.cache import cache
+
+from portfolio.integrations import bcrp_client as bcrp
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return FakeResponse('﻿{"periods": [{"name": "23.Set.25", "values": ["3.76"]}]}')
+
+
+@pytest.fixture
+def session(monkeypatch):
+    cache.clear()
+    fake = FakeSession()
+    monkeypatch.setattr(bcrp, '_get_session', lambda: fake)
+    yield fake
+    cache.clear()
+
+
+def test_responses_are_cached_per_url(session, settings):
+    settings.BCRP_CACHE_TTL_SECONDS = 60
+
+    assert bcrp.get_latest('PD04645PD') == ('2025-09-23', Decimal('3.76'))
+    assert bcrp.get_latest('PD04645PD') == ('2025-09-23', Decimal('3.76'))
+    bcrp.get_latest('PD04646PD')
+
+    assert session.urls == [
+        f"{bcrp.BCRP_BASE}/PD04645PD/json",
+        f"{bcrp.BCRP_BASE}/PD04646PD/json",
+    ]
+
+
+def test_zero_ttl_disables_cache(session, settings):
+    settings.BCRP_CACHE_TTL_SECONDS = 0
+
+    bcrp.get_latest('PD04645PD')
+    bcrp.get_latest('PD04645PD')
+
+    assert len(session.urls) == 2
+
+
+def test_both_directions_and_chains_resolve_concurrently(monkeypatch):
+    def slow_get_latest(code):
+        time.sleep(0.2)
+        if code in ('PD04643PD', 'PD04644PD'):
+            raise RuntimeError('intraday unavailable')
+        return '2025-09-23', Decimal('3.70') if code == 'PD04645PD' else Decimal('3.80')
+
+    monkeypatch.setattr(bcrp, 'get_latest', slow_get_latest)
+
+    started = time.monotonic()
+    compra, venta = bcrp.resolve_latest_both(mode='intraday')
+    elapsed = time.monotonic() - started
+
+    assert compra == ('PD04645PD', '2025-09-23', Decimal('3.70'))
+    assert venta == ('PD04646PD', '2025-09-23', Decimal('3.80'))
+    assert elapsed < 0.5
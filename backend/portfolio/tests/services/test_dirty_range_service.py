@@ -0,0 +1,129 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
+from decimal import Decimal
+
+from portfolio.models import DailyPortfolioSnapshot, FXRate, Portfolio, SnapshotDirtyRange, Transaction
+from portfolio.services import SnapshotService
+from portfolio.services.dirty_range_service import DirtyRangeService
+from portfolio.tests.factories import PortfolioFactory, TransactionFactory
+from stocks.models import HistoricalStockPrice
+from stocks.tests.factories import StockFactory
+
+DAYS = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(4)]
+
+
+@pytest.fixture
+def snapshotted(portfolio, set_fx_market_now):
+    """A portfolio holding 10 PEN shares with snapshots stored for DAYS[1] and DAYS[3]."""
+    portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+    stock = StockFactory(symbol='DRTY1', current_price=Decimal('10.00'), currency='PEN')
+    HistoricalStockPrice.objects.create(stock=stock, date=DAYS[0], price=Decimal('10.00'))
+
+    set_fx_market_now(DAYS[0])
+    timestamp = datetime.combine(DAYS[0], datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+    TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('1000.00'), timestamp=timestamp)
+    TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=10, timestamp=timestamp)
+    portfolio.refresh_from_db()
+
+    for day in (DAYS[1], DAYS[3]):
+        SnapshotService.create_daily_snapshot(portfolio, day)
+    return portfolio, stock
+
+
+def _investment_values(portfolio):
+    return dict(
+        DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).values_list('date', 'investment_value')
+    )
+
+
+@pytest.mark.django_db
+class TestDirtyRangeService:
+    def test_late_price_recomputes_only_stored_days(self, snapshotted):
+        portfolio, stock = snapshotted
+        assert _investment_values(portfolio) == {DAYS[1]: Decimal('100.00'), DAYS[3]: Decimal('100.00')}
+
+        HistoricalStockPrice.objects.create(stock=stock, date=DAYS[2], price=Decimal('12.50'))
+        dirty = SnapshotDirtyRange.objects.get(portfolio=portfolio)
+        assert (dirty.from_date, dirty.reason) == (DAYS[2], SnapshotDirtyRange.Reason.PRICE)
+
+        result = DirtyRangeService.recompute()
+
+        assert result['portfolios'] == 1
+        assert result['days'] == 1
+        assert _investment_values(portfolio) == {DAYS[1]: Decimal('100.00'), DAYS[3]: Decimal('125.00')}
+        assert not SnapshotDirtyRange.objects.exists()
+
+    def test_first_price_marks_from_the_first_held_day(self, snapshotted):
+        portfolio, stock = snapshotted
+        HistoricalStockPrice.objects.filter(stock=stock).delete()
+        SnapshotDirtyRange.objects.all().delete()
+
+        HistoricalStockPrice.objects.create(stock=stock, date=DAYS[3], price=Decimal('12.50'))
+
+        # DAYS[1] was valued without any stored price on or before it either.
+        assert SnapshotDirtyRange.objects.get(portfolio=portfolio).from_date == DAYS[1]
+
+    def test_marks_coalesce_to_earliest_date(self, snapshotted):
+        portfolio, _ = snapshotted
+
+        assert DirtyRangeService.mark([portfolio.id], DAYS[2]) == 1
+        assert DirtyRangeService.mark([portfolio.id], DAYS[3]) == 0
+        assert DirtyRangeService.mark([portfolio.id], DAYS[1]) == 1
+        # Nothing stored after the date, nothing to recompute.
+        assert DirtyRangeService.mark([portfolio.id], DAYS[3] + timedelta(days=1)) == 0
+
+        result = DirtyRangeService.recompute()
+        assert result['days'] == 2
+        assert not SnapshotDirtyRange.objects.exists()
+
+    def test_transaction_edited_outside_service_marks_portfolio(self, snapshotted):
+        portfolio, _ = snapshotted
+        deposit = Transaction.objects.get(portfolio=portfolio, transaction_type='DEPOSIT')
+        version = Portfolio.objects.get(pk=portfolio.pk).ledger_version
+
+        deposit.error_message = 'corrected'
+        deposit.save()
+
+        assert Portfolio.objects.get(pk=portfolio.pk).ledger_version == version + 1
+        dirty = SnapshotDirtyRange.objects.get(portfolio=portfolio)
+        assert (dirty.from_date, dirty.reason) == (DAYS[0], SnapshotDirtyRange.Reason.TRANSACTION)
+
+    def test_transaction_moved_later_marks_from_its_old_date(self, snapshotted):
+        portfolio, _ = snapshotted
+        deposit = Transaction.objects.get(portfolio=portfolio, transaction_type='DEPOSIT')
+
+        deposit.timestamp += timedelta(days=3)
+        deposit.save()
+
+        dirty = SnapshotDirtyRange.objects.get(portfolio=portfolio)
+        assert (dirty.from_date, dirty.reason) == (DAYS[0], SnapshotDirtyRange.Reason.TRANSACTION)
+
+    def test_cierre_resave_marks_only_when_the_rate_changes(self, snapshotted):
+        portfolio, _ = snapshotted
+        cierre = FXRate.objects.create(
+            date=DAYS[2], base_currency='PEN', quote_currency='USD',
+            rate=Decimal('3.750'), rate_type='mid', session='cierre',
+        )
+        SnapshotDirtyRange.objects.all().delete()
+
+        cierre.notes = 'checked against BCRP'
+        cierre.save()
+        assert not SnapshotDirtyRange.objects.exists()
+
+        cierre.rate = Decimal('3.760')
+        cierre.save()
+        dirty = SnapshotDirtyRange.objects.get(portfolio=portfolio)
+        assert (dirty.from_date, dirty.reason) == (DAYS[2], SnapshotDirtyRange.Reason.FX)
+
+    def test_failed_portfolio_keeps_its_marks(self, snapshotted, monkeypatch):
+        portfolio, _ = snapshotted
+        DirtyRangeService.mark([portfolio.id], DAYS[1])
+
+        def fail(*args, **kwargs):
+            raise ValueError("boom")
+
+        monkeypatch.setattr(SnapshotService, 'create_snapshots_for_range', fail)
+        result = DirtyRangeService.recompute()
+
+        assert result['failed'] == [portfolio.id]
+        assert SnapshotDirtyRange.objects.filter(portfolio=portfolio).exists()
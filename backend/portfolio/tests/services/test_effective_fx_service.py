@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from portfolio.models import EffectiveFXRate, FXRate
+from portfolio.services.effective_fx_service import rebuild_effective_fx_rates
+from portfolio.services.fx_curve import FXCurve
+from portfolio.services.fx_service import FX_TIER_EXACT, FX_TIER_PRIOR_SAME_TYPE, get_fx_rate
+
+
+def _rate(day, rate, rate_type='mid', session='cierre'):
+    return FXRate.objects.create(
+        date=day,
+        base_currency='PEN',
+        quote_currency='USD',
+        rate=Decimal(rate),
+        rate_type=rate_type,
+        session=session,
+    )
+
+
+@pytest.mark.django_db
+def test_writes_materialize_dense_rows_matching_the_cascade():
+    start = date(2025, 6, 2)
+    _rate(start, '3.60', rate_type='compra')
+    _rate(start + timedelta(days=3), '3.70', rate_type='venta', session='intraday')
+    _rate(start + timedelta(days=6), '3.65')
+
+    assert EffectiveFXRate.objects.count() == 7 * 6
+    curve = FXCurve.load('PEN', 'USD')
+    for row in EffectiveFXRate.objects.all():
+        assert (row.rate, row.tier) == curve.resolve(row.date, rate_type=row.rate_type, session=row.session)
+
+    mid = EffectiveFXRate.objects.get(date=start + timedelta(days=2), rate_type='compra', session='cierre')
+    assert (mid.rate, mid.tier, mid.source_date) == (Decimal('3.60'), FX_TIER_PRIOR_SAME_TYPE, start)
+
+
+@pytest.mark.django_db
+def test_materialized_lookup_is_a_single_query():
+    day = date(2025, 6, 2)
+    _rate(day, '3.60', rate_type='compra')
+    _rate(day + timedelta(days=10), '3.65')
+
+    with CaptureQueriesContext(connection) as ctx:
+        rate = get_fx_rate(day + timedelta(days=5), 'PEN', 'USD', rate_type='venta', session='intraday')
+
+    assert rate == Decimal('3.60')
+    assert len(ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_backdated_and_deleted_rows_rebuild_later_dates():
+    start = date(2025, 6, 2)
+    _rate(start, '3.60')
+    latest = _rate(start + timedelta(days=4), '3.70')
+    assert EffectiveFXRate.objects.get(date=start + timedelta(days=2), rate_type='mid', session='cierre').rate == Decimal('3.60')
+
+    _rate(start + timedelta(days=1), '3.62')
+    refreshed = EffectiveFXRate.objects.get(date=start + timedelta(days=2), rate_type='mid', session='cierre')
+    assert (refreshed.rate, refreshed.source_date) == (Decimal('3.62'), start + timedelta(days=1))
+
+    latest.delete()
+    assert not EffectiveFXRate.objects.filter(date__gte=latest.date).exists()
+
+
+@pytest.mark.django_db
+def test_dates_past_latest_ingest_use_live_cascade():
+    day = date(2025, 6, 2)
+    _rate(day, '3.60')
+
+    assert not EffectiveFXRate.objects.filter(date=day + timedelta(days=1)).exists()
+    assert get_fx_rate(day + timedelta(days=1), 'PEN', 'USD', rate_type='mid', session='cierre') == Decimal('3.60')
+
+
+@pytest.mark.django_db
+def test_full_rebuild_command_restores_missing_rows():
+    day = date(2025, 6, 2)
+    _rate(day, '3.60')
+    EffectiveFXRate.objects.all().delete()
+
+    call_command('rebuild_effective_fx')
+
+    row = EffectiveFXRate.objects.get(date=day, rate_type='mid', session='cierre')
+    assert (row.rate, row.tier) == (Decimal('3.60'), FX_TIER_EXACT)
+    assert rebuild_effective_fx_rates(start_date=day + timedelta(days=30)) == 0
@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+
+from portfolio.models import FXRate, Transaction
+from portfolio.services.currency_service import get_transaction_amounts_in_currency
+from portfolio.services.fx_aggregates import cents_sum, transaction_amount_cents, transaction_fx_query
+from portfolio.services.money_kernel import cents_to_decimal
+from portfolio.tests.factories import TransactionFactory
+
+
+START = date(2025, 6, 2)
+
+
+def _rate(day, rate):
+    FXRate.objects.create(
+        date=day, base_currency='PEN', quote_currency='USD', rate=Decimal(rate), rate_type='mid', session='cierre'
+    )
+
+
+def _flow(portfolio, transaction_type, amount, currency, day, *, frozen=True):
+    transaction = TransactionFactory(
+        portfolio=portfolio, transaction_type=transaction_type, amount=Decimal(amount), cash_currency=currency
+    )
+    update = {'timestamp': datetime(day.year, day.month, day.day, 15, 0, tzinfo=dt_timezone.utc)}
+    if not frozen:
+        update.update(fx_rate=None, fx_rate_type=None)
+    Transaction.all_objects.filter(pk=transaction.pk).update(**update)
+    return transaction
+
+
+@pytest.fixture
+def ledger(portfolio, set_fx_market_now):
+    set_fx_market_now(START + timedelta(days=3))
+    _rate(START, '3.751235')
+    _rate(START + timedelta(days=2), '3.700001')
+
+    _flow(portfolio, 'DEPOSIT', '5000.00', 'PEN', START + timedelta(days=3))
+    _flow(portfolio, 'DEPOSIT', '1000.01', 'USD', START + timedelta(days=3))
+    # Unfrozen rows: inside the materialized range, before any FX data and after the last ingest.
+    _flow(portfolio, 'DEPOSIT', '0.05', 'PEN', START + timedelta(days=1), frozen=False)
+    _flow(portfolio, 'DEPOSIT', '123.45', 'USD', START + timedelta(days=1), frozen=False)
+    _flow(portfolio, 'WITHDRAWAL', '10.03', 'PEN', START - timedelta(days=5), frozen=False)
+    _flow(portfolio, 'WITHDRAWAL', '77.77', 'PEN', START + timedelta(days=9), frozen=False)
+    _flow(portfolio, 'DEPOSIT', '250.00', 'USD', START + timedelta(days=9), frozen=False)
+    return Transaction.objects.filter(portfolio=portfolio)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('to_currency', ['USD', 'PEN'])
+def test_sql_sums_match_python_conversion(ledger, to_currency):
+    transactions = list(ledger.order_by('id'))
+    expected = {}
+    counts = {}
+    for transaction, amount in zip(transactions, get_transaction_amounts_in_currency(transactions, to_currency)):
+        expected[transaction.transaction_type] = expected.get(transaction.transaction_type, Decimal('0.00')) + amount
+        counts[transaction.transaction_type] = counts.get(transaction.transaction_type, 0) + 1
+
+    fx = transaction_fx_query(ledger)
+    amount = transaction_amount_cents(fx, to_currency)
+    rows = fx.queryset.values('transaction_type').annotate(count=Count('id'), cents=cents_sum(amount))
+
+    assert {row['transaction_type']: cents_to_decimal(row['cents']) for row in rows} == expected
+    assert {row['transaction_type']: row['count'] for row in rows} == counts
+
+
+@pytest.mark.django_db
+def test_totals_take_constant_queries(ledger, portfolio):
+    def run():
+        with CaptureQueriesContext(connection) as ctx:
+            fx = transaction_fx_query(ledger)
+            amount = transaction_amount_cents(fx, 'USD')
+            fx.queryset.aggregate(total=cents_sum(amount))
+        return len(ctx.captured_queries)
+
+    before = run()
+    for _ in range(10):
+        _flow(portfolio, 'DEPOSIT', '1.00', 'USD', START + timedelta(days=1), frozen=False)
+
+    assert run() == before
@@ -65,3 +65,32 @@ def test_fx_fallback_uses_prior_rate(user_factory, set_fx_market_now):
     # Expect conversion using prior rate: 20 * 4 = 80
     assert snap.investment_value == Decimal('80.00')
     assert snap.total_value == snap.investment_value + snap.cash_balance
+
+
+@pytest.mark.django_db
+def test_convert_amounts_bulk_matches_convert_amount():
+    from datetime import date, timedelta
+    from portfolio.services.currency_service import convert_amount, convert_amounts_bulk
+
+    start = date(2025, 2, 3)
+    for offset in (0, 3, 4):
+        FXRate.objects.create(
+            date=start + timedelta(days=offset),
+            base_currency='PEN',
+            quote_currency='USD',
+            rate=Decimal('3.7') + Decimal(offset) / Decimal('100'),
+            rate_type='mid',
+            session='cierre',
+        )
+    rows = [
+        (Decimal('100.005') * (offset + 1), currency, start + timedelta(days=offset))
+        for offset in range(-1, 7)
+        for currency in ('PEN', 'USD')
+    ]
+
+    for target in ('PEN', 'USD'):
+        expected = [
+            convert_amount(amount, currency, target, snapshot_date=snapshot_date, session='cierre')
+            for amount, currency, snapshot_date in rows
+        ]
+        assert convert_amounts_bulk(rows, target, session='cierre') == expected
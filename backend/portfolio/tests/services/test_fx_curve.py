@@ -0,0 +1,134 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from portfolio.models import FXRate
+from portfolio.services.fx_curve import FXCurve
+from portfolio.services.fx_ingest_service import upsert_latest_from_bcrp
+from portfolio.services.fx_memo import fx_memo_scope
+from portfolio.services.fx_service import (
+    FX_TIER_EXACT,
+    FX_TIER_EXACT_OTHER_SESSION,
+    FX_TIER_MISSING,
+    FX_TIER_PRIOR_SAME_TYPE,
+    get_fx_rate,
+    get_fx_rates_bulk,
+)
+
+RATE_TYPES = ('compra', 'venta', 'mid')
+SESSIONS = ('intraday', 'cierre')
+
+
+def _seed_sparse_rates(start, days, seed=7):
+    rng = random.Random(seed)
+    for offset in range(days):
+        current = start + timedelta(days=offset)
+        for rate_type in RATE_TYPES:
+            for session in SESSIONS:
+                if rng.random() < 0.35:
+                    FXRate.objects.create(
+                        date=current,
+                        base_currency='PEN',
+                        quote_currency='USD',
+                        rate=Decimal(rng.randint(3400000, 3900000)) / Decimal('1000000'),
+                        rate_type=rate_type,
+                        session=session,
+                    )
+
+
+@pytest.mark.django_db
+def test_curve_matches_get_fx_rate_for_every_tier():
+    start = date(2025, 1, 6)
+    _seed_sparse_rates(start, days=20)
+    curve = FXCurve.load('PEN', 'USD')
+
+    for offset in range(-2, 24):
+        current = start + timedelta(days=offset)
+        for rate_type in RATE_TYPES:
+            for session in SESSIONS:
+                expected = get_fx_rate(current, 'PEN', 'USD', rate_type=rate_type, session=session)
+                assert curve.get_rate(current, rate_type=rate_type, session=session) == expected, (
+                    current, rate_type, session,
+                )
+
+
+@pytest.mark.django_db
+def test_curve_reports_resolution_tier():
+    day = date(2025, 3, 10)
+    FXRate.objects.create(date=day, base_currency='PEN', quote_currency='USD', rate=Decimal('3.70'), rate_type='mid', session='intraday')
+    FXRate.objects.create(date=day - timedelta(days=3), base_currency='PEN', quote_currency='USD', rate=Decimal('3.60'), rate_type='mid', session='cierre')
+    curve = FXCurve.load('PEN', 'USD')
+
+    assert curve.resolve(day, rate_type='mid', session='intraday') == (Decimal('3.70'), FX_TIER_EXACT)
+    assert curve.resolve(day, rate_type='mid', session='cierre') == (Decimal('3.70'), FX_TIER_EXACT_OTHER_SESSION)
+    assert curve.resolve(day - timedelta(days=1), rate_type='mid', session='cierre') == (Decimal('3.60'), FX_TIER_PRIOR_SAME_TYPE)
+    assert curve.resolve(day - timedelta(days=10), rate_type='mid', session='cierre') == (None, FX_TIER_MISSING)
+
+
+@pytest.mark.django_db
+def test_curve_missing_rate_matches_strict_and_lenient_lookup():
+    curve = FXCurve.load('PEN', 'USD')
+    today = timezone.now().date()
+
+    assert curve.get_rate(today, rate_type='compra', session='cierre') == Decimal('1')
+    with pytest.raises(ValidationError, match="Missing FX rate"):
+        curve.get_rate(today, rate_type='compra', session='cierre', require_rate=True)
+
+
+@pytest.mark.django_db
+def test_curve_lookups_do_not_query_the_database():
+    _seed_sparse_rates(date(2025, 1, 6), days=10)
+    curve = FXCurve.load('PEN', 'USD')
+
+    with CaptureQueriesContext(connection) as ctx:
+        for offset in range(30):
+            curve.get_rate(date(2025, 1, 1) + timedelta(days=offset), rate_type='mid', session='cierre')
+
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_fx_ingest_clears_memoized_rates(monkeypatch):
+    today = timezone.now().date()
+
+    def fake_resolve(mode, direction):
+        if direction == 'compra':
+            return ('PD04645PD', today, Decimal('3.750'))
+        return ('PD04646PD', today, Decimal('3.800'))
+
+    monkeypatch.setattr('portfolio.services.fx_ingest_service.bcrp.resolve_latest_auto', fake_resolve)
+    with fx_memo_scope('ingest'):
+        assert get_fx_rate(today, 'PEN', 'USD', rate_type='compra', session='cierre') == Decimal('1')
+        upsert_latest_from_bcrp(mode='cierre')
+        assert get_fx_rate(today, 'PEN', 'USD', rate_type='compra', session='cierre') == Decimal('3.750')
+
+
+@pytest.mark.django_db
+def test_bulk_rates_match_get_fx_rate_with_two_queries():
+    start = date(2025, 1, 6)
+    _seed_sparse_rates(start, days=30, seed=11)
+    requested = [start + timedelta(days=offset) for offset in range(12, 40)]
+
+    for rate_type in RATE_TYPES:
+        for session in SESSIONS:
+            with CaptureQueriesContext(connection) as ctx:
+                rates = get_fx_rates_bulk(requested, 'PEN', 'USD', rate_type=rate_type, session=session)
+            assert len(ctx.captured_queries) <= 2
+            assert rates == {
+                current: get_fx_rate(current, 'PEN', 'USD', rate_type=rate_type, session=session)
+                for current in requested
+            }
+
+
+@pytest.mark.django_db
+def test_bulk_rates_honor_require_rate():
+    assert get_fx_rates_bulk([], 'PEN', 'USD') == {}
+    assert get_fx_rates_bulk([date(2025, 1, 6)], 'PEN', 'PEN') == {date(2025, 1, 6): Decimal('1')}
+    with pytest.raises(ValidationError, match="Missing FX rate"):
+        get_fx_rates_bulk([date(2025, 1, 6)], 'PEN', 'USD', require_rate=True)
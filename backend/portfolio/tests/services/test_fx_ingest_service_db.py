@@ -32,3 +32,78 @@ def test_upsert_latest_from_bcrp_persists_compra_venta_mid(monkeypatch):
     assert venta.provider == 'BCRP'
     assert mid.provider == 'BCRP'
 
+
+
+@pytest.mark.django_db
+def test_backfill_from_bcrp_bulk_upserts_range(monkeypatch):
+    from datetime import date
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from portfolio.models import EffectiveFXRate
+    from portfolio.services.fx_ingest_service import backfill_from_bcrp
+
+    history = {
+        'PD04645PD': [('2025-09-22', Decimal('3.750')), ('2025-09-23', Decimal('3.760'))],
+        'PD04646PD': [('2025-09-22', Decimal('3.800')), ('2025-09-23', Decimal('3.810'))],
+        'PD04643PD': [('2025-09-22', Decimal('3.740'))],
+        'PD04644PD': [],
+    }
+    monkeypatch.setattr(
+        'portfolio.services.fx_ingest_service.bcrp.get_range',
+        lambda series, start, end: history[series],
+    )
+    FXRate.objects.create(
+        date=date(2025, 9, 22), base_currency='PEN', quote_currency='USD',
+        rate=Decimal('1.000'), rate_type='compra', session='cierre',
+    )
+
+    with CaptureQueriesContext(connection) as ctx:
+        out = backfill_from_bcrp(date(2025, 9, 22), date(2025, 9, 23), batch_size=3)
+    inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "portfolio_fxrate"')]
+
+    assert out['saved'] == 7
+    assert len(inserts) == 3
+    assert FXRate.objects.count() == 7
+    assert FXRate.objects.get(date=date(2025, 9, 22), rate_type='compra', session='cierre').rate == Decimal('3.750')
+    mid = FXRate.objects.get(date=date(2025, 9, 23), rate_type='mid', session='cierre')
+    assert (mid.rate, mid.source_series) == (Decimal('3.785'), 'PD04645PD+PD04646PD')
+    assert not FXRate.objects.filter(rate_type='mid', session='intraday').exists()
+    assert EffectiveFXRate.objects.get(date=date(2025, 9, 23), rate_type='compra', session='intraday').rate == Decimal('3.760')
+
+
+@pytest.mark.django_db
+def test_backfill_from_bcrp_marks_only_from_changed_cierre(monkeypatch):
+    from datetime import date
+    from portfolio.services.fx_ingest_service import backfill_from_bcrp
+
+    history = {
+        'PD04645PD': [('2025-09-22', Decimal('3.750')), ('2025-09-23', Decimal('3.760'))],
+        'PD04646PD': [('2025-09-22', Decimal('3.800')), ('2025-09-23', Decimal('3.810'))],
+        'PD04643PD': [('2025-09-22', Decimal('3.740'))],
+        'PD04644PD': [('2025-09-22', Decimal('3.790'))],
+    }
+    monkeypatch.setattr(
+        'portfolio.services.fx_ingest_service.bcrp.get_range',
+        lambda series, start, end: history[series],
+    )
+    marks = []
+    monkeypatch.setattr(
+        'portfolio.services.fx_ingest_service.DirtyRangeService.mark_fx_change', marks.append,
+    )
+    backfill_from_bcrp(date(2025, 9, 22), date(2025, 9, 23))
+    assert marks == [date(2025, 9, 22)]
+
+    # Same history again: nothing moved, nothing is marked.
+    out = backfill_from_bcrp(date(2025, 9, 22), date(2025, 9, 23))
+    assert (out['saved'], out['changed']) == (9, 0)
+    assert marks == [date(2025, 9, 22)]
+
+    # An intraday correction behind a stored cierre leaves every closing rate alone.
+    history['PD04643PD'] = [('2025-09-22', Decimal('3.745'))]
+    out = backfill_from_bcrp(date(2025, 9, 22), date(2025, 9, 23))
+    assert out['changed'] == 2
+    assert marks == [date(2025, 9, 22)]
+
+    history['PD04646PD'] = [('2025-09-22', Decimal('3.800')), ('2025-09-23', Decimal('3.820'))]
+    backfill_from_bcrp(date(2025, 9, 22), date(2025, 9, 23))
+    assert marks == [date(2025, 9, 22), date(2025, 9, 23)]
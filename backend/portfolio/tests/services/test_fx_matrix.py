@@ -0,0 +1,131 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import portfolio.services.currency_service as currency_service
+from portfolio.models import FXRate
+from portfolio.services.currency_service import convert_amount, convert_amounts_bulk, convert_with_pen_per_usd_rate
+from portfolio.services.fx_matrix import FXMatrix, get_fx_matrices, get_fx_matrix
+from portfolio.services.fx_memo import fx_memo_scope
+
+
+DAY = date(2025, 6, 2)
+
+
+def _rate(quote, rate, day=DAY, base='PEN'):
+    return FXRate.objects.create(
+        date=day,
+        base_currency=base,
+        quote_currency=quote,
+        rate=Decimal(rate),
+        rate_type='mid',
+        session='cierre',
+    )
+
+
+@pytest.fixture
+def three_currencies(settings, monkeypatch):
+    settings.FX_CURRENCIES = ('PEN', 'USD', 'EUR')
+    monkeypatch.setattr(currency_service, 'SUPPORTED_CURRENCIES', {'PEN', 'USD', 'EUR'})
+
+
+def test_pivot_pairs_keep_single_factor():
+    matrix = FXMatrix(DAY, 'cierre', 'mid', {'PEN': Decimal('1'), 'USD': Decimal('3.75')})
+
+    assert matrix.factors('USD', 'PEN') == (Decimal('3.75'), Decimal('1'))
+    assert matrix.factors('PEN', 'USD') == (Decimal('1'), Decimal('3.75'))
+    assert matrix.convert(Decimal('10'), 'USD', 'USD') == Decimal('10')
+
+
+@pytest.mark.django_db
+def test_pen_usd_conversions_match_direct_rate_math():
+    _rate('USD', '3.751234')
+    amounts = [Decimal('10.00'), Decimal('-0.01'), Decimal('1234.56'), Decimal('0.005')]
+
+    for amount in amounts:
+        for source, target in (('USD', 'PEN'), ('PEN', 'USD')):
+            expected = convert_with_pen_per_usd_rate(amount, source, target, Decimal('3.751234'))
+            assert convert_amount(amount, source, target, snapshot_date=DAY) == expected
+
+    rows = [(amount, 'USD', DAY) for amount in amounts] + [(amount, 'PEN', DAY) for amount in amounts]
+    assert convert_amounts_bulk(rows, 'USD') == [
+        convert_amount(amount, source, 'USD', snapshot_date=DAY) for amount, source, _ in rows
+    ]
+
+
+@pytest.mark.django_db
+def test_third_currency_triangulates_through_pen(three_currencies):
+    _rate('USD', '3.75')
+    _rate('EUR', '4.00')
+
+    assert convert_amount('100', 'EUR', 'USD', snapshot_date=DAY) == Decimal('106.67')
+    assert convert_amount('100', 'USD', 'EUR', snapshot_date=DAY) == Decimal('93.75')
+    assert convert_amounts_bulk(
+        [('100', 'EUR', DAY), ('100', 'USD', DAY), ('100', 'PEN', DAY)], 'EUR'
+    ) == [Decimal('100.00'), Decimal('93.75'), Decimal('25.00')]
+
+
+@pytest.mark.django_db
+def test_stored_cross_pair_beats_triangulation(three_currencies):
+    _rate('USD', '3.75')
+    _rate('EUR', '4.00')
+    _rate('EUR', '1.05', base='USD')
+
+    with fx_memo_scope():
+        matrix = get_fx_matrix(DAY)
+        assert matrix.rate('EUR', 'USD') == Decimal('1.05')
+        assert convert_amount('100', 'EUR', 'USD', snapshot_date=DAY) == Decimal('105.00')
+        assert convert_amount('105', 'USD', 'EUR', snapshot_date=DAY) == Decimal('100.00')
+
+
+@pytest.mark.django_db
+def test_matrix_is_built_once_per_scope():
+    _rate('USD', '3.75')
+
+    with fx_memo_scope():
+        convert_amount('1', 'USD', 'PEN', snapshot_date=DAY)
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(20):
+                convert_amount('1', 'USD', 'PEN', snapshot_date=DAY)
+                convert_amount('1', 'PEN', 'USD', snapshot_date=DAY)
+
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_bulk_matrices_seed_the_scope():
+    _rate('USD', '3.75')
+    _rate('USD', '3.80', day=date(2025, 6, 3))
+
+    with fx_memo_scope():
+        matrices = get_fx_matrices([DAY, date(2025, 6, 3)])
+        with CaptureQueriesContext(connection) as ctx:
+            assert get_fx_matrix(date(2025, 6, 3)) is matrices[date(2025, 6, 3)]
+
+    assert matrices[DAY].rate('USD', 'PEN') == Decimal('3.75')
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_require_rate_only_checks_involved_currencies(three_currencies):
+    _rate('USD', '3.75')
+
+    assert convert_amount('10', 'USD', 'PEN', snapshot_date=DAY, require_rate=True) == Decimal('37.50')
+    with pytest.raises(ValidationError):
+        convert_amount('10', 'EUR', 'PEN', snapshot_date=DAY, require_rate=True)
+
+
+@pytest.mark.django_db
+def test_single_conversion_resolves_only_its_legs(three_currencies, caplog):
+    _rate('USD', '3.75')
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert convert_amount('10', 'USD', 'PEN', snapshot_date=DAY) == Decimal('37.50')
+
+    # EUR has no rate, but converting USD never looks it up.
+    assert 'Missing FX rate' not in caplog.text
+    assert not any("'EUR'" in query['sql'] for query in ctx.captured_queries)
@@ -0,0 +1,118 @@
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from portfolio.middleware import FXMemoMiddleware
+from portfolio.models import FXRate
+from portfolio.services.fx_memo import fx_memo_scope, get_active_fx_memo
+from portfolio.services.fx_service import get_current_fx_context, get_fx_rate
+from portfolio.tasks import fx_ingest_latest_auto
+
+
+@pytest.fixture
+def mid_rate():
+    return FXRate.objects.create(
+        date=date(2025, 5, 2),
+        base_currency='PEN',
+        quote_currency='USD',
+        rate=Decimal('3.70'),
+        rate_type='mid',
+        session='cierre',
+    )
+
+
+@pytest.mark.django_db
+def test_memo_scope_reuses_rates_and_counts_hits(mid_rate):
+    with fx_memo_scope('test') as memo:
+        with CaptureQueriesContext(connection) as ctx:
+            first = get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre')
+            queries_after_first = len(ctx.captured_queries)
+            for _ in range(5):
+                assert get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre') == first
+
+        assert first == Decimal('3.70')
+        assert len(ctx.captured_queries) == queries_after_first
+        assert (memo.hits, memo.misses) == (5, 1)
+
+    assert get_active_fx_memo() is None
+
+
+@pytest.mark.django_db
+def test_memo_is_dropped_at_end_of_scope(mid_rate):
+    with fx_memo_scope():
+        assert get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre') == Decimal('3.70')
+
+    mid_rate.rate = Decimal('3.80')
+    mid_rate.save()
+
+    with fx_memo_scope():
+        assert get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre') == Decimal('3.80')
+
+
+@pytest.mark.django_db
+def test_strict_lookup_failure_is_not_memoized():
+    from django.core.exceptions import ValidationError
+
+    with fx_memo_scope():
+        with pytest.raises(ValidationError):
+            get_fx_rate(date(2025, 5, 2), 'PEN', 'USD', require_rate=True)
+        assert get_fx_rate(date(2025, 5, 2), 'PEN', 'USD') == Decimal('1')
+        with pytest.raises(ValidationError):
+            get_fx_rate(date(2025, 5, 2), 'PEN', 'USD', require_rate=True)
+
+
+def test_current_fx_context_is_fixed_within_scope(monkeypatch):
+    import portfolio.services.fx_service as fx_service
+
+    with fx_memo_scope() as memo:
+        first = get_current_fx_context()
+        monkeypatch.setattr(fx_service, '_get_current_fx_context', lambda now=None: (date(1999, 1, 1), 'cierre'))
+        assert get_current_fx_context() == first
+        assert memo.hits == 1
+
+
+@pytest.mark.django_db
+def test_middleware_scopes_memo_to_request(mid_rate):
+    seen = {}
+
+    def view(request):
+        for _ in range(3):
+            get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre')
+        seen['memo'] = get_active_fx_memo()
+        return HttpResponse('ok')
+
+    response = FXMemoMiddleware(view)(RequestFactory().get('/api/fx-rates/'))
+
+    assert response.status_code == 200
+    assert (seen['memo'].hits, seen['memo'].misses) == (2, 1)
+    assert seen['memo'].label == '/api/fx-rates/'
+    assert get_active_fx_memo() is None
+
+
+@pytest.mark.django_db
+@patch('portfolio.tasks.upsert_latest_from_bcrp')
+def test_celery_task_runs_inside_memo_scope(mock_upsert, mid_rate):
+    seen = {}
+
+    def fake_upsert(mode):
+        for _ in range(2):
+            get_fx_rate(mid_rate.date, 'PEN', 'USD', rate_type='mid', session='cierre')
+        seen['stats'] = get_active_fx_memo().stats()
+        raise RuntimeError('stop after lookups')
+
+    mock_upsert.side_effect = fake_upsert
+
+    with pytest.raises(RuntimeError):
+        fx_ingest_latest_auto.delay(mode='cierre')
+
+    stats = seen['stats']
+
+    assert stats['label'] == 'portfolio.tasks.fx_ingest_latest_auto'
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert get_active_fx_memo() is None
@@ -0,0 +1,161 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from portfolio.models import EffectiveFXRate, FXMetricSeries, FXRate
+from portfolio.services import fx_metrics
+from portfolio.services.fx_memo import fx_memo_scope
+from portfolio.services.fx_metrics import fx_caller
+from portfolio.services.fx_service import get_fx_rate, get_fx_rates_bulk
+from users.tests.factories import UserFactory
+
+
+@pytest.fixture
+def metrics(settings):
+    settings.FX_METRICS_ENABLED = True
+    fx_metrics.reset()
+    yield
+    fx_metrics.reset()
+
+
+@pytest.fixture
+def rate_day():
+    day = date(2025, 5, 2)
+    FXRate.objects.create(
+        date=day, base_currency='PEN', quote_currency='USD',
+        rate=Decimal('3.70'), rate_type='mid', session='cierre',
+    )
+    return day
+
+
+def _by_key(rows):
+    return {(row['caller'], row['source'], row['tier']): row for row in rows}
+
+
+@pytest.mark.django_db
+def test_lookups_are_counted_per_caller_source_and_tier(metrics, rate_day):
+    with fx_caller('snapshot'):
+        get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+        get_fx_rate(rate_day, 'PEN', 'USD', rate_type='compra', session='cierre')
+    EffectiveFXRate.objects.all().delete()
+    with fx_caller('transaction'):
+        get_fx_rate(rate_day + timedelta(days=3), 'PEN', 'USD', rate_type='mid', session='cierre')
+        get_fx_rate(rate_day - timedelta(days=3), 'PEN', 'USD', rate_type='mid', session='cierre')
+
+    rows = _by_key(fx_metrics.snapshot())
+
+    assert rows[('snapshot', 'materialized', 'exact')]['count'] == 1
+    assert rows[('snapshot', 'materialized', 'exact_other_type')]['count'] == 1
+    assert rows[('transaction', 'cascade', 'prior_same_type')]['count'] == 1
+    missing = rows[('transaction', 'cascade', 'missing')]
+    assert missing['count'] == 1
+    assert sum(missing['buckets'].values()) == 1
+
+
+@pytest.mark.django_db
+def test_memo_hits_are_recorded_as_their_own_tier(metrics, rate_day):
+    with fx_memo_scope('snapshot'):
+        for _ in range(3):
+            get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+
+    rows = _by_key(fx_metrics.snapshot())
+
+    assert rows[('snapshot', 'materialized', 'exact')]['count'] == 1
+    assert rows[('snapshot', 'memo', 'memo')]['count'] == 2
+
+
+@pytest.mark.django_db
+def test_metrics_are_stored_where_every_process_reads_them(metrics, rate_day):
+    get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+    fx_metrics.flush()
+
+    row = FXMetricSeries.objects.get(caller='other', source='materialized', tier='exact')
+    assert row.count == 1
+    assert sum(row.buckets) == 1
+
+    get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+    fx_metrics.flush()
+    assert FXMetricSeries.objects.get(pk=row.pk).count == 2
+
+
+@pytest.mark.django_db
+def test_bulk_lookups_are_recorded_as_curve(metrics, rate_day):
+    get_fx_rates_bulk([rate_day, rate_day + timedelta(days=1)], 'PEN', 'USD', rate_type='mid', session='cierre')
+
+    rows = _by_key(fx_metrics.snapshot())
+
+    assert rows[('other', 'curve', 'exact')]['count'] == 1
+    assert rows[('other', 'curve', 'prior_same_type')]['count'] == 1
+
+
+@pytest.mark.django_db
+def test_nothing_is_recorded_when_disabled(settings, rate_day):
+    settings.FX_METRICS_ENABLED = False
+    fx_metrics.reset()
+
+    get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+
+    assert fx_metrics.snapshot() == []
+
+
+@pytest.mark.django_db
+def test_memo_scope_counts_are_recorded_when_disabled(settings, rate_day):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from portfolio.middleware import FXMemoMiddleware
+
+    settings.FX_METRICS_ENABLED = False
+    fx_metrics.reset()
+
+    def view(request):
+        for _ in range(3):
+            get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+        return HttpResponse('ok')
+
+    FXMemoMiddleware(view)(RequestFactory().get('/api/fx-rates/'))
+
+    rows = _by_key(fx_metrics.snapshot())
+    assert set(rows) == {('/api/fx-rates/', 'memo_scope', 'hit'), ('/api/fx-rates/', 'memo_scope', 'miss')}
+    assert rows[('/api/fx-rates/', 'memo_scope', 'hit')]['count'] == 2
+    assert rows[('/api/fx-rates/', 'memo_scope', 'miss')]['count'] == 1
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint_is_admin_only(metrics, rate_day):
+    get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+    client = APIClient()
+
+    client.force_authenticate(user=UserFactory())
+    assert client.get(reverse('fx-metrics')).status_code == status.HTTP_403_FORBIDDEN
+
+    client.force_authenticate(user=UserFactory(is_staff=True))
+    response = client.get(reverse('fx-metrics'))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['enabled'] is True
+    assert response.json()['series'][0]['tier'] == 'exact'
+
+
+@pytest.mark.django_db
+def test_report_command_lists_fallback_heavy_callers_first(metrics, rate_day):
+    EffectiveFXRate.objects.all().delete()
+    with fx_caller('snapshot'):
+        get_fx_rate(rate_day, 'PEN', 'USD', rate_type='mid', session='cierre')
+    with fx_caller('dashboard-portfolio-overview'):
+        get_fx_rate(rate_day + timedelta(days=5), 'PEN', 'USD', rate_type='mid', session='cierre')
+    with fx_memo_scope('dashboard-portfolio-overview') as memo:
+        memo.hits, memo.misses = 4, 1
+        fx_metrics.record_memo_scope(memo)
+
+    out = StringIO()
+    call_command('fx_metrics_report', '--reset', stdout=out)
+    report = out.getvalue()
+
+    assert report.index('dashboard-portfolio-overview: 1 lookups, 1 prior/missing') < report.index('snapshot: 1 lookups, 0 prior/missing')
+    assert 'memo scope: 4 hits, 1 misses' in report
+    assert fx_metrics.snapshot() == []
@@ -0,0 +1,167 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from portfolio.models import DailyPortfolioSnapshot, FXRate, LedgerCheckpoint, Transaction
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.services import SnapshotService
+from portfolio.services.dirty_range_service import DirtyRangeService
+from portfolio.services.ledger_checkpoint_service import LedgerCheckpointService
+from portfolio.tests.factories import PortfolioFactory, TransactionFactory
+from stocks.models import HistoricalStockPrice, Stock
+from stocks.tests.factories import StockFactory
+
+MONTH_END = date(2026, 3, 31)
+DAYS = [date(2026, 3, 27) + timedelta(days=offset) for offset in range(8)]
+
+
+@pytest.fixture
+def ledger_portfolio(portfolio, set_fx_market_now):
+    """A portfolio trading around the 2026-03-31 month-end."""
+    portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+    for rate_type in ('mid', 'venta', 'compra'):
+        FXRate.objects.create(
+            date=DAYS[0],
+            base_currency='PEN',
+            quote_currency='USD',
+            rate=Decimal('3.70'),
+            rate_type=rate_type,
+            session='cierre',
+        )
+    usd_stock = StockFactory(symbol='CKPUSD', current_price=Decimal('20.00'), currency='USD')
+    pen_stock = StockFactory(symbol='CKPPEN', current_price=Decimal('8.00'), currency='PEN')
+    HistoricalStockPrice.objects.create(stock=usd_stock, date=DAYS[2], price=Decimal('21.50'))
+    HistoricalStockPrice.objects.create(stock=pen_stock, date=DAYS[6], price=Decimal('9.10'))
+
+    def at(day):
+        return _at(set_fx_market_now, day)
+
+    TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('10000.00'), timestamp=at(DAYS[0]))
+    TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=usd_stock, quantity=10, timestamp=at(DAYS[1]))
+    TransactionFactory(
+        portfolio=portfolio,
+        transaction_type='CONVERT',
+        amount=Decimal('1000.00'),
+        cash_currency='PEN',
+        counter_currency='USD',
+        timestamp=at(DAYS[3]),
+    )
+    TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=pen_stock, quantity=5, timestamp=at(DAYS[5]))
+    TransactionFactory(portfolio=portfolio, transaction_type='SELL', stock=usd_stock, quantity=4, timestamp=at(DAYS[6]))
+    portfolio.refresh_from_db()
+    return portfolio
+
+
+def _at(set_fx_market_now, day):
+    set_fx_market_now(day)
+    return datetime.combine(day, datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+
+
+def _stored_rows(portfolio):
+    snapshots = [
+        (s.date, s.total_value, s.cash_balance, s.investment_value, s.total_deposits)
+        for s in DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).order_by('date')
+    ]
+    holdings = [
+        (h.date, h.stock_id, h.quantity, h.average_purchase_price, h.total_value)
+        for h in HoldingSnapshot.objects.filter(portfolio=portfolio).order_by('date', 'stock_id')
+    ]
+    return snapshots, holdings
+
+
+@pytest.mark.django_db
+class TestLedgerCheckpointService:
+    def test_range_writes_month_end_checkpoint_and_resumes_from_it(self, ledger_portfolio):
+        for day in DAYS:
+            SnapshotService.create_daily_snapshot(ledger_portfolio, day)
+        expected = _stored_rows(ledger_portfolio)
+        DailyPortfolioSnapshot.objects.filter(portfolio=ledger_portfolio).delete()
+        HoldingSnapshot.objects.filter(portfolio=ledger_portfolio).delete()
+
+        SnapshotService.create_snapshots_for_range(ledger_portfolio, DAYS[0], DAYS[-1])
+        checkpoint = LedgerCheckpoint.objects.get(portfolio=ledger_portfolio)
+        assert checkpoint.date == MONTH_END
+        assert checkpoint.transaction_count == 3
+        assert checkpoint.total_deposits == Decimal('10000.00')
+
+        # Re-running only the days after the checkpoint starts from it.
+        cache.clear()
+        SnapshotService.create_snapshots_for_range(ledger_portfolio, DAYS[5], DAYS[-1])
+        assert _stored_rows(ledger_portfolio) == expected
+
+    def test_reconstruction_starts_from_checkpoint(self, ledger_portfolio):
+        checkpoint = LedgerCheckpointService.build(ledger_portfolio, MONTH_END)
+        day = DAYS[6]
+        cash = SnapshotService._get_historical_cash(ledger_portfolio, day)
+
+        LedgerCheckpoint.objects.filter(pk=checkpoint.pk).update(cash_pen_cents=checkpoint.cash_pen_cents + 10000)
+        cache.clear()
+
+        # Only the checkpoint changed, so a shifted result proves the replay began there.
+        assert SnapshotService._get_historical_cash(ledger_portfolio, day) == cash + Decimal('100.00')
+
+    def test_backdated_transaction_drops_stale_checkpoint(self, ledger_portfolio, set_fx_market_now):
+        usd_stock = Stock.objects.get(symbol='CKPUSD')
+        LedgerCheckpointService.build(ledger_portfolio, MONTH_END)
+        before = SnapshotService._get_historical_holdings(ledger_portfolio, DAYS[6])
+
+        TransactionFactory(
+            portfolio=ledger_portfolio,
+            transaction_type='BUY',
+            stock=usd_stock,
+            quantity=2,
+            timestamp=_at(set_fx_market_now, DAYS[2]),
+        )
+        ledger_portfolio.refresh_from_db()
+
+        after = SnapshotService._get_historical_holdings(ledger_portfolio, DAYS[6])
+        assert after[usd_stock.id]['quantity'] == before[usd_stock.id]['quantity'] + 2
+        assert not LedgerCheckpoint.objects.filter(portfolio=ledger_portfolio).exists()
+
+    def test_amount_edited_in_place_drops_stale_checkpoint(self, ledger_portfolio):
+        LedgerCheckpointService.build(ledger_portfolio, MONTH_END)
+        cash = SnapshotService._get_historical_cash(ledger_portfolio, DAYS[6])
+
+        deposit = Transaction.all_objects.get(portfolio=ledger_portfolio, transaction_type='DEPOSIT')
+        deposit.amount = Decimal('12000.00')
+        deposit.save()
+        ledger_portfolio.refresh_from_db()
+
+        # Same count and highest id: only the content checksum tells the ledger changed.
+        assert LedgerCheckpointService.nearest(ledger_portfolio, MONTH_END) is None
+        assert not LedgerCheckpoint.objects.filter(portfolio=ledger_portfolio).exists()
+        assert SnapshotService._get_historical_cash(ledger_portfolio, DAYS[6]) == cash + Decimal('2000.00')
+
+    def test_cierre_correction_drops_checkpoint_valued_at_the_old_rate(self, ledger_portfolio, set_fx_market_now):
+        deposit = TransactionFactory(
+            portfolio=ledger_portfolio,
+            transaction_type='DEPOSIT',
+            amount=Decimal('100.00'),
+            cash_currency='USD',
+            timestamp=_at(set_fx_market_now, DAYS[1]),
+        )
+        # Written before rates were frozen on transactions: converted at the cierre of its day.
+        Transaction.all_objects.filter(pk=deposit.pk).update(fx_rate=None, fx_rate_type=None)
+        SnapshotService.create_snapshots_for_range(ledger_portfolio, DAYS[0], DAYS[-1])
+        assert LedgerCheckpoint.objects.get(portfolio=ledger_portfolio).total_deposits == Decimal('10370.00')
+        before = DailyPortfolioSnapshot.objects.get(portfolio=ledger_portfolio, date=DAYS[-1])
+
+        mid = FXRate.objects.get(date=DAYS[0], rate_type='mid', session='cierre')
+        mid.rate = Decimal('3.80')
+        mid.save()
+        assert not LedgerCheckpoint.objects.filter(portfolio=ledger_portfolio).exists()
+        DirtyRangeService.recompute()
+
+        after = DailyPortfolioSnapshot.objects.get(portfolio=ledger_portfolio, date=DAYS[-1])
+        assert after.total_deposits == before.total_deposits + Decimal('10.00') == Decimal('10380.00')
+        assert after.cash_balance != before.cash_balance
+        assert LedgerCheckpoint.objects.get(portfolio=ledger_portfolio).total_deposits == Decimal('10380.00')
+
+    def test_ensure_checkpoint_covers_previous_month_end(self, ledger_portfolio):
+        checkpoint = LedgerCheckpointService.ensure_checkpoint(ledger_portfolio, DAYS[-1])
+
+        assert checkpoint.date == MONTH_END
+        assert LedgerCheckpointService.ensure_checkpoint(ledger_portfolio, DAYS[-1]).pk == checkpoint.pk
+        assert LedgerCheckpoint.objects.filter(portfolio=ledger_portfolio).count() == 1
@@ -0,0 +1,56 @@
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+import pytest
+
+from portfolio.services.currency_service import convert_with_pen_per_usd_rate
+from portfolio.services.money import Money, money_sum
+
+
+def _quantize(value):
+    return Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def test_round_trips_through_decimal_with_half_up_rounding():
+    assert Money.from_decimal(Decimal('10.005'), 'USD') == Money(1001, 'USD')
+    assert Money.from_decimal('-10.005', 'USD').to_decimal() == Decimal('-10.01')
+    assert Money.from_decimal(None).to_decimal() == Decimal('0.00')
+    assert str(Money(123456, 'PEN')) == '1234.56'
+
+
+def test_arithmetic_is_exact_and_currency_checked():
+    pen = Money.from_decimal('0.10')
+    assert sum([pen] * 3) == Money(30)
+    assert money_sum([pen] * 3, 'PEN') - pen == Money(20)
+    assert pen * 7 == Money(70)
+    assert pen * Decimal('0.05') == Money(1)
+    assert -pen < pen and abs(-pen) == pen
+
+    with pytest.raises(ValueError):
+        pen + Money(1, 'USD')
+    with pytest.raises(ValueError):
+        money_sum([pen], 'USD')
+
+
+def test_conversion_matches_decimal_path():
+    rng = random.Random(13)
+    for _ in range(2000):
+        amount = Decimal(rng.randint(-10_000_000, 10_000_000)).scaleb(-2)
+        rate = Decimal(rng.randint(3_000_000, 4_500_000)).scaleb(-6)
+        for source, target in (('USD', 'PEN'), ('PEN', 'USD')):
+            expected = convert_with_pen_per_usd_rate(amount, source, target, rate)
+            assert Money.from_decimal(amount, source).convert_pen_usd(target, rate).to_decimal() == expected
+
+
+def test_products_match_quantize():
+    rng = random.Random(7)
+    for _ in range(2000):
+        amount = Decimal(rng.randint(-1_000_000, 1_000_000)).scaleb(-2)
+        factor = Decimal(rng.randint(1, 10_000_000)).scaleb(-7)
+        assert (Money.from_decimal(amount) * factor).to_decimal() == _quantize(amount * factor)
+    assert Money.from_decimal('1.00', 'USD').convert('PEN', Decimal('3.1234567')).to_decimal() == Decimal('3.12')
+
+
+def test_uses_slots():
+    with pytest.raises(AttributeError):
+        Money(1).extra = 1
@@ -0,0 +1,68 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from portfolio.services import money_kernel
+from portfolio.services.currency_service import convert_with_pen_per_usd_rate, convert_with_pen_per_usd_rates
+
+
+def _random_amount(rng):
+    kind = rng.random()
+    if kind < 0.05:
+        return rng.choice([Decimal('0.00'), Decimal('-0.00'), Decimal('0'), None])
+    if kind < 0.15:
+        # sub-cent precision goes through the scalar fallback
+        return Decimal(rng.randint(-10 ** 9, 10 ** 9)) / Decimal('10000')
+    if kind < 0.2:
+        return Decimal(rng.randint(-10 ** 18, 10 ** 18)) / Decimal('100')
+    return Decimal(rng.randint(-10 ** 11, 10 ** 11)) / Decimal('100')
+
+
+def test_batch_conversion_is_bit_exact_with_scalar():
+    rng = random.Random(42)
+    amounts, currencies, rates = [], [], []
+    for _ in range(20000):
+        amounts.append(_random_amount(rng))
+        currencies.append(rng.choice(['PEN', 'USD']))
+        rates.append(Decimal(rng.randint(2_500_000, 4_500_000)) / Decimal('1000000'))
+
+    for to_currency in ('PEN', 'USD'):
+        batch = convert_with_pen_per_usd_rates(amounts, currencies, to_currency, rates)
+        scalar = [
+            convert_with_pen_per_usd_rate(amount, currency, to_currency, rate)
+            for amount, currency, rate in zip(amounts, currencies, rates)
+        ]
+        assert [str(value) for value in batch] == [str(value) for value in scalar]
+
+
+@pytest.mark.parametrize('amount,rate,to_currency', [
+    (Decimal('0.01'), Decimal('0.500000'), 'PEN'),     # 0.005 -> 0.01
+    (Decimal('-0.01'), Decimal('0.500000'), 'PEN'),    # -0.005 -> -0.01
+    (Decimal('0.01'), Decimal('2.000000'), 'USD'),     # 0.005 -> 0.01
+    (Decimal('-0.01'), Decimal('4.000000'), 'USD'),    # -0.0025 -> -0.00
+    (Decimal('100.00'), Decimal('3.333333'), 'USD'),
+    (Decimal('12.34'), Decimal('1'), 'PEN'),
+])
+def test_half_up_ties_and_signed_zero(amount, rate, to_currency):
+    from_currency = 'USD' if to_currency == 'PEN' else 'PEN'
+    [batch] = convert_with_pen_per_usd_rates([amount], [from_currency], to_currency, [rate])
+
+    assert str(batch) == str(convert_with_pen_per_usd_rate(amount, from_currency, to_currency, rate))
+
+
+def test_kernel_operates_on_int64_cents():
+    result = money_kernel.convert_cents(
+        np.array([1000, 1000, -1001], dtype=np.int64),
+        np.array([3_750_000, 3_750_000, 3_750_000], dtype=np.int64),
+        np.array([money_kernel.DIRECTION_KEEP, money_kernel.DIRECTION_MULTIPLY, money_kernel.DIRECTION_DIVIDE]),
+    )
+
+    assert result.dtype == np.int64
+    assert result.tolist() == [1000, 3750, -267]
+
+
+def test_batch_rejects_non_positive_rate():
+    with pytest.raises(ValueError, match='must be positive'):
+        convert_with_pen_per_usd_rates([Decimal('1.00')], ['USD'], 'PEN', [Decimal('0')])
@@ -4,11 +4,13 @@ from decimal import Decimal
 from django.core.cache import cache
 from django.utils import timezone
 from portfolio.models import FXRate
+from portfolio.models.holding_snapshot import HoldingSnapshot
 from portfolio.services import SnapshotService
 from portfolio.models import DailyPortfolioSnapshot, Transaction
 from portfolio.tests.factories import PortfolioFactory, TransactionFactory
+from stocks.models import HistoricalStockPrice
 from stocks.tests.factories import StockFactory
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as datetime_timezone
 
 @pytest.mark.django_db
 class TestSnapshotService:
@@ -106,3 +108,251 @@ class TestSnapshotService:
         historical_cash = SnapshotService._get_historical_cash(portfolio, snapshot_day)
 
         assert historical_cash == Decimal('400.00')
+
+    def test_range_snapshots_match_daily_snapshots(self, portfolio, set_fx_market_now):
+        cache.clear()
+        portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+        days = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(10)]
+
+        for day, rate in ((days[0], '3.70'), (days[4], '3.80')):
+            for rate_type in ('mid', 'venta', 'compra'):
+                FXRate.objects.create(
+                    date=day,
+                    base_currency='PEN',
+                    quote_currency='USD',
+                    rate=Decimal(rate),
+                    rate_type=rate_type,
+                    session='cierre',
+                )
+
+        usd_stock = StockFactory(symbol='RNGUSD', current_price=Decimal('20.00'), currency='USD')
+        pen_stock = StockFactory(symbol='RNGPEN', current_price=Decimal('8.00'), currency='PEN')
+        HistoricalStockPrice.objects.create(stock=usd_stock, date=days[2], price=Decimal('21.50'))
+        HistoricalStockPrice.objects.create(stock=usd_stock, date=days[7], price=Decimal('19.25'))
+        HistoricalStockPrice.objects.create(stock=pen_stock, date=days[9], price=Decimal('9.10'))
+
+        def at(day):
+            set_fx_market_now(day)
+            return datetime.combine(day, datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('10000.00'), timestamp=at(days[0]))
+        TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=usd_stock, quantity=10, timestamp=at(days[1]))
+        TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=pen_stock, quantity=5, timestamp=at(days[1]))
+        TransactionFactory(
+            portfolio=portfolio,
+            transaction_type='CONVERT',
+            amount=Decimal('1000.00'),
+            cash_currency='PEN',
+            counter_currency='USD',
+            timestamp=at(days[3]),
+        )
+        TransactionFactory(portfolio=portfolio, transaction_type='SELL', stock=usd_stock, quantity=4, timestamp=at(days[5]))
+        TransactionFactory(portfolio=portfolio, transaction_type='WITHDRAWAL', amount=Decimal('500.00'), timestamp=at(days[6]))
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('200.00'), timestamp=at(days[8]))
+
+        def stored_rows():
+            snapshots = [
+                (s.date, s.total_value, s.cash_balance, s.investment_value, s.total_deposits)
+                for s in DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).order_by('date')
+            ]
+            holdings = [
+                (h.date, h.stock_id, h.quantity, h.average_purchase_price, h.total_value)
+                for h in HoldingSnapshot.objects.filter(portfolio=portfolio).order_by('date', 'stock_id')
+            ]
+            return snapshots, holdings
+
+        for day in days:
+            SnapshotService.create_daily_snapshot(portfolio, day)
+        expected = stored_rows()
+
+        DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).delete()
+        HoldingSnapshot.objects.filter(portfolio=portfolio).delete()
+        snapshots = SnapshotService.create_snapshots_for_range(portfolio, days[0], days[-1])
+
+        assert [snapshot.date for snapshot in snapshots] == days
+        assert stored_rows() == expected
+        assert len(expected[1]) == 18
+
+    def test_historical_holdings_cache_hit_costs_no_queries(self, portfolio, django_assert_num_queries):
+        stock = StockFactory(symbol='HITS1', current_price=Decimal('10.00'), currency='PEN')
+        buy = TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=2)
+        snapshot_date = buy.timestamp.date()
+
+        holdings = SnapshotService._get_historical_holdings(portfolio, snapshot_date)
+
+        with django_assert_num_queries(0):
+            assert SnapshotService._get_historical_holdings(portfolio, snapshot_date) == holdings
+
+    def test_back_dated_transaction_invalidates_cached_holdings_for_later_dates(self, portfolio):
+        stock_a = StockFactory(symbol='BACK1', current_price=Decimal('10.00'), currency='PEN')
+        stock_b = StockFactory(symbol='BACK2', current_price=Decimal('5.00'), currency='PEN')
+        first_buy = TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock_a, quantity=1)
+        today = first_buy.timestamp.date()
+        yesterday = today - timedelta(days=1)
+
+        assert set(SnapshotService._get_historical_holdings(portfolio, today)) == {stock_a.id}
+        assert SnapshotService._get_historical_holdings(portfolio, yesterday) == {}
+
+        TransactionFactory(
+            portfolio=portfolio,
+            transaction_type='BUY',
+            stock=stock_b,
+            quantity=1,
+            timestamp=first_buy.timestamp - timedelta(days=1),
+        )
+
+        assert set(SnapshotService._get_historical_holdings(portfolio, today)) == {stock_a.id, stock_b.id}
+        assert set(SnapshotService._get_historical_holdings(portfolio, yesterday)) == {stock_b.id}
+
+    def test_full_save_of_a_stale_portfolio_keeps_the_ledger_version(self, portfolio):
+        stale = type(portfolio).objects.get(pk=portfolio.pk)
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('10.00'))
+
+        stale.name = 'Renamed'
+        stale.save()
+
+        stale.refresh_from_db()
+        assert stale.name == 'Renamed'
+        assert stale.ledger_version == portfolio.ledger_version > 0
+
+    def test_new_eod_prices_revalue_stored_snapshots_in_place(self, portfolio, set_fx_market_now):
+        from stocks.tasks import save_eod_prices
+
+        portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+        days = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(4)]
+        for rate_type in ('mid', 'venta', 'compra'):
+            FXRate.objects.create(
+                date=days[0],
+                base_currency='PEN',
+                quote_currency='USD',
+                rate=Decimal('3.70'),
+                rate_type=rate_type,
+                session='cierre',
+            )
+        usd_stock = StockFactory(symbol='EODUSD', current_price=Decimal('20.00'), currency='USD')
+        pen_stock = StockFactory(symbol='EODPEN', current_price=Decimal('8.00'), currency='PEN')
+        HistoricalStockPrice.objects.create(stock=usd_stock, date=days[0], price=Decimal('20.00'))
+        HistoricalStockPrice.objects.create(stock=usd_stock, date=days[3], price=Decimal('22.00'))
+        HistoricalStockPrice.objects.create(stock=pen_stock, date=days[0], price=Decimal('8.00'))
+
+        set_fx_market_now(days[0])
+        timestamp = datetime.combine(days[0], datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('5000.00'), timestamp=timestamp)
+        TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=usd_stock, quantity=10, timestamp=timestamp)
+        TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=pen_stock, quantity=5, timestamp=timestamp)
+        for day in days[1:]:
+            SnapshotService.create_daily_snapshot(portfolio, day)
+
+        def stored():
+            return [
+                (s.date, s.total_value, s.investment_value)
+                for s in DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).order_by('date')
+            ], [
+                (h.date, h.stock_id, h.total_value)
+                for h in HoldingSnapshot.objects.filter(portfolio=portfolio).order_by('date', 'stock_id')
+            ]
+
+        before = stored()
+        written = save_eod_prices({
+            (usd_stock.id, days[1]): Decimal('21.50'),
+            (pen_stock.id, days[0]): Decimal('8.00'),
+        })
+        assert written == [(usd_stock.id, days[1])]
+        revalued = stored()
+
+        # The new price covers days[1] and days[2]; days[3] has its own price.
+        assert revalued[0][2] == before[0][2]
+        assert revalued[0][0][2] - before[0][0][2] == Decimal('55.50')
+        for day in days[1:]:
+            SnapshotService.create_daily_snapshot(portfolio, day)
+        assert stored() == revalued
+
+    def test_first_eod_price_revalues_earlier_fallback_rows(self, portfolio, set_fx_market_now):
+        from portfolio.models import SnapshotDirtyRange
+        from stocks.tasks import save_eod_prices
+
+        portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+        days = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(3)]
+        stock = StockFactory(symbol='EODNEW', current_price=Decimal('12.00'), currency='PEN')
+        set_fx_market_now(days[0])
+        timestamp = datetime.combine(days[0], datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('1000.00'), timestamp=timestamp)
+        TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=4, timestamp=timestamp)
+        for day in days:
+            SnapshotService.create_daily_snapshot(portfolio, day)
+        # Rows valued before the stock had any history, at its current price.
+        HoldingSnapshot.objects.filter(portfolio=portfolio).update(price_source='current_price_fallback')
+        before = dict(DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).values_list('date', 'investment_value'))
+        assert set(before.values()) == {Decimal('48.00')}
+
+        save_eod_prices({(stock.id, days[2]): Decimal('15.00')})
+
+        holdings = dict(HoldingSnapshot.objects.filter(portfolio=portfolio).values_list('date', 'price_source'))
+        assert holdings == {days[0]: 'nearest_historical', days[1]: 'nearest_historical', days[2]: 'exact_date'}
+        assert set(
+            DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).values_list('investment_value', flat=True)
+        ) == {Decimal('60.00')}
+        # Revalued in place; nothing left for the dirty-range worker to redo.
+        assert not SnapshotDirtyRange.objects.exists()
+
+    def test_fallback_priced_rows_are_repriced_once_history_arrives(self, portfolio, set_fx_market_now):
+        from django.core.management import call_command
+
+        portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+        days = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(3)]
+        stock = StockFactory(symbol='FALL1', current_price=Decimal('12.00'), currency='PEN')
+        set_fx_market_now(days[0])
+        timestamp = datetime.combine(days[0], datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+        TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('1000.00'), timestamp=timestamp)
+        buy = TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=4, timestamp=timestamp)
+        for day in days:
+            SnapshotService.create_daily_snapshot(portfolio, day)
+
+        holding = HoldingSnapshot.objects.get(portfolio=portfolio, date=days[1])
+        assert (holding.price, holding.price_source, holding.fx_rate) == (buy.executed_price, 'portfolio_acquisition', Decimal('1'))
+
+        HistoricalStockPrice.objects.create(stock=stock, date=days[1], price=Decimal('15.00'))
+        call_command('reprice_fallback_snapshots', '--batch-size', '1')
+
+        sources = dict(HoldingSnapshot.objects.filter(portfolio=portfolio).values_list('date', 'price_source'))
+        assert sources == {days[0]: 'portfolio_acquisition', days[1]: 'exact_date', days[2]: 'latest_historical'}
+        repriced = DailyPortfolioSnapshot.objects.get(portfolio=portfolio, date=days[2])
+        assert repriced.investment_value == Decimal('60.00')
+        assert repriced.total_value == repriced.cash_balance + Decimal('60.00')
+
+    def test_regenerate_snapshots_dry_run_and_resume(self, portfolio):
+        from io import StringIO
+        from django.core.management import call_command
+
+        later = PortfolioFactory(user=portfolio.user, is_default=False)
+
+        out = StringIO()
+        call_command('regenerate_snapshots', '--days', '2', '--dry-run', stdout=out)
+        assert 'Dry run:' in out.getvalue()
+        assert not DailyPortfolioSnapshot.objects.exists()
+
+        out = StringIO()
+        call_command('regenerate_snapshots', '--days', '2', '--after-id', str(portfolio.id), stdout=out)
+        assert set(DailyPortfolioSnapshot.objects.values_list('portfolio_id', flat=True)) == {later.id}
+        assert f'[1/1] Portfolio {later.id}: 3 snapshots' in out.getvalue()
+        assert 'snapshots/s' in out.getvalue()
+
+    def test_snapshot_valuation_takes_no_portfolio_lock(self, portfolio, monkeypatch):
+        from django.db.models.query import QuerySet
+        from portfolio.models import Portfolio
+
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def spy(queryset, *args, **kwargs):
+            locked.append(queryset.model)
+            return select_for_update(queryset, *args, **kwargs)
+
+        monkeypatch.setattr(QuerySet, 'select_for_update', spy)
+        today = timezone.now().date()
+        SnapshotService.create_daily_snapshot(portfolio, today)
+        SnapshotService.create_snapshots_for_range(portfolio, today - timedelta(days=2), today)
+        SnapshotService.create_daily_snapshot(portfolio, today)
+
+        assert Portfolio not in locked
+        assert DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count() == 3
@@ -0,0 +1,79 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone as datetime_timezone
+from decimal import Decimal
+
+from portfolio.models import DailyPortfolioSnapshot, SnapshotDirtyRange, SnapshotSeries
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.services import SnapshotService, snapshot_store
+from portfolio.services.dirty_range_service import DirtyRangeService
+from portfolio.tests.factories import PortfolioFactory, TransactionFactory
+from stocks.models import HistoricalStockPrice
+from stocks.tests.factories import StockFactory
+
+DAYS = [date(2026, 3, 2) + timedelta(days=offset) for offset in range(15)]
+
+
+def _at(day):
+    return datetime.combine(day, datetime.min.time(), tzinfo=datetime_timezone.utc) + timedelta(hours=15)
+
+
+@pytest.fixture
+def traded(portfolio, set_fx_market_now):
+    """A portfolio that buys 10 PEN shares on DAYS[0], 5 more on DAYS[5] and sells all on DAYS[10]."""
+    portfolio = PortfolioFactory(user=portfolio.user, is_default=False)
+    stock = StockFactory(symbol='RLE1', current_price=Decimal('10.00'), currency='PEN')
+    HistoricalStockPrice.objects.create(stock=stock, date=DAYS[0], price=Decimal('10.00'))
+
+    set_fx_market_now(DAYS[0])
+    TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('1000.00'), timestamp=_at(DAYS[0]))
+    TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=10, timestamp=_at(DAYS[0]))
+    TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=5, timestamp=_at(DAYS[5]))
+    TransactionFactory(portfolio=portfolio, transaction_type='SELL', stock=stock, quantity=15, timestamp=_at(DAYS[10]))
+    portfolio.refresh_from_db()
+    return portfolio, stock
+
+
+def _rows(snapshots):
+    return [
+        (s.date, s.total_value, s.cash_balance, s.investment_value, s.total_deposits)
+        for s in snapshots
+    ]
+
+
+@pytest.mark.django_db
+class TestSnapshotStore:
+    def test_rle_storage_reads_back_the_same_days(self, traded, settings):
+        portfolio, _ = traded
+        daily = _rows(SnapshotService.create_snapshots_for_range(portfolio, DAYS[0], DAYS[-1]))
+        assert HoldingSnapshot.objects.filter(portfolio=portfolio).count() == 10
+
+        settings.SNAPSHOT_STORAGE = 'rle'
+        SnapshotService.create_snapshots_for_range(portfolio, DAYS[0], DAYS[-1])
+
+        assert not DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).exists()
+        series = SnapshotSeries.objects.get(portfolio=portfolio)
+        assert [run[:2] for run in series.runs] == [[1, 5], [6, 5], [11, 5]]
+        assert _rows(snapshot_store.daily_snapshots(portfolio)) == daily
+        assert _rows(snapshot_store.daily_snapshots(portfolio, DAYS[3], DAYS[7])) == daily[3:8]
+        assert snapshot_store.latest_snapshot(portfolio, before=DAYS[4]).date == DAYS[3]
+        assert snapshot_store.snapshot_bounds(portfolio) == (DAYS[0], DAYS[-1])
+
+        # Holding rows only where the position opens, changes or closes.
+        assert list(
+            HoldingSnapshot.objects.filter(portfolio=portfolio).order_by('date').values_list('date', 'quantity')
+        ) == [(DAYS[0], 10), (DAYS[5], 15), (DAYS[10], 0)]
+
+    def test_late_price_in_rle_storage_recomputes_the_series(self, traded, settings):
+        portfolio, stock = traded
+        settings.SNAPSHOT_STORAGE = 'rle'
+        SnapshotService.create_snapshots_for_range(portfolio, DAYS[0], DAYS[-1])
+
+        HistoricalStockPrice.objects.create(stock=stock, date=DAYS[3], price=Decimal('12.50'))
+        assert SnapshotDirtyRange.objects.get(portfolio=portfolio).from_date == DAYS[3]
+        DirtyRangeService.recompute()
+
+        investment = {s.date: s.investment_value for s in snapshot_store.daily_snapshots(portfolio)}
+        assert investment[DAYS[2]] == Decimal('100.00')
+        assert investment[DAYS[3]] == Decimal('125.00')
+        assert investment[DAYS[5]] == Decimal('187.50')
+        assert investment[DAYS[10]] == Decimal('0.00')
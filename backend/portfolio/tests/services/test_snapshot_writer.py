@@ -0,0 +1,84 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from portfolio.models import DailyPortfolioSnapshot
+from portfolio.models.holding_snapshot import HoldingSnapshot
+from portfolio.services.snapshot_writer import SnapshotWriter
+from portfolio.tests.factories import PortfolioFactory
+from stocks.tests.factories import StockFactory
+
+
+DAY = date(2025, 6, 2)
+
+
+def _values(total):
+    return {
+        'total_value': Decimal(total),
+        'cash_balance': Decimal(total),
+        'investment_value': Decimal('0.00'),
+        'total_deposits': Decimal(total),
+    }
+
+
+def _holding(portfolio, stock, day, quantity):
+    return HoldingSnapshot(
+        portfolio=portfolio,
+        stock=stock,
+        date=day,
+        quantity=quantity,
+        average_purchase_price=Decimal('10.00'),
+        total_value=Decimal('10.00') * quantity,
+    )
+
+
+@pytest.mark.django_db
+def test_rewriting_a_day_updates_values_and_drops_closed_positions(portfolio):
+    kept = StockFactory(symbol='WKEEP')
+    closed = StockFactory(symbol='WSOLD')
+
+    with SnapshotWriter() as writer:
+        writer.add(portfolio, DAY, _values('100.00'), [_holding(portfolio, kept, DAY, 1), _holding(portfolio, closed, DAY, 2)])
+
+    with SnapshotWriter() as writer:
+        writer.add(portfolio, DAY, _values('250.00'), [_holding(portfolio, kept, DAY, 3)])
+
+    snapshot = DailyPortfolioSnapshot.objects.get(portfolio=portfolio, date=DAY)
+    assert snapshot.total_value == Decimal('250.00')
+    assert list(HoldingSnapshot.objects.filter(portfolio=portfolio).values_list('stock_id', 'quantity')) == [(kept.id, 3)]
+
+
+@pytest.mark.django_db
+def test_days_are_written_in_chunks_with_a_fixed_number_of_statements(portfolio):
+    other = PortfolioFactory(user=portfolio.user, is_default=False)
+    stock = StockFactory(symbol='WCHNK')
+    days = [DAY + timedelta(days=offset) for offset in range(30)]
+
+    writer = SnapshotWriter(batch_size=100)
+    for owner in (portfolio, other):
+        for day in days:
+            writer.add(owner, day, _values('10.00'), [_holding(owner, stock, day, 1)])
+
+    with CaptureQueriesContext(connection) as queries:
+        assert writer.flush() == 60
+
+    # One chunk: daily upsert, one holding delete per portfolio and holding upsert,
+    # plus the savepoint pair wrapping the chunk.
+    writes = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+    assert len(writes) <= 6
+    assert DailyPortfolioSnapshot.objects.filter(portfolio__in=[portfolio, other]).count() == 60
+    assert HoldingSnapshot.objects.filter(portfolio__in=[portfolio, other]).count() == 60
+
+
+@pytest.mark.django_db
+def test_full_batches_flush_as_they_fill(portfolio):
+    writer = SnapshotWriter(batch_size=2)
+    for offset in range(5):
+        writer.add(portfolio, DAY + timedelta(days=offset), _values('1.00'), [])
+
+    assert DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count() == 4
+    writer.flush()
+    assert writer.written == 5
@@ -0,0 +1,117 @@
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from portfolio.models import FXRate, Transaction
+from portfolio.services.currency_service import get_transaction_amount_in_currency
+from portfolio.services.transaction_fx_service import backfill_transaction_fx_rates
+from portfolio.tests.factories import TransactionFactory
+from stocks.models import Stock
+
+
+DAY = date(2025, 6, 2)
+
+
+def _rate(rate_type, rate, day=DAY):
+    FXRate.objects.create(
+        date=day, base_currency='PEN', quote_currency='USD', rate=Decimal(rate), rate_type=rate_type, session='cierre'
+    )
+
+
+def _legacy(transaction, day=DAY):
+    """Strip the frozen rate the way rows written before fx_rate existed look."""
+    Transaction.all_objects.filter(pk=transaction.pk).update(
+        fx_rate=None,
+        fx_rate_type=None,
+        timestamp=datetime(day.year, day.month, day.day, 20, 0, tzinfo=dt_timezone.utc),
+    )
+
+
+@pytest.fixture
+def legacy_ledger(portfolio, set_fx_market_now):
+    opening = Transaction.all_objects.get(portfolio=portfolio)
+    set_fx_market_now(DAY)
+    _rate('mid', '3.70')
+    _rate('compra', '3.65')
+    _rate('venta', '3.75')
+    stock = Stock.objects.create(symbol='LEG', name='Legacy', currency='USD', current_price=Decimal('10.00'))
+
+    deposit = TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('1000.00'))
+    buy = TransactionFactory(portfolio=portfolio, transaction_type='BUY', stock=stock, quantity=2)
+    convert = TransactionFactory(
+        portfolio=portfolio, transaction_type='CONVERT', amount=Decimal('100.00'), cash_currency='PEN', counter_currency='USD'
+    )
+    for transaction in (opening, deposit, buy, convert):
+        _legacy(transaction)
+    return {'opening': opening, 'deposit': deposit, 'buy': buy, 'convert': convert}
+
+
+@pytest.mark.django_db
+def test_backfill_stamps_the_rate_each_handler_applies(legacy_ledger):
+    result = backfill_transaction_fx_rates(batch_size=2)
+
+    assert (result['scanned'], result['stamped'], result['unresolved']) == (4, 4, 0)
+    stamped = {
+        name: Transaction.all_objects.values_list('fx_rate', 'fx_rate_type').get(pk=transaction.pk)
+        for name, transaction in legacy_ledger.items()
+    }
+    assert stamped == {
+        'opening': (Decimal('3.700000'), 'mid'),
+        'deposit': (Decimal('3.700000'), 'mid'),
+        'buy': (Decimal('3.750000'), 'venta'),
+        'convert': (Decimal('3.750000'), 'venta'),
+    }
+    assert backfill_transaction_fx_rates()['scanned'] == 0
+
+
+@pytest.mark.django_db
+def test_dates_without_fx_data_are_left_for_a_later_run(legacy_ledger):
+    _legacy(legacy_ledger['deposit'], day=date(2020, 1, 2))
+
+    result = backfill_transaction_fx_rates()
+
+    assert (result['stamped'], result['unresolved']) == (3, 1)
+    assert Transaction.all_objects.get(pk=legacy_ledger['deposit'].pk).fx_rate is None
+
+
+@pytest.mark.django_db
+def test_command_resumes_after_id(legacy_ledger):
+    first_id = min(transaction.pk for transaction in legacy_ledger.values())
+
+    call_command('backfill_transaction_fx', '--after-id', str(first_id), '--batch-size', '1')
+
+    assert list(Transaction.all_objects.filter(fx_rate__isnull=True).values_list('pk', flat=True)) == [first_id]
+
+
+@pytest.mark.django_db
+def test_stamped_transactions_convert_without_queries(legacy_ledger):
+    backfill_transaction_fx_rates()
+    deposit = Transaction.all_objects.get(pk=legacy_ledger['deposit'].pk)
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert get_transaction_amount_in_currency(deposit, 'USD') == Decimal('270.27')
+
+    assert len(ctx.captured_queries) == 0
+
+
+@pytest.mark.django_db
+def test_transactions_without_fx_leg_freeze_only_their_days_cierre_mid(portfolio, set_fx_market_now):
+    # Before the day's cierre only the prior day's close and an intraday quote exist.
+    set_fx_market_now(DAY, hour=15)
+    _rate('mid', '3.60', day=date(2025, 5, 30))
+    FXRate.objects.create(
+        date=DAY, base_currency='PEN', quote_currency='USD', rate=Decimal('3.65'), rate_type='mid', session='intraday'
+    )
+    early = TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('100.00'))
+    assert (early.fx_rate, early.fx_rate_type) == (None, None)
+
+    _rate('mid', '3.70')
+    late = TransactionFactory(portfolio=portfolio, transaction_type='DEPOSIT', amount=Decimal('100.00'))
+    assert (late.fx_rate, late.fx_rate_type) == (Decimal('3.70'), 'mid')
+
+    assert backfill_transaction_fx_rates()['stamped'] >= 1
+    assert Transaction.all_objects.get(pk=early.pk).fx_rate == Decimal('3.700000')
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch
 
-from portfolio.tasks import fx_ingest_latest_auto
+from portfolio.tasks import fx_backfill_range, fx_ingest_latest_auto
 
 
 @pytest.mark.django_db
@@ -22,3 +22,12 @@ class TestFxIngestTask:
 
         with pytest.raises(RuntimeError, match='provider unavailable'):
             fx_ingest_latest_auto.delay(mode='auto')
+
+
+@pytest.mark.django_db
+@patch('portfolio.tasks.backfill_from_bcrp')
+def test_backfill_task_passes_range_to_service(mock_backfill):
+    mock_backfill.return_value = {'saved': 3}
+
+    assert fx_backfill_range('2025-01-01', '2025-01-31') == {'saved': 3}
+    mock_backfill.assert_called_once_with('2025-01-01', '2025-01-31')
@@ -1,4 +1,5 @@
 import pytest
+from datetime import date
 from unittest.mock import patch
 from portfolio.tasks import create_daily_snapshots
 from portfolio.models import DailyPortfolioSnapshot
@@ -19,4 +20,142 @@ class TestSnapshotTasks:
         user = UserFactory()
         
         create_daily_snapshots()
-        assert DailyPortfolioSnapshot.objects.count() == 1
\ No newline at end of file
+        assert DailyPortfolioSnapshot.objects.count() == 1
+
+def test_snapshot_chunks_have_a_fixed_size():
+    from portfolio.tasks import _snapshot_chunks
+
+    assert _snapshot_chunks(list(range(10)), 3) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert _snapshot_chunks(list(range(1000)), 50) == [list(range(start, start + 50)) for start in range(0, 1000, 50)]
+    assert _snapshot_chunks([], 3) == []
+
+
+@pytest.mark.django_db
+class TestSnapshotFanOut:
+    def test_coordinator_fans_out_one_chunk_per_portfolio_group(self, settings):
+        from portfolio.tasks import create_daily_snapshots
+
+        settings.SNAPSHOT_CHUNK_SIZE = 1
+        Portfolio.objects.all().delete()
+        UserFactory.create_batch(3)
+
+        dispatched = create_daily_snapshots('2025-06-02')
+
+        assert dispatched == {'date': '2025-06-02', 'chunks': 3, 'portfolios': 3}
+        assert set(DailyPortfolioSnapshot.objects.values_list('date', flat=True)) == {date(2025, 6, 2)}
+        assert DailyPortfolioSnapshot.objects.count() == 3
+
+    def test_chunk_isolates_failing_portfolios(self):
+        from portfolio.services import SnapshotService
+        from portfolio.tasks import create_daily_snapshots_chunk
+
+        Portfolio.objects.all().delete()
+        users = UserFactory.create_batch(3)
+        broken = users[1].portfolios.get(is_default=True)
+        real_snapshot = SnapshotService.create_daily_snapshot
+
+        def snapshot(portfolio, snapshot_date=None, writer=None):
+            if portfolio.id == broken.id:
+                raise ValueError('price feed exploded')
+            return real_snapshot(portfolio, snapshot_date, writer=writer)
+
+        with patch.object(SnapshotService, 'create_daily_snapshot', side_effect=snapshot):
+            result = create_daily_snapshots_chunk(
+                list(Portfolio.objects.values_list('id', flat=True)), '2025-06-02'
+            )
+
+        assert result['portfolios'] == 3
+        assert result['succeeded'] == 2
+        assert result['failed'] == [broken.id]
+        assert DailyPortfolioSnapshot.objects.count() == 2
+
+    def test_chunk_out_of_database_retries_reports_failure(self):
+        from django.db import OperationalError
+        from portfolio.services import SnapshotService
+        from portfolio.tasks import create_daily_snapshots_chunk
+
+        UserFactory.create_batch(2)
+        portfolio_ids = list(Portfolio.objects.order_by('id').values_list('id', flat=True))
+        with patch.object(SnapshotService, 'create_daily_snapshot', side_effect=OperationalError('db gone')) as snapshot:
+            # The last allowed attempt.
+            result = create_daily_snapshots_chunk.apply(
+                args=[portfolio_ids, '2025-06-02'], retries=create_daily_snapshots_chunk.max_retries
+            ).get()
+
+        assert snapshot.call_count == 1
+        assert result['succeeded'] == 0
+        assert result['failed'] == portfolio_ids
+        assert result['error'] == 'db gone'
+
+    def test_chunk_database_error_drops_queued_days(self):
+        from django.db import OperationalError
+        from portfolio.services import SnapshotService
+        from portfolio.services.snapshot_writer import SnapshotWriter
+        from portfolio.tasks import create_daily_snapshots_chunk
+
+        Portfolio.objects.all().delete()
+        UserFactory.create_batch(2)
+        portfolio_ids = list(Portfolio.objects.order_by('id').values_list('id', flat=True))
+        real_snapshot = SnapshotService.create_daily_snapshot
+
+        def snapshot(portfolio, snapshot_date=None, writer=None):
+            if portfolio.id == portfolio_ids[-1]:
+                raise OperationalError('db gone')
+            return real_snapshot(portfolio, snapshot_date, writer=writer)
+
+        with patch.object(SnapshotService, 'create_daily_snapshot', side_effect=snapshot), \
+                patch.object(SnapshotWriter, 'flush', autospec=True, side_effect=SnapshotWriter.flush) as flush:
+            result = create_daily_snapshots_chunk.apply(
+                args=[portfolio_ids, '2025-06-02'], retries=create_daily_snapshots_chunk.max_retries
+            ).get()
+
+        # The first portfolio's queued day is not written half-way; the chunk is redone whole.
+        flush.assert_not_called()
+        assert result['failed'] == portfolio_ids
+        assert not DailyPortfolioSnapshot.objects.filter(date=date(2025, 6, 2)).exists()
+
+    def test_summary_aggregates_chunk_results(self):
+        from portfolio.tasks import summarize_daily_snapshots
+
+        summary = summarize_daily_snapshots(
+            [
+                {'portfolios': 2, 'succeeded': 2, 'failed': [], 'duration_s': 0.5},
+                {'portfolios': 2, 'succeeded': 1, 'failed': [7], 'duration_s': 0.7},
+            ],
+            '2025-06-02',
+            0,
+        )
+
+        assert summary['portfolios'] == 4
+        assert summary['succeeded'] == 3
+        assert summary['failed'] == [7]
+        assert len(summary['chunks']) == 2
+
+    def test_on_demand_mode_prewarms_only_active_portfolios(self, settings):
+        from datetime import timedelta
+        from decimal import Decimal
+        from django.utils import timezone
+        from portfolio.models import Transaction
+        from portfolio.tests.factories import TransactionFactory
+
+        settings.SNAPSHOT_ON_DEMAND = True
+        settings.SNAPSHOT_PREWARM_ACTIVE_DAYS = 30
+        Portfolio.objects.all().delete()
+        now = timezone.now()
+        logged_in, traded, idle = UserFactory.create_batch(3)
+        Transaction.all_objects.update(timestamp=now - timedelta(days=90))
+        logged_in.last_login = now - timedelta(days=2)
+        logged_in.save(update_fields=['last_login'])
+        idle.last_login = now - timedelta(days=60)
+        idle.save(update_fields=['last_login'])
+        TransactionFactory(
+            portfolio=traded.portfolios.get(is_default=True),
+            transaction_type='DEPOSIT',
+            amount=Decimal('100.00'),
+            timestamp=now - timedelta(days=3),
+        )
+
+        dispatched = create_daily_snapshots(now.date().isoformat())
+
+        assert dispatched['portfolios'] == 2
+        assert set(DailyPortfolioSnapshot.objects.values_list('portfolio__user', flat=True)) == {logged_in.id, traded.id}
@@ -1,12 +1,14 @@
 import pytest
 from decimal import Decimal
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from portfolio.models import DailyPortfolioSnapshot, PortfolioPerformance, BenchmarkSeries, BenchmarkPrice
+from portfolio.models import DailyPortfolioSnapshot, FXRate, PortfolioPerformance, BenchmarkSeries, BenchmarkPrice
 from portfolio.tests.factories import HoldingFactory, PortfolioFactory, TransactionFactory
 from stocks.tests.factories import StockFactory
 from users.tests.factories import UserFactory
@@ -158,6 +160,100 @@ class TestPortfolioOverviewView:
         assert len(data['snapshots']) == 1
         assert data['snapshots'][0]['date'] == five_days_ago.isoformat()
 
+    def test_overview_reads_run_length_snapshots(self, settings):
+        from portfolio.services.snapshot_writer import SnapshotWriter
+
+        user = UserFactory()
+        portfolio = user.portfolios.get(is_default=True)
+        today = timezone.now().date()
+        settings.SNAPSHOT_STORAGE = 'rle'
+        with SnapshotWriter() as writer:
+            for offset in range(1, 6):
+                writer.add(portfolio, today - timezone.timedelta(days=offset), {
+                    'total_value': Decimal('500.00'),
+                    'cash_balance': Decimal('500.00'),
+                    'investment_value': Decimal('0.00'),
+                    'total_deposits': Decimal('500.00'),
+                }, [])
+        assert not DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).exists()
+
+        self.client.force_authenticate(user=user)
+        response = self.client.get(
+            reverse('dashboard-portfolio-overview', kwargs={'portfolio_id': portfolio.id}),
+            {'days': 7}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        snapshots = response.json()['snapshots']
+        assert [row['date'] for row in snapshots] == [
+            (today - timezone.timedelta(days=offset)).isoformat() for offset in range(5, 0, -1)
+        ]
+        assert all(Decimal(str(row['total_value'])) == Decimal('500.00') for row in snapshots)
+
+    def test_overview_materializes_missing_days_on_demand(self, settings):
+        user = UserFactory()
+        portfolio = user.portfolios.get(is_default=True)
+        today = timezone.now().date()
+        TransactionFactory(
+            portfolio=portfolio,
+            transaction_type='DEPOSIT',
+            amount=Decimal('500.00'),
+            timestamp=timezone.now() - timezone.timedelta(days=20),
+        )
+        settings.SNAPSHOT_ON_DEMAND = True
+        self.client.force_authenticate(user=user)
+        url = reverse('dashboard-portfolio-overview', kwargs={'portfolio_id': portfolio.id})
+
+        response = self.client.get(url, {'days': 7})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [row['date'] for row in response.json()['snapshots']] == [
+            (today - timezone.timedelta(days=offset)).isoformat() for offset in range(7, 0, -1)
+        ]
+        assert DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count() == 7
+
+        self.client.get(url, {'days': 14})
+        assert DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).count() == 14
+
+    def test_snapshot_history_needs_constant_fx_queries(self):
+        user = UserFactory()
+        portfolio = user.portfolios.get(is_default=True)
+        today = timezone.now().date()
+        FXRate.objects.create(
+            date=today - timezone.timedelta(days=400),
+            base_currency='PEN',
+            quote_currency='USD',
+            rate=Decimal('3.70'),
+            rate_type='mid',
+            session='cierre',
+        )
+        self.client.force_authenticate(user=user)
+
+        def fx_queries_for(days_of_history):
+            DailyPortfolioSnapshot.objects.filter(portfolio=portfolio).delete()
+            DailyPortfolioSnapshot.objects.bulk_create([
+                DailyPortfolioSnapshot(
+                    portfolio=portfolio,
+                    date=today - timezone.timedelta(days=offset),
+                    total_value=Decimal('370.00'),
+                    cash_balance=Decimal('370.00'),
+                    investment_value=Decimal('0.00'),
+                    total_deposits=Decimal('370.00'),
+                )
+                for offset in range(1, days_of_history + 1)
+            ])
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(
+                    reverse('dashboard-portfolio-overview', kwargs={'portfolio_id': portfolio.id}),
+                    {'days': 3650, 'currency': 'USD'},
+                )
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.json()['snapshots']) == days_of_history
+            assert Decimal(str(response.json()['snapshots'][0]['total_value'])) == Decimal('100.00')
+            return sum('portfolio_fxrate' in query['sql'] for query in ctx.captured_queries)
+
+        assert fx_queries_for(10) == fx_queries_for(300)
+
     def test_cannot_access_other_users_portfolio_overview(self):
         user = UserFactory()
         other_user = UserFactory()
@@ -0,0 +1,76 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from portfolio.models import FXRate
+from users.tests.factories import UserFactory
+
+
+@pytest.mark.django_db
+class TestFXRateView:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory())
+        for rate_type, rate in (('compra', '3.750'), ('venta', '3.800'), ('mid', '3.775')):
+            FXRate.objects.create(
+                date=date(2025, 9, 23), base_currency='PEN', quote_currency='USD',
+                rate=Decimal(rate), rate_type=rate_type, session='cierre',
+            )
+        yield
+        cache.clear()
+
+    def test_returns_latest_rates_with_validators(self):
+        response = self.client.get(reverse('fx-rates'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['mid'] == {'rate': '3.775000', 'date': '2025-09-23', 'session': 'cierre'}
+        assert response['ETag'].startswith('"fx-')
+        assert response['Last-Modified'] == 'Tue, 23 Sep 2025 00:00:00 GMT'
+
+    def test_matching_etag_gets_304_without_queries(self):
+        first = self.client.get(reverse('fx-rates'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('fx-rates'), HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert len(ctx.captured_queries) == 0
+
+        response = self.client.get(reverse('fx-rates'), HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_etag_is_derived_from_the_rates(self):
+        first = self.client.get(reverse('fx-rates'))
+
+        cache.clear()
+        assert self.client.get(reverse('fx-rates'))['ETag'] == first['ETag']
+
+    def test_cached_payload_expires_after_ttl(self, settings):
+        settings.FX_LATEST_CACHE_SECONDS = 0
+        first = self.client.get(reverse('fx-rates'))
+
+        # Written behind the signals' back, as another process would.
+        FXRate.objects.filter(rate_type='mid').update(rate=Decimal('3.780'))
+        response = self.client.get(reverse('fx-rates'), HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['mid']['rate'] == '3.780000'
+
+    def test_fx_write_changes_etag_and_payload(self):
+        first = self.client.get(reverse('fx-rates'))
+
+        FXRate.objects.create(
+            date=date(2025, 9, 24), base_currency='PEN', quote_currency='USD',
+            rate=Decimal('3.700'), rate_type='compra', session='cierre',
+        )
+        response = self.client.get(reverse('fx-rates'), HTTP_IF_NONE_MATCH=first['ETag'])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != first['ETag']
+        assert response.json()['compra']['rate'] == '3.700000'
@@ -16,6 +16,7 @@ from portfolio.views import (
     PortfolioBenchmarkView,
     # FX views
     FXRateView,
+    FXMetricsView,
     PortfolioRealizedView,
 )
 
@@ -39,4 +40,5 @@ urlpatterns = [
 
     # FX endpoints
     path('fx-rates/', FXRateView.as_view(), name='fx-rates'),
+    path('fx-metrics/', FXMetricsView.as_view(), name='fx-metrics'),
 ]
@@ -17,6 +17,7 @@ from .dashboard_views import (
 )
 from .fx_views import (
     FXRateView,
+    FXMetricsView,
 )
 from .realized_views import PortfolioRealizedView
 
@@ -33,5 +34,6 @@ __all__ = [
     'PortfolioOverviewView',
     'PortfolioBenchmarkView',
     'FXRateView',
+    'FXMetricsView',
     'PortfolioRealizedView',
 ]
@@ -2,22 +2,24 @@ from decimal import Decimal, ROUND_HALF_UP
 from calendar import monthrange
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Q
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
 
 from portfolio.models import Portfolio, Holding, Transaction, BenchmarkSeries, BenchmarkPrice
-from portfolio.models.daily_snapshot import DailyPortfolioSnapshot
 from portfolio.serializers import HoldingSerializer
 from portfolio.serializers.transaction_serializers import TransactionSerializer
+from portfolio.services import snapshot_store
 from portfolio.services.currency_service import (
     convert_amount,
+    convert_amounts_bulk,
     get_portfolio_reporting_currency,
-    get_transaction_amount_in_currency,
     normalize_currency,
 )
+from portfolio.services.fx_aggregates import cents_sum, transaction_amount_cents, transaction_fx_query
+from portfolio.services.money_kernel import cents_to_decimal
 from stocks.market import get_market_date
 
 
@@ -57,17 +59,12 @@ def _dashboard_today():
 
 def _build_portfolio_twr_payload(portfolio, display_currency, from_date, to_date):
     today = timezone.now().date()
-    snapshots = [
-        {
-            'date': snap.date,
-            'total_value': _convert_from_base(snap.total_value, portfolio, display_currency, snapshot_date=snap.date),
-        }
-        for snap in (
-            DailyPortfolioSnapshot.objects
-            .filter(portfolio=portfolio, date__gte=from_date, date__lte=to_date)
-            .order_by('date')
-        )
-    ]
+    snapshots = _convert_snapshots_from_base(
+        snapshot_store.daily_snapshots(portfolio, from_date, to_date),
+        portfolio,
+        display_currency,
+        ('total_value',),
+    )
 
     if to_date >= today:
         live_total = _convert_from_base(portfolio.total_value or Decimal('0.00'), portfolio, display_currency)
@@ -79,27 +76,21 @@ def _build_portfolio_twr_payload(portfolio, display_currency, from_date, to_date
     if len(snapshots) < 2:
         return None
 
-    cash_flows = [
-        {
-            'date': txn.timestamp.date(),
-            'amount': get_transaction_amount_in_currency(
-                txn,
-                display_currency,
-                snapshot_date=txn.timestamp.date(),
-            ),
-        }
-        for txn in (
-            Transaction.objects.filter(
-                portfolio=portfolio,
-                timestamp__date__gt=snapshots[0]['date'],
-                timestamp__date__lte=snapshots[-1]['date'],
-                transaction_type__in=[
-                    Transaction.TransactionType.DEPOSIT,
-                    Transaction.TransactionType.WITHDRAWAL,
-                ],
-            )
-            .order_by('timestamp', 'id')
+    fx = transaction_fx_query(
+        Transaction.objects.filter(
+            portfolio=portfolio,
+            timestamp__date__gt=snapshots[0]['date'],
+            timestamp__date__lte=snapshots[-1]['date'],
+            transaction_type__in=[
+                Transaction.TransactionType.DEPOSIT,
+                Transaction.TransactionType.WITHDRAWAL,
+            ],
         )
+    )
+    amount = transaction_amount_cents(fx, display_currency)
+    cash_flows = [
+        {'date': row['day'], 'amount': cents_to_decimal(row['cents'])}
+        for row in fx.queryset.values(day=fx.date).annotate(cents=cents_sum(amount)).order_by('day')
     ]
 
     cumulative = Decimal('1.0')
@@ -146,19 +137,12 @@ def _build_portfolio_twr_payload(portfolio, display_currency, from_date, to_date
 
 def _get_snapshot_breakdown_rows(portfolio, display_currency, from_date, to_date):
     today = timezone.now().date()
-    rows = [
-        {
-            'date': snap.date,
-            'total_value': _convert_from_base(snap.total_value, portfolio, display_currency, snapshot_date=snap.date),
-            'cash_balance': _convert_from_base(snap.cash_balance, portfolio, display_currency, snapshot_date=snap.date),
-            'investment_value': _convert_from_base(snap.investment_value, portfolio, display_currency, snapshot_date=snap.date),
-        }
-        for snap in (
-            DailyPortfolioSnapshot.objects
-            .filter(portfolio=portfolio, date__gte=from_date, date__lte=to_date)
-            .order_by('date')
-        )
-    ]
+    rows = _convert_snapshots_from_base(
+        snapshot_store.daily_snapshots(portfolio, from_date, to_date),
+        portfolio,
+        display_currency,
+        ('total_value', 'cash_balance', 'investment_value'),
+    )
 
     if to_date >= today:
         live_total = _convert_from_base(portfolio.total_value or Decimal('0.00'), portfolio, display_currency)
@@ -203,29 +187,14 @@ def _build_history_range_breakdown(portfolio, display_currency, from_date, to_da
     if not snapshot_rows:
         return _empty_history_range(from_date, to_date)
 
-    deposits = Decimal('0.00')
-    withdrawals = Decimal('0.00')
-    for txn in (
+    deposits, withdrawals = _sum_cash_flows(
         Transaction.objects.filter(
             portfolio=portfolio,
             timestamp__date__gte=snapshot_rows[0]['date'],
             timestamp__date__lte=snapshot_rows[-1]['date'],
-            transaction_type__in=[
-                Transaction.TransactionType.DEPOSIT,
-                Transaction.TransactionType.WITHDRAWAL,
-            ],
-        )
-        .order_by('timestamp', 'id')
-    ):
-        amount = Decimal(get_transaction_amount_in_currency(
-            txn,
-            display_currency,
-            snapshot_date=txn.timestamp.date(),
-        ) or '0.00')
-        if txn.transaction_type == Transaction.TransactionType.DEPOSIT:
-            deposits += abs(amount)
-        else:
-            withdrawals += abs(amount)
+        ),
+        display_currency,
+    )
 
     beginning = snapshot_rows[0]
     ending = snapshot_rows[-1]
@@ -248,20 +217,7 @@ def _build_history_range_breakdown(portfolio, display_currency, from_date, to_da
 
 
 def _build_history_payload(portfolio, display_currency, selected_from, selected_to):
-    latest_snapshot = (
-        DailyPortfolioSnapshot.objects
-        .filter(portfolio=portfolio)
-        .order_by('-date')
-        .values_list('date', flat=True)
-        .first()
-    )
-    earliest_snapshot = (
-        DailyPortfolioSnapshot.objects
-        .filter(portfolio=portfolio)
-        .order_by('date')
-        .values_list('date', flat=True)
-        .first()
-    )
+    earliest_snapshot, latest_snapshot = snapshot_store.snapshot_bounds(portfolio)
 
     today = _dashboard_today()
     latest_available = max(latest_snapshot or today, today)
@@ -307,6 +263,38 @@ def _convert_from_base(amount, portfolio, display_currency, *, snapshot_date=Non
     )
 
 
+def _convert_snapshots_from_base(snapshots, portfolio, display_currency, fields):
+    """Convert snapshot fields from base to display currency with one bulk FX resolution."""
+    snapshots = list(snapshots)
+    if display_currency == portfolio.base_currency:
+        converted = [Decimal(getattr(snap, field) or '0.00') for snap in snapshots for field in fields]
+    else:
+        converted = convert_amounts_bulk(
+            [(getattr(snap, field), portfolio.base_currency, snap.date) for snap in snapshots for field in fields],
+            display_currency,
+            session='cierre',
+        )
+    values = iter(converted)
+    return [
+        {'date': snap.date, **{field: _q(next(values)) for field in fields}}
+        for snap in snapshots
+    ]
+
+
+def _sum_cash_flows(transactions, display_currency):
+    """(deposits, withdrawals) in display_currency, converted and summed by the database."""
+    fx = transaction_fx_query(transactions.filter(transaction_type__in=[
+        Transaction.TransactionType.DEPOSIT,
+        Transaction.TransactionType.WITHDRAWAL,
+    ]))
+    amount = transaction_amount_cents(fx, display_currency)
+    totals = fx.queryset.aggregate(
+        deposits=cents_sum(amount, filter=Q(transaction_type=Transaction.TransactionType.DEPOSIT)),
+        withdrawals=cents_sum(amount, filter=Q(transaction_type=Transaction.TransactionType.WITHDRAWAL)),
+    )
+    return cents_to_decimal(totals['deposits']), cents_to_decimal(totals['withdrawals'])
+
+
 def _resolve_display_currency(request, portfolio):
     requested = request.query_params.get('currency')
     if requested in (None, ''):
@@ -322,26 +310,7 @@ def _calculate_cash_flow_totals(portfolio, display_currency):
             _convert_from_base(perf.total_withdrawals or Decimal('0.00'), portfolio, display_currency),
         )
 
-    deposits = Decimal('0.00')
-    withdrawals = Decimal('0.00')
-
-    for txn in Transaction.objects.filter(
-        portfolio=portfolio,
-        transaction_type__in=[
-            Transaction.TransactionType.DEPOSIT,
-            Transaction.TransactionType.WITHDRAWAL,
-        ],
-    ).order_by('timestamp', 'id'):
-        amount = get_transaction_amount_in_currency(
-            txn,
-            display_currency,
-            snapshot_date=txn.timestamp.date(),
-        )
-        if txn.transaction_type == Transaction.TransactionType.DEPOSIT:
-            deposits += amount
-        else:
-            withdrawals += amount
-
+    deposits, withdrawals = _sum_cash_flows(Transaction.objects.filter(portfolio=portfolio), display_currency)
     return _q(deposits), _q(withdrawals)
 
 
@@ -379,12 +348,8 @@ class DashboardView(APIView):
             today_investment = _convert_from_base(p.current_investment_value or Decimal('0.00'), p, display_currency)
 
             # Latest snapshot before today
-            snap = (
-                DailyPortfolioSnapshot.objects
-                .filter(portfolio=p, date__lt=today)
-                .order_by('-date')
-                .first()
-            )
+            snapshot_store.materialize(p, today - timedelta(days=1), today)
+            snap = snapshot_store.latest_snapshot(p, before=today)
             yesterday_total = (
                 _convert_from_base(snap.total_value, p, display_currency, snapshot_date=snap.date)
                 if snap else None
@@ -480,12 +445,8 @@ class PortfolioOverviewView(APIView):
         total_now = _convert_from_base(p.total_value or Decimal('0.00'), p, display_currency)
         cash_now = _q(p.get_total_cash_balance(display_currency))
         investment_now = _convert_from_base(p.current_investment_value or Decimal('0.00'), p, display_currency)
-        snap = (
-            DailyPortfolioSnapshot.objects
-            .filter(portfolio=p, date__lt=today)
-            .order_by('-date')
-            .first()
-        )
+        snapshot_store.materialize(p, today - timedelta(days=1), today)
+        snap = snapshot_store.latest_snapshot(p, before=today)
         yesterday_total = (
             _convert_from_base(snap.total_value, p, display_currency, snapshot_date=snap.date)
             if snap else None
@@ -565,20 +526,16 @@ class PortfolioOverviewView(APIView):
         except (ValueError, TypeError):
             return Response({'error': 'days must be an integer between 1 and 3650'}, status=400)
         since_date = today - timedelta(days=days)
-        snaps = (
-            DailyPortfolioSnapshot.objects
-            .filter(portfolio=p, date__gte=since_date, date__lte=today)
-            .order_by('date')
-        )
+        snapshot_store.materialize(p, since_date, today)
+        snaps = snapshot_store.daily_snapshots(p, since_date, today)
         snapshot_payload = [
-            {
-                'date': snap.date,
-                'total_value': _convert_from_base(snap.total_value, p, display_currency, snapshot_date=snap.date),
-                'cash_balance': _convert_from_base(snap.cash_balance, p, display_currency, snapshot_date=snap.date),
-                'investment_value': _convert_from_base(snap.investment_value, p, display_currency, snapshot_date=snap.date),
-                'display_currency': display_currency,
-            }
-            for snap in snaps
+            {**row, 'display_currency': display_currency}
+            for row in _convert_snapshots_from_base(
+                snaps,
+                p,
+                display_currency,
+                ('total_value', 'cash_balance', 'investment_value'),
+            )
         ]
 
         payload = {
@@ -641,6 +598,8 @@ class PortfolioBenchmarkView(APIView):
             benchmark_qs = benchmark_qs.filter(code__in=code_list)
 
         display_currency = _resolve_display_currency(request, portfolio)
+        # The history payload spans the whole life of the portfolio, so fill every missing day at once.
+        snapshot_store.materialize(portfolio)
         portfolio_payload = _build_portfolio_twr_payload(portfolio, display_currency, from_date, to_date)
         history_payload = _build_history_payload(portfolio, display_currency, from_date, to_date)
         benchmarks = []
@@ -1,50 +1,49 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from django.utils import timezone
-from portfolio.models import FXRate
+from django.utils.http import http_date, parse_http_date_safe
+from portfolio.services import fx_metrics
+from portfolio.services.fx_latest_service import get_latest_fx_entry
 
 
 class FXRateView(APIView):
-    """Get current FX rates for USD->PEN conversion"""
+    """Get current FX rates for USD->PEN conversion.
+
+    Served from a short-lived cache with ETag/Last-Modified derived from the rates;
+    unchanged clients get a 304 without a query.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        today = timezone.now().date()
-
-        # Get latest compra and venta rates
-        compra = FXRate.objects.filter(
-            base_currency='PEN',
-            quote_currency='USD',
-            rate_type='compra'
-        ).order_by('-date').first()
-
-        venta = FXRate.objects.filter(
-            base_currency='PEN',
-            quote_currency='USD',
-            rate_type='venta'
-        ).order_by('-date').first()
-
-        mid = FXRate.objects.filter(
-            base_currency='PEN',
-            quote_currency='USD',
-            rate_type='mid'
-        ).order_by('-date').first()
+        entry = get_latest_fx_entry()
+        etag = entry['etag']
+        last_modified = int(entry['last_modified'].timestamp()) if entry['last_modified'] else None
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            not_modified = etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        else:
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+            not_modified = since is not None and last_modified is not None and last_modified <= since
+
+        response = Response(
+            None if not_modified else entry['payload'],
+            status=status.HTTP_304_NOT_MODIFIED if not_modified else status.HTTP_200_OK,
+        )
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
+
+class FXMetricsView(APIView):
+    """FX lookup counters and latency histograms per caller, source and fallback tier."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
         return Response({
-            'compra': {
-                'rate': str(compra.rate) if compra else None,
-                'date': compra.date if compra else None,
-                'session': compra.session if compra else None,
-            },
-            'venta': {
-                'rate': str(venta.rate) if venta else None,
-                'date': venta.date if venta else None,
-                'session': venta.session if venta else None,
-            },
-            'mid': {
-                'rate': str(mid.rate) if mid else None,
-                'date': mid.date if mid else None,
-                'session': mid.session if mid else None,
-            }
+            'enabled': fx_metrics.is_enabled(),
+            'buckets_ms': list(fx_metrics.LATENCY_BUCKETS_MS),
+            'series': fx_metrics.snapshot(),
         }, status=status.HTTP_200_OK)
@@ -5,7 +5,8 @@ from datetime import datetime, time
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from django.db import DatabaseError
-from django.db.models import Count, Q
+from django.db.models import Case, Count, Q, Sum, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import generics, permissions, status
@@ -17,9 +18,15 @@ from portfolio.models import Portfolio, Transaction
 from portfolio.serializers.transaction_serializers import TransactionSerializer
 from portfolio.services.currency_service import (
     get_portfolio_reporting_currency,
-    get_transaction_amount_in_currency,
     normalize_currency,
 )
+from portfolio.services.fx_aggregates import (
+    cents_sum,
+    transaction_amount_cents,
+    transaction_fx_query,
+    transaction_native_cents,
+)
+from portfolio.services.money_kernel import cents_to_decimal
 from portfolio.services.transaction_service import TransactionService
 
 logger = logging.getLogger(__name__)
@@ -136,12 +143,6 @@ class TransactionListView(generics.ListAPIView):
 
     @classmethod
     def _build_totals(cls, queryset, *, display_currency, currency_filter=None):
-        total_count = queryset.count()
-        total_quantity = sum(int(tx.quantity or 0) for tx in queryset)
-        total_amount_display = Decimal('0.00')
-        total_amount_native = Decimal('0.00')
-        total_amount_pen = Decimal('0.00')
-
         by_type = {
             choice.value: {
                 'count': 0,
@@ -155,30 +156,50 @@ class TransactionListView(generics.ListAPIView):
             for choice in Transaction.TransactionType
         }
 
-        for tx in queryset:
-            display_amount = get_transaction_amount_in_currency(
-                tx,
-                display_currency,
-                use_counter_amount=bool(currency_filter and tx.transaction_type == Transaction.TransactionType.CONVERT and tx.counter_currency == currency_filter),
-                snapshot_date=tx.timestamp.date(),
+        # Convert and sum in the database: one grouped query instead of a Python
+        # conversion per transaction.
+        fx = transaction_fx_query(queryset)
+        display_amount = transaction_amount_cents(fx, display_currency)
+        if currency_filter:
+            display_amount = Case(
+                When(
+                    transaction_type=Transaction.TransactionType.CONVERT,
+                    counter_currency=currency_filter,
+                    then=transaction_amount_cents(fx, display_currency, use_counter_amount=True),
+                ),
+                default=display_amount,
             )
-            pen_amount = get_transaction_amount_in_currency(
-                tx,
-                'PEN',
-                snapshot_date=tx.timestamp.date(),
+        pen_amount = transaction_amount_cents(fx, 'PEN')
+        rows = (
+            fx.queryset
+            .values('transaction_type')
+            .annotate(
+                count=Count('id'),
+                quantity=Coalesce(Sum('quantity'), 0),
+                native_cents=cents_sum(transaction_native_cents()),
+                pen_cents=cents_sum(pen_amount),
+                display_cents=cents_sum(display_amount),
             )
-            native_amount = Decimal(tx.amount or '0.00')
-
-            total_amount_display += display_amount
-            total_amount_native += native_amount
-            total_amount_pen += pen_amount
-
-            bucket = by_type[tx.transaction_type]
-            bucket['count'] += 1
-            bucket['quantity'] += int(tx.quantity or 0)
-            bucket['amount_native'] = cls._format_decimal(Decimal(bucket['amount_native']) + native_amount)
-            bucket['amount_base'] = cls._format_decimal(Decimal(bucket['amount_base']) + pen_amount)
-            bucket['amount_display'] = cls._format_decimal(Decimal(bucket['amount_display']) + display_amount)
+        )
+
+        total_count = 0
+        total_quantity = 0
+        total_native_cents = 0
+        total_pen_cents = 0
+        total_display_cents = 0
+        for row in rows:
+            total_count += row['count']
+            total_quantity += row['quantity']
+            total_native_cents += row['native_cents']
+            total_pen_cents += row['pen_cents']
+            total_display_cents += row['display_cents']
+
+            bucket = by_type[row['transaction_type']]
+            bucket['count'] = row['count']
+            bucket['quantity'] = row['quantity']
+            bucket['amount_native'] = cls._format_decimal(cents_to_decimal(row['native_cents']))
+            bucket['amount_base'] = cls._format_decimal(cents_to_decimal(row['pen_cents']))
+            bucket['amount_display'] = cls._format_decimal(cents_to_decimal(row['display_cents']))
             bucket['amount'] = bucket['amount_native']
 
         deposit_base = Decimal(by_type[Transaction.TransactionType.DEPOSIT]['amount_base'])
@@ -186,10 +207,10 @@ class TransactionListView(generics.ListAPIView):
 
         return {
             'count': total_count,
-            'amount': cls._format_decimal(total_amount_native),
-            'amount_native': cls._format_decimal(total_amount_native),
-            'amount_base': cls._format_decimal(total_amount_pen),
-            'amount_display': cls._format_decimal(total_amount_display),
+            'amount': cls._format_decimal(cents_to_decimal(total_native_cents)),
+            'amount_native': cls._format_decimal(cents_to_decimal(total_native_cents)),
+            'amount_base': cls._format_decimal(cents_to_decimal(total_pen_cents)),
+            'amount_display': cls._format_decimal(cents_to_decimal(total_display_cents)),
             'display_currency': display_currency,
             'quantity': total_quantity,
             'net_cash_flow': cls._format_decimal(deposit_base - withdrawal_base),
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent once per EOD ingest run with ``pairs``: the sorted (stock_id, date) pairs whose
+# HistoricalStockPrice is new or changed. The rows are bulk-upserted, so per-row model
+# signals do not fire for them.
+eod_prices_written = Signal()
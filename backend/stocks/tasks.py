@@ -1,5 +1,6 @@
 from celery import shared_task
 from datetime import datetime, timezone as datetime_timezone
+from decimal import Decimal
 import logging
 from math import ceil
 
@@ -8,6 +9,7 @@ from django.utils import timezone
 from .market import get_market_date, previous_business_day
 from .models import HistoricalStockPrice, Stock, StockRefreshStatus
 from .services import fetch_bvl_market_data, fetch_data_for_companies
+from .signals import eod_prices_written
 
 logger = logging.getLogger(__name__)
 
@@ -253,6 +255,44 @@ def update_us_stock_prices(data):
         )
 
 
+def save_eod_prices(prices):
+    """Upsert ``{(stock_id, date): price}`` into HistoricalStockPrice in one statement.
+
+    Returns the sorted pairs that were missing or held a different price, and sends
+    eod_prices_written with them so snapshots valued before the price arrived can be
+    revisited.
+    """
+    if not prices:
+        return []
+
+    price_field = HistoricalStockPrice._meta.get_field('price')
+    prices = {
+        pair: price_field.to_python(price).quantize(Decimal('0.01'))
+        for pair, price in prices.items()
+    }
+    stored = {
+        (stock_id, price_date): price
+        for stock_id, price_date, price in HistoricalStockPrice.objects.filter(
+            stock_id__in={stock_id for stock_id, _ in prices},
+            date__in={price_date for _, price_date in prices},
+        ).values_list('stock_id', 'date', 'price')
+    }
+    HistoricalStockPrice.objects.bulk_create(
+        [
+            HistoricalStockPrice(stock_id=stock_id, date=price_date, price=price)
+            for (stock_id, price_date), price in prices.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['stock', 'date'],
+        update_fields=['price'],
+    )
+
+    written = sorted(pair for pair, price in prices.items() if stored.get(pair) != price)
+    if written:
+        eod_prices_written.send(sender=HistoricalStockPrice, pairs=written)
+    return written
+
+
 @shared_task
 def fetch_stock_prices():
     """
@@ -316,110 +356,109 @@ def fetch_eod_prices():
     This should run once per day after market close (4:00 PM EST).
 
     Saves both current_price (Stock table) and historical_price (HistoricalStockPrice table).
+    Returns the ``[stock_id, date]`` pairs whose historical price is new or changed.
     """
     today = timezone.now().date()
     successful_upstream_calls = 0
+    eod_prices = {}
 
-    # Fetch BVL stocks and save historical
     try:
-        records = fetch_bvl_market_data()
-        successful_upstream_calls += 1
-        if records:
-            for item in records:
-                market_date = _resolve_quote_market_date(
-                    is_local=True,
-                    currency=item.get('currency') or 'PEN',
-                    market_timestamp=item.get('market_timestamp'),
-                )
-                defaults = {
-                    'name': item.get('name') or item.get('symbol'),
-                    'current_price': item.get('current_price'),
-                    'previous_close': item.get('previous_close'),
-                    'previous_close_date': _resolve_previous_close_date(item['symbol'], market_date),
-                    'currency': item.get('currency') or 'PEN',
-                    'company_code': item.get('company_code', ''),
-                    'is_local': True,
-                }
-                stock, created = Stock.objects.update_or_create(
-                    symbol=item['symbol'],
-                    defaults=defaults
-                )
-
-                # Save EOD historical price
-                current_price = item.get('current_price')
-                if current_price and current_price > 0:
-                    HistoricalStockPrice.objects.update_or_create(
-                        stock=stock,
-                        date=market_date,
-                        defaults={'price': current_price}
+        # Fetch BVL stocks and save historical
+        try:
+            records = fetch_bvl_market_data()
+            successful_upstream_calls += 1
+            if records:
+                for item in records:
+                    market_date = _resolve_quote_market_date(
+                        is_local=True,
+                        currency=item.get('currency') or 'PEN',
+                        market_timestamp=item.get('market_timestamp'),
+                    )
+                    defaults = {
+                        'name': item.get('name') or item.get('symbol'),
+                        'current_price': item.get('current_price'),
+                        'previous_close': item.get('previous_close'),
+                        'previous_close_date': _resolve_previous_close_date(item['symbol'], market_date),
+                        'currency': item.get('currency') or 'PEN',
+                        'company_code': item.get('company_code', ''),
+                        'is_local': True,
+                    }
+                    stock, created = Stock.objects.update_or_create(
+                        symbol=item['symbol'],
+                        defaults=defaults
                     )
-    except RuntimeError:
-        logger.exception(
-            "Failed to fetch BVL EOD stock data",
-            extra={"provider": "bvl"},
-        )
 
-    # Fetch US stocks and save historical
-    for company in ACTIVE_COMPANIES:
-        symbol = company['symbol']
-        try:
-            data = fetch_data_for_companies(symbol)
+                    # Save EOD historical price
+                    current_price = item.get('current_price')
+                    if current_price and current_price > 0:
+                        eod_prices[(stock.id, market_date)] = current_price
         except RuntimeError:
             logger.exception(
-                "Failed to fetch US EOD stock data",
-                extra={"provider": "fmp", "symbols": symbol},
+                "Failed to fetch BVL EOD stock data",
+                extra={"provider": "bvl"},
             )
-            continue
 
-        if data is None:
-            logger.error(
-                "FMP EOD stock data returned no response",
-                extra={"provider": "fmp", "symbols": symbol},
-            )
-            continue
-
-        successful_upstream_calls += 1
-
-        if data:
-            for stock_info in data:
-                symbol = stock_info.get('symbol')
-                current_price = stock_info.get('price', 0.0)
-                previous_close = stock_info.get('previousClose')
-                name = stock_info.get('name', 'Unknown')
-                market_date = _resolve_quote_market_date(
-                    is_local=False,
-                    currency=stock_info.get('currency') or 'USD',
-                    raw_timestamp=stock_info.get('timestamp'),
+        # Fetch US stocks and save historical
+        for company in ACTIVE_COMPANIES:
+            symbol = company['symbol']
+            try:
+                data = fetch_data_for_companies(symbol)
+            except RuntimeError:
+                logger.exception(
+                    "Failed to fetch US EOD stock data",
+                    extra={"provider": "fmp", "symbols": symbol},
                 )
+                continue
 
-                stock, created = Stock.objects.update_or_create(
-                    symbol=symbol,
-                    defaults={
-                        'name': name,
-                        'current_price': current_price,
-                        'previous_close': previous_close,
-                        'previous_close_date': _resolve_previous_close_date(symbol, market_date),
-                        'company_code': '',
-                        'is_local': False,
-                    }
+            if data is None:
+                logger.error(
+                    "FMP EOD stock data returned no response",
+                    extra={"provider": "fmp", "symbols": symbol},
                 )
+                continue
+
+            successful_upstream_calls += 1
+
+            if data:
+                for stock_info in data:
+                    symbol = stock_info.get('symbol')
+                    current_price = stock_info.get('price', 0.0)
+                    previous_close = stock_info.get('previousClose')
+                    name = stock_info.get('name', 'Unknown')
+                    market_date = _resolve_quote_market_date(
+                        is_local=False,
+                        currency=stock_info.get('currency') or 'USD',
+                        raw_timestamp=stock_info.get('timestamp'),
+                    )
 
-                # Save EOD historical price
-                if current_price and current_price > 0:
-                    HistoricalStockPrice.objects.update_or_create(
-                        stock=stock,
-                        date=market_date,
-                        defaults={'price': current_price}
+                    stock, created = Stock.objects.update_or_create(
+                        symbol=symbol,
+                        defaults={
+                            'name': name,
+                            'current_price': current_price,
+                            'previous_close': previous_close,
+                            'previous_close_date': _resolve_previous_close_date(symbol, market_date),
+                            'company_code': '',
+                            'is_local': False,
+                        }
                     )
 
-        logger.info(
-            "Processed US EOD stock price",
-            extra={
-                "provider": "fmp",
-                "symbols": symbol,
-                "records": len(data) if isinstance(data, list) else None,
-            },
-        )
+                    # Save EOD historical price
+                    if current_price and current_price > 0:
+                        eod_prices[(stock.id, market_date)] = current_price
+
+            logger.info(
+                "Processed US EOD stock price",
+                extra={
+                    "provider": "fmp",
+                    "symbols": symbol,
+                    "records": len(data) if isinstance(data, list) else None,
+                },
+            )
+    finally:
+        # Stock rows are updated as each provider answers, so keep the prices fetched so far
+        # even when a later provider fails with something other than RuntimeError.
+        written = save_eod_prices(eod_prices)
 
     if successful_upstream_calls == 0:
         logger.error(
@@ -431,5 +470,6 @@ def fetch_eod_prices():
     StockRefreshStatus.mark_refreshed(timezone.now())
     logger.info(
         "EOD prices saved",
-        extra={"task": "fetch_eod_prices", "date": str(today)},
+        extra={"task": "fetch_eod_prices", "date": str(today), "records": len(eod_prices), "changed": len(written)},
     )
+    return [[stock_id, price_date.isoformat()] for stock_id, price_date in written]
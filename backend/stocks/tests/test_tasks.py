@@ -83,3 +83,53 @@ def test_update_us_stock_prices_sets_previous_close_date_from_latest_historical(
     stock.refresh_from_db()
     assert stock.previous_close == Decimal('95.00')
     assert stock.previous_close_date == date(2026, 4, 17)
+
+
+@pytest.mark.django_db
+def test_fetch_eod_prices_returns_only_new_or_changed_prices(monkeypatch):
+    import stocks.market as stock_market
+
+    stock = StockFactory.create(symbol='AAPL', currency='USD', current_price=Decimal('90.00'))
+    HistoricalStockPrice.objects.create(stock=stock, date=date(2026, 4, 21), price=Decimal('100.00'))
+    monkeypatch.setattr(
+        stock_market.timezone,
+        'now',
+        lambda: datetime(2026, 4, 21, 21, 0, tzinfo=datetime_timezone.utc),
+    )
+    monkeypatch.setattr(tasks, 'fetch_bvl_market_data', Mock(return_value=[]))
+    monkeypatch.setattr(tasks, 'ACTIVE_COMPANIES', [{'symbol': 'AAPL'}])
+    fmp_fetch = Mock(return_value=[{'symbol': 'AAPL', 'price': 100.0, 'name': 'Apple Inc.'}])
+    monkeypatch.setattr(tasks, 'fetch_data_for_companies', fmp_fetch)
+
+    assert tasks.fetch_eod_prices.run() == []
+
+    fmp_fetch.return_value = [{'symbol': 'AAPL', 'price': 101.25, 'name': 'Apple Inc.'}]
+    assert tasks.fetch_eod_prices.run() == [[stock.id, '2026-04-21']]
+    assert HistoricalStockPrice.objects.get(stock=stock, date=date(2026, 4, 21)).price == Decimal('101.25')
+
+
+@pytest.mark.django_db
+def test_fetch_eod_prices_keeps_fetched_prices_when_a_later_provider_raises(monkeypatch):
+    import stocks.market as stock_market
+
+    stock = StockFactory.create(symbol='AAPL', currency='USD', current_price=Decimal('90.00'))
+    monkeypatch.setattr(
+        stock_market.timezone,
+        'now',
+        lambda: datetime(2026, 4, 21, 21, 0, tzinfo=datetime_timezone.utc),
+    )
+    monkeypatch.setattr(tasks, 'fetch_bvl_market_data', Mock(return_value=[]))
+    monkeypatch.setattr(tasks, 'ACTIVE_COMPANIES', [{'symbol': 'AAPL'}, {'symbol': 'MSFT'}])
+    fmp_fetch = Mock(side_effect=[
+        [{'symbol': 'AAPL', 'price': 101.25, 'name': 'Apple Inc.'}],
+        ValueError('malformed FMP payload'),
+    ])
+    monkeypatch.setattr(tasks, 'fetch_data_for_companies', fmp_fetch)
+    written = Mock()
+    monkeypatch.setattr(tasks.eod_prices_written, 'send', written)
+
+    with pytest.raises(ValueError):
+        tasks.fetch_eod_prices.run()
+
+    assert HistoricalStockPrice.objects.get(stock=stock, date=date(2026, 4, 21)).price == Decimal('101.25')
+    written.assert_called_once_with(sender=HistoricalStockPrice, pairs=[(stock.id, date(2026, 4, 21))])